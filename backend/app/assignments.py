@@ -0,0 +1,266 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .versions import touch_events
+
+logger = logging.getLogger('uvicorn.error')
+
+# Every write to `task_assignments` goes through this module so the
+# denormalized `event_tasks.volunteer_count` stays in step with the rows.
+# The background reconciler repairs anything that slips through (crashes
+# between the two writes, manual edits, documents that predate the field).
+
+
+def _task_oid(activity_id: str) -> ObjectId | None:
+    try:
+        return ObjectId(activity_id)
+    except Exception:
+        return None
+
+
+async def count_assignments(db, match: Dict) -> Dict[str, int]:
+    """Count task_assignments per task in one $group over the rows matching `match`."""
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$activity_id", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] async for row in db["task_assignments"].aggregate(pipeline)}
+
+
+async def insert_assignment(db, assignment: Dict) -> int | None:
+    """Insert one assignment row and bump its task's counter.
+
+    Returns the task's new `volunteer_count`, or None when the
+    (activity_id, user_id) pair already existed and nothing was written.
+    """
+    try:
+        await db["task_assignments"].insert_one(assignment)
+    except DuplicateKeyError:
+        return None
+    oid = _task_oid(assignment["activity_id"])
+    if oid is None:
+        return None
+    task = await db["event_tasks"].find_one_and_update(
+        {"_id": oid},
+        {"$inc": {"volunteer_count": 1}},
+        projection={"volunteer_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return task.get("volunteer_count") if task else None
+
+
+async def apply_count_deltas(db, deltas: Dict[str, int]) -> None:
+    ops = []
+    for activity_id, delta in deltas.items():
+        oid = _task_oid(activity_id)
+        if oid is not None and delta:
+            ops.append(UpdateOne({"_id": oid}, {"$inc": {"volunteer_count": delta}}))
+    if ops:
+        await db["event_tasks"].bulk_write(ops, ordered=False)
+
+
+async def delete_assignments(db, query: Dict) -> int:
+    """Delete the assignment rows matching `query` and decrement their tasks.
+
+    Returns the number of rows deleted. If a concurrent writer removed some
+    of the same rows the per-task deltas can't be trusted, so the affected
+    tasks are recounted instead.
+    """
+    per_task = await count_assignments(db, query)
+    if not per_task:
+        return 0
+    result = await db["task_assignments"].delete_many(query)
+    if result.deleted_count == sum(per_task.values()):
+        await apply_count_deltas(db, {aid: -n for aid, n in per_task.items()})
+    else:
+        await recount_tasks(db, list(per_task.keys()))
+    return result.deleted_count
+
+
+@dataclass
+class AssignmentPlan:
+    """Which users a task assignment would add, computed before any write."""
+    event_id: str
+    activity_id: str
+    new_user_ids: list[str] = field(default_factory=list)
+    existing: int = 0
+
+    def resulting_count(self, current_count: int) -> int:
+        return current_count + len(self.new_user_ids)
+
+
+@dataclass
+class AssignmentResult:
+    inserted: int = 0
+    existing: int = 0
+
+
+class CapacityExceeded(Exception):
+    def __init__(self, max_volunteers: int, resulting_count: int):
+        super().__init__(f"{resulting_count} volunteers would exceed the max of {max_volunteers}")
+        self.max_volunteers = max_volunteers
+        self.resulting_count = resulting_count
+
+
+async def plan_task_assignments(db, event_id: str, activity_id: str, user_ids: Iterable[str | None]) -> AssignmentPlan:
+    """Work out which of `user_ids` are not yet assigned to the task (one query)."""
+    targets = list(dict.fromkeys(u for u in user_ids if u))
+    if not targets:
+        return AssignmentPlan(event_id=event_id, activity_id=activity_id)
+    existing = {
+        row["user_id"]
+        async for row in db["task_assignments"].find(
+            {"activity_id": activity_id, "user_id": {"$in": targets}}, {"user_id": 1, "_id": 0}
+        )
+    }
+    return AssignmentPlan(
+        event_id=event_id,
+        activity_id=activity_id,
+        new_user_ids=[u for u in targets if u not in existing],
+        existing=len(existing),
+    )
+
+
+async def apply_assignments(db, rows: list[Dict]) -> Dict[str, int]:
+    """Upsert assignment rows keyed on (activity_id, user_id) in one unordered bulk_write.
+
+    Each row needs event_id, activity_id, user_id and assigned_by. Rows that
+    already exist are left untouched. Returns the number of rows inserted
+    per task, and bumps each task's counter by that amount.
+    """
+    if not rows:
+        return {}
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"activity_id": row["activity_id"], "user_id": row["user_id"]},
+            {"$setOnInsert": {
+                "event_id": row["event_id"],
+                "assigned_by": row.get("assigned_by", ""),
+                "assigned_at": row.get("assigned_at", now),
+            }},
+            upsert=True,
+        )
+        for row in rows
+    ]
+    try:
+        result = await db["task_assignments"].bulk_write(ops, ordered=False)
+        upserted = result.upserted_ids.keys()
+    except BulkWriteError as e:
+        # Two concurrent upserts of the same pair: one wins, the other hits the
+        # unique index. Anything other than a duplicate key is a real error.
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        upserted = [u["index"] for u in e.details.get("upserted", [])]
+    inserted: Dict[str, int] = {}
+    for index in upserted:
+        activity_id = rows[index]["activity_id"]
+        inserted[activity_id] = inserted.get(activity_id, 0) + 1
+    await apply_count_deltas(db, inserted)
+    return inserted
+
+
+async def apply_task_plan(db, plan: AssignmentPlan, assigned_by: str) -> AssignmentResult:
+    inserted = await apply_assignments(db, [
+        {"event_id": plan.event_id, "activity_id": plan.activity_id, "user_id": u, "assigned_by": assigned_by}
+        for u in plan.new_user_ids
+    ])
+    added = inserted.get(plan.activity_id, 0)
+    return AssignmentResult(inserted=added, existing=plan.existing + len(plan.new_user_ids) - added)
+
+
+async def assign_users_to_task(
+    db,
+    task: Dict,
+    user_ids: Iterable[str | None],
+    assigned_by: str,
+    enforce_capacity: bool = False,
+) -> AssignmentResult:
+    """Assign a set of users to one task: plan, optionally check capacity, then write.
+
+    With `enforce_capacity`, CapacityExceeded is raised before anything is
+    written if the new rows would take the task past `max_volunteers`.
+    """
+    plan = await plan_task_assignments(db, task["event_id"], str(task["_id"]), user_ids)
+    max_volunteers = task.get("max_volunteers")
+    if enforce_capacity and max_volunteers:
+        resulting = plan.resulting_count(task.get("volunteer_count") or 0)
+        if resulting > max_volunteers:
+            raise CapacityExceeded(max_volunteers, resulting)
+    return await apply_task_plan(db, plan, assigned_by)
+
+
+async def _observe_counts(db, oids: list[ObjectId]) -> Dict[ObjectId, tuple]:
+    """(stored counter, assignment rows, event_id) per task; counters are read before rows."""
+    tasks = await db["event_tasks"].find({"_id": {"$in": oids}}, {"volunteer_count": 1, "event_id": 1}).to_list(None)
+    counts = await count_assignments(db, {"activity_id": {"$in": [str(o) for o in oids]}})
+    return {t["_id"]: (t.get("volunteer_count"), counts.get(str(t["_id"]), 0), t.get("event_id")) for t in tasks}
+
+
+async def recount_tasks(db, task_ids: list[str]) -> int:
+    """Set `volunteer_count` from the assignment rows for the given tasks.
+
+    Writers change the rows first and the counter second, so a mismatch can
+    just be a write in flight. A task is only repaired when a second look
+    finds the same counter and row count, and the write is conditional on
+    the counter still holding that value; anything that moved is left for
+    the next pass. Returns how many task documents were repaired.
+    """
+    oids = [oid for oid in (_task_oid(t) for t in task_ids) if oid is not None]
+    if not oids:
+        return 0
+    first = await _observe_counts(db, oids)
+    suspects = [oid for oid, (stored, actual, _) in first.items() if stored != actual]
+    if not suspects:
+        return 0
+    second = await _observe_counts(db, suspects)
+    ops = []
+    stale_events = set()
+    for oid in suspects:
+        seen = second.get(oid)
+        if seen is None or seen != first[oid]:
+            continue
+        stored, actual, event_id = seen
+        ops.append(UpdateOne({"_id": oid, "volunteer_count": stored}, {"$set": {"volunteer_count": actual}}))
+        stale_events.add(event_id)
+    if not ops:
+        return 0
+    result = await db["event_tasks"].bulk_write(ops, ordered=False)
+    if result.modified_count:
+        await touch_events(db, *stale_events)
+    return result.modified_count
+
+
+async def reconcile_volunteer_counts(db, batch_size: int = 500) -> int:
+    """Walk every task in `_id` order and repair drifted counters."""
+    repaired = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await db["event_tasks"].find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            break
+        repaired += await recount_tasks(db, [str(t["_id"]) for t in batch])
+        last_id = batch[-1]["_id"]
+    return repaired
+
+
+async def run_volunteer_count_reconciler(db, interval_seconds: int) -> None:
+    """Background loop started from `lifespan`; the first pass also backfills."""
+    while True:
+        try:
+            repaired = await reconcile_volunteer_counts(db)
+            if repaired:
+                logger.info('Repaired volunteer_count on %d tasks', repaired)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning('volunteer_count reconcile failed: %s', e)
+        await asyncio.sleep(interval_seconds)
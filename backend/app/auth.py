@@ -2,9 +2,10 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from .cache import TTLCache
 from .config import settings
 from .database import get_db
-from .models import UserInDB
+from .models import CurrentUser, UserInDB
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -12,12 +13,25 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
+# email -> (token_version, admin); lets sensitive routes skip most users reads
+_token_state_cache = TTLCache(maxsize=10_000, ttl=settings.TOKEN_VERSION_CACHE_SECONDS)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({'exp': expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def access_token_claims(user: UserInDB) -> dict:
+    """Claims embedded in the access token so requests don't need a users lookup."""
+    return {
+        'sub': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'admin': user.admin,
+        'ver': user.token_version,
+    }
+
 def verify_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -28,14 +42,62 @@ def verify_token(token: str):
             detail='Invalid or expired token',
             headers={'WWW-Authenticate': 'Bearer'},
         )
-    
-def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
+
+async def _load_token_state(db, email: str, use_cache: bool = True) -> tuple[int, bool] | None:
+    if use_cache:
+        cached = _token_state_cache.get(email)
+        if cached is not None:
+            return cached
+    user = await db['users'].find_one({'email': email}, {'token_version': 1, 'admin': 1})
+    if not user:
+        return None
+    state = (user.get('token_version', 0), bool(user.get('admin', False)))
+    _token_state_cache.set(email, state)
+    return state
+
+def invalidate_token_state(email: str) -> None:
+    _token_state_cache.pop(email)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)) -> CurrentUser:
     payload = verify_token(token)
     email = payload.get('sub')
     if not email:
         raise HTTPException(status_code=401, detail='Invalid token')
-    user = db['users'].find_one({'email': email})
+    if settings.AUTH_CLAIMS_PRINCIPAL and 'ver' in payload:
+        # Claims were signed by us at login; no need to re-validate or hit Mongo.
+        return CurrentUser.model_construct(
+            email=email,
+            first_name=payload.get('first_name', ''),
+            last_name=payload.get('last_name', ''),
+            admin=bool(payload.get('admin', False)),
+            token_version=payload['ver'],
+        )
+    # Tokens issued before claims were embedded fall back to the users lookup.
+    user = await db['users'].find_one({'email': email})
     if not user:
         raise HTTPException(status_code=404, detail='User not found')
-    # Validate via Pydantic so Mongo `_id` alias maps to `id`.
-    return UserInDB.model_validate(user)
\ No newline at end of file
+    return CurrentUser.model_construct(
+        email=user['email'],
+        first_name=user.get('first_name', ''),
+        last_name=user.get('last_name', ''),
+        admin=bool(user.get('admin', False)),
+        token_version=user.get('token_version', 0),
+    )
+
+async def get_verified_user(current_user: CurrentUser = Depends(get_current_user), db = Depends(get_db)) -> CurrentUser:
+    """Principal for sensitive routes: rejects tokens whose version has been revoked.
+
+    The user's current token_version (and admin flag) comes from a short TTL
+    cache, so revocation takes effect within TOKEN_VERSION_CACHE_SECONDS.
+    """
+    state = await _load_token_state(db, current_user.email)
+    if state is None:
+        raise HTTPException(status_code=404, detail='User not found')
+    token_version, admin = state
+    if current_user.token_version != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Token has been revoked',
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+    return current_user.model_copy(update={'admin': admin})
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from bson import ObjectId
+
+from .config import settings
+from .email_outbox import outbox_message, enqueue_many, close_finished_broadcasts
+from .email_service import recipient_limit
+
+logger = logging.getLogger('uvicorn.error')
+
+# One-off emails to an event's participants (schedule changes, day-of
+# instructions). Creating a broadcast only inserts its `broadcasts` doc; the
+# recipients are then resolved in the background by streaming the roster
+# (`event_volunteers`, or `task_assignments` for one task) and cut into
+# chunks of `recipient_limit()` addresses. Each chunk becomes one outbox
+# message, i.e. one SendGrid request with a personalization per recipient
+# or one SMTP message with every recipient on the envelope, so a
+# 5,000-person event is a handful of provider calls rather than 5,000.
+#
+# Progress lives on the broadcast doc: `total` grows as chunks are queued,
+# `sent`/`failed` as the outbox worker records them (see
+# app/email_outbox.py). Status goes resolving -> sending -> done, or failed
+# if the recipients could not be resolved.
+
+RESOLVING = 'resolving'
+SENDING = 'sending'
+DONE = 'done'
+FAILED = 'failed'
+
+AUDIENCE_ROLES = {
+    'everyone': ['volunteer', 'delegate'],
+    'volunteers': ['volunteer'],
+    'delegates': ['delegate'],
+}
+
+
+async def create_broadcast(db, event_id: str, created_by: str, subject: str, body: str, audience: str,
+                           delegate_org_code: str | None = None, task_id: str | None = None) -> Dict:
+    now = datetime.utcnow()
+    doc = {
+        'event_id': event_id,
+        'created_by': created_by,
+        'subject': subject,
+        'body': body,
+        'audience': audience,
+        'delegate_org_code': delegate_org_code,
+        'task_id': task_id,
+        'status': RESOLVING,
+        'total': 0,
+        'sent': 0,
+        'failed': 0,
+        'created_at': now,
+        'updated_at': now,
+    }
+    result = await db['broadcasts'].insert_one(doc)
+    doc['_id'] = result.inserted_id
+    return doc
+
+
+async def stream_recipients(db, broadcast: Dict) -> AsyncIterator[str]:
+    """Distinct recipient emails for a broadcast, read through one batched cursor."""
+    if broadcast.get('task_id'):
+        coll = 'task_assignments'
+        query = {'activity_id': broadcast['task_id'], 'event_id': broadcast['event_id']}
+    else:
+        coll = 'event_volunteers'
+        query = {'event_id': broadcast['event_id'], 'role': {'$in': AUDIENCE_ROLES[broadcast['audience']]}}
+        if broadcast.get('delegate_org_code'):
+            query['delegate_org_code'] = broadcast['delegate_org_code']
+    seen = set()
+    cursor = db[coll].find(query, {'user_id': 1, '_id': 0}).batch_size(settings.BROADCAST_CURSOR_BATCH_SIZE)
+    async for doc in cursor:
+        email = doc.get('user_id')
+        # A user can hold several rows (e.g. delegate and volunteer); mail them once
+        if email and email not in seen:
+            seen.add(email)
+            yield email
+
+
+async def _queue_chunk(db, broadcast: Dict, recipients: List[str]) -> None:
+    await enqueue_many(db, [outbox_message(
+        recipients, broadcast['subject'], broadcast['body'],
+        kind='broadcast', broadcast_id=broadcast['_id'],
+    )])
+    await db['broadcasts'].update_one(
+        {'_id': broadcast['_id']},
+        {'$inc': {'total': len(recipients)}, '$set': {'updated_at': datetime.utcnow()}},
+    )
+
+
+async def queue_broadcast(db, broadcast_id: ObjectId) -> None:
+    """Resolve a broadcast's recipients into outbox messages (run as a background task)."""
+    broadcast = await db['broadcasts'].find_one({'_id': broadcast_id, 'status': RESOLVING})
+    if not broadcast:
+        return
+    size = recipient_limit()
+    try:
+        chunk: List[str] = []
+        async for email in stream_recipients(db, broadcast):
+            chunk.append(email)
+            if len(chunk) >= size:
+                await _queue_chunk(db, broadcast, chunk)
+                chunk = []
+        if chunk:
+            await _queue_chunk(db, broadcast, chunk)
+    except Exception as e:
+        logger.warning('broadcast %s: resolving recipients failed: %s', broadcast_id, e)
+        await db['broadcasts'].update_one(
+            {'_id': broadcast_id},
+            {'$set': {'status': FAILED, 'error': str(e), 'updated_at': datetime.utcnow()}},
+        )
+        return
+    await db['broadcasts'].update_one(
+        {'_id': broadcast_id},
+        {'$set': {'status': SENDING, 'updated_at': datetime.utcnow()}},
+    )
+    # Covers empty audiences and chunks the worker finished while we were still resolving
+    await close_finished_broadcasts(db, [broadcast_id])
@@ -0,0 +1,291 @@
+import logging
+from typing import Dict, Iterable, List
+
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+
+from .assignments import recount_tasks
+from .config import settings
+
+logger = logging.getLogger('uvicorn.error')
+
+# Leave / remove flows that clear memberships and assignments in one go.
+#
+# Each flow is the smallest fixed set of server-side operations for what it
+# removes, independent of how many volunteers or events are involved:
+#   * the rows to act on are computed by one aggregation (a $lookup from a
+#     delegate to its org's volunteers, a $group of a user's memberships)
+#     that returns only ids, never the documents;
+#   * memberships and assignments go in single `$in` / `$or` deletes;
+#   * per-task volunteer_count decrements and any other task updates share
+#     one unordered bulk_write.
+# Clearing assignments is count, delete, bulk_write (as in
+# `assignments.delete_assignments`); if the delete removed a different
+# number of rows than were counted, the tasks are recounted afterwards.
+# tests/test_cascade.py pins the number of round trips of each flow.
+#
+# When the deployment is a replica set (and CASCADE_TRANSACTIONS is on) a
+# flow runs inside a transaction, retried by the driver on transient
+# errors, so a failure part way through leaves nothing half removed.
+# Standalone servers run the same operations without one.
+
+DETACHED = {'assigned_delegate': '', 'assigned_delegate_org_code': '', 'assigned_delegate_org': ''}
+
+_replica_set: bool | None = None
+
+
+class Rejected(Exception):
+    """A flow found nothing it may remove; carries the HTTP status and detail for the route."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Flow:
+    """One run of a flow: every call goes through its session when it has one."""
+
+    def __init__(self, db, session=None):
+        self.db = db
+        self.session = session
+        self.stale_tasks: List[str] = []
+
+    async def call(self, method, *args, **kwargs):
+        return await method(*args, session=self.session, **kwargs)
+
+    async def first(self, method, *args, **kwargs) -> Dict | None:
+        """First result of a cursor-returning call (find / aggregate)."""
+        rows = await method(*args, session=self.session, **kwargs).to_list(1)
+        return rows[0] if rows else None
+
+    async def fetch(self, method, *args, **kwargs) -> List[Dict]:
+        return await method(*args, session=self.session, **kwargs).to_list(None)
+
+
+async def transactions_available(db) -> bool:
+    """Whether the server is a replica set member (cached after the first check)."""
+    global _replica_set
+    if _replica_set is None:
+        try:
+            hello = await db.client.admin.command('hello')
+            _replica_set = bool(hello.get('setName'))
+        except Exception as e:
+            logger.info('cascade: transactions unavailable (%s)', e)
+            _replica_set = False
+    return _replica_set
+
+
+async def run(db, body):
+    """Run `body(flow)`, in a transaction when available; returns its result."""
+    if settings.CASCADE_TRANSACTIONS and await transactions_available(db):
+        async with await db.client.start_session() as session:
+            flow = Flow(db, session)
+
+            async def attempt(s):
+                # with_transaction retries the whole body on transient errors
+                flow.stale_tasks = []
+                return await body(flow)
+
+            result = await session.with_transaction(attempt)
+    else:
+        flow = Flow(db)
+        result = await body(flow)
+    if flow.stale_tasks:
+        await recount_tasks(db, flow.stale_tasks)
+    return result
+
+
+async def _clear_assignments(flow: Flow, query: Dict, per_task: Dict[str, int] | None = None, task_ops: Iterable = ()) -> int:
+    """Delete the assignments matching `query`, then apply count decrements plus `task_ops` in one bulk_write.
+
+    `per_task` may be passed in when the caller has already counted the rows.
+    """
+    if per_task is None:
+        per_task = await _count_assignments(flow, query)
+    deleted = 0
+    ops = list(task_ops)
+    if per_task:
+        result = await flow.call(flow.db['task_assignments'].delete_many, query)
+        deleted = result.deleted_count
+        if deleted == sum(per_task.values()):
+            ops += [
+                UpdateOne({'_id': ObjectId(aid)}, {'$inc': {'volunteer_count': -n}})
+                for aid, n in per_task.items() if ObjectId.is_valid(aid)
+            ]
+        else:
+            flow.stale_tasks += list(per_task)
+    if ops:
+        await flow.call(flow.db['event_tasks'].bulk_write, ops, ordered=False)
+    return deleted
+
+
+async def _count_assignments(flow: Flow, match: Dict) -> Dict[str, int]:
+    rows = await flow.fetch(flow.db['task_assignments'].aggregate, [
+        {'$match': match},
+        {'$group': {'_id': '$activity_id', 'count': {'$sum': 1}}},
+    ])
+    return {row['_id']: row['count'] for row in rows}
+
+
+def _org_volunteers(delegate_match: Dict, volunteer_match: Dict) -> List[Dict]:
+    """Pipeline: the first delegate matching `delegate_match`, with the `_id`, `user_id` and
+    `event_id` of its org's volunteers that also match `volunteer_match`."""
+    return [
+        {'$match': delegate_match},
+        {'$limit': 1},
+        {'$lookup': {
+            'from': 'event_volunteers',
+            'localField': 'delegate_org_code',
+            'foreignField': 'delegate_org_code',
+            # A delegate without a code has no org; don't pair it with other code-less rows
+            'pipeline': [
+                {'$match': {**volunteer_match, 'role': 'volunteer', 'delegate_org_code': {'$type': 'string'}}},
+                {'$project': {'user_id': 1, 'event_id': 1}},
+            ],
+            'as': 'volunteers',
+        }},
+        {'$project': {'event_id': 1, 'delegate_org_code': 1, 'volunteers': 1}},
+    ]
+
+
+async def remove_delegate(db, event_id: str, delegate_email: str) -> Dict:
+    """Drop a delegate and its org's volunteers from an event, with their assignments.
+
+    Round trips: target aggregation, membership delete, then assignment count,
+    delete and one task bulk_write that also unassigns the delegate's tasks.
+    """
+    event_ids = list(dict.fromkeys([event_id, str(ObjectId(event_id))] if ObjectId.is_valid(event_id) else [event_id]))
+
+    async def body(flow: Flow):
+        delegate = await flow.first(flow.db['event_volunteers'].aggregate, _org_volunteers(
+            {'event_id': {'$in': event_ids}, 'user_id': delegate_email, 'role': 'delegate'},
+            {'event_id': {'$in': event_ids}},
+        ))
+        if not delegate:
+            raise Rejected(404, 'Delegate not found for this event')
+        ev = delegate['event_id']
+        volunteers = delegate['volunteers']
+        volunteer_ids = [v['user_id'] for v in volunteers if v.get('user_id')]
+        await flow.call(flow.db['event_volunteers'].delete_many, {
+            '_id': {'$in': [delegate['_id']] + [v['_id'] for v in volunteers]},
+        })
+        await _clear_assignments(
+            flow,
+            {'event_id': ev, 'user_id': {'$in': volunteer_ids + [delegate_email]}},
+            task_ops=[UpdateMany({'event_id': ev, 'assigned_delegate': delegate_email}, {'$unset': DETACHED})],
+        )
+        return {'event_id': ev, 'removed_volunteers': len(volunteer_ids)}
+
+    return await run(db, body)
+
+
+async def delegate_leave(db, email: str) -> Dict:
+    """Detach a delegate and every volunteer in its org from their event; clear the org's assignments there.
+
+    Round trips: target aggregation, one update_many detaching everyone,
+    then assignment count, delete and bulk_write.
+    """
+    async def body(flow: Flow):
+        delegate = await flow.first(flow.db['event_volunteers'].aggregate, _org_volunteers(
+            {'user_id': email, 'role': 'delegate'}, {},
+        ))
+        if not delegate:
+            raise Rejected(404, 'Delegate not found')
+        event_id = delegate.get('event_id')
+        code = delegate.get('delegate_org_code')
+        volunteers = delegate['volunteers']
+        await flow.call(flow.db['event_volunteers'].update_many, {
+            '_id': {'$in': [delegate['_id']] + [v['_id'] for v in volunteers]},
+        }, {'$set': {'event_id': None}})
+        if event_id:
+            user_ids = [email] + [v['user_id'] for v in volunteers if v.get('user_id')]
+            await _clear_assignments(flow, {'event_id': event_id, 'user_id': {'$in': user_ids}})
+        return {'event_id': event_id, 'delegate_org_code': code}
+
+    return await run(db, body)
+
+
+async def volunteer_leave(db, email: str, delegate_org_code: str | None = None, event_id: str | None = None) -> Dict:
+    """Drop a volunteer's memberships (optionally one org's / event's) and their assignments in those events.
+
+    Round trips: one $group over the memberships, their delete, then one
+    assignment count, delete and bulk_write across all the events at once.
+    """
+    query = {'user_id': email, 'role': 'volunteer'}
+    if delegate_org_code:
+        query['delegate_org_code'] = delegate_org_code
+    if event_id:
+        query['event_id'] = event_id
+
+    async def body(flow: Flow):
+        found = await flow.first(flow.db['event_volunteers'].aggregate, [
+            {'$match': query},
+            {'$group': {
+                '_id': None,
+                'n': {'$sum': 1},
+                'codes': {'$push': '$delegate_org_code'},
+                'event_ids': {'$addToSet': '$event_id'},
+            }},
+        ])
+        if not found or not found['n']:
+            raise Rejected(404, 'Not a volunteer in that org')
+        event_ids = [e for e in found['event_ids'] if e]
+        await flow.call(flow.db['event_volunteers'].delete_many, query)
+        if event_ids:
+            await _clear_assignments(flow, {'event_id': {'$in': event_ids}, 'user_id': email})
+        return {'delegate_org_codes': [c for c in found['codes'] if c], 'event_ids': event_ids}
+
+    return await run(db, body)
+
+
+async def leave_task(db, email: str, task_id: str) -> Dict:
+    """Leave a task and, with it, the task's event: memberships and every assignment there.
+
+    Round trips: task read, one assignment count that both checks the user
+    is on the task and yields every task whose count changes, then the
+    assignment delete, membership delete and bulk_write.
+    """
+    async def body(flow: Flow):
+        task = await flow.call(flow.db['event_tasks'].find_one, {'_id': ObjectId(task_id)}, {'event_id': 1})
+        if not task:
+            raise Rejected(404, 'Task not found')
+        event_id = task.get('event_id')
+        query = {'user_id': email, '$or': [{'activity_id': task_id}]}
+        if event_id:
+            query['$or'].append({'event_id': event_id})
+        per_task = await _count_assignments(flow, query)
+        if task_id not in per_task:
+            raise Rejected(404, 'Not assigned to this task')
+        if event_id:
+            await flow.call(flow.db['event_volunteers'].delete_many, {'event_id': event_id, 'user_id': email, 'role': 'volunteer'})
+        await _clear_assignments(flow, query, per_task)
+        return {'event_id': event_id, 'affected_tasks': list(per_task)}
+
+    return await run(db, body)
+
+
+async def remove_volunteer(db, delegate_email: str, volunteer_email: str) -> Dict:
+    """A delegate removes one of its org's volunteers and the volunteer's assignments in that event.
+
+    Round trips: one aggregation resolving the delegate and the volunteer,
+    the membership delete, then assignment count, delete and bulk_write.
+    """
+    async def body(flow: Flow):
+        delegate = await flow.first(flow.db['event_volunteers'].aggregate, _org_volunteers(
+            {'user_id': delegate_email, 'role': 'delegate'},
+            {'user_id': volunteer_email},
+        ))
+        if not delegate:
+            raise Rejected(403, 'Not a delegate')
+        if not delegate['volunteers']:
+            raise Rejected(404, 'Volunteer not found in your org')
+        # The first match, as a find_one on (code, role, user_id) would return
+        volunteer = delegate['volunteers'][0]
+        event_id = volunteer.get('event_id')
+        await flow.call(flow.db['event_volunteers'].delete_one, {'_id': volunteer['_id']})
+        if event_id:
+            await _clear_assignments(flow, {'event_id': event_id, 'user_id': volunteer_email})
+        return {'event_id': event_id}
+
+    return await run(db, body)
@@ -0,0 +1,150 @@
+import math
+from typing import Dict, Hashable, List, Tuple
+
+from .cache import TTLCache
+from .config import settings
+
+# Server-side clustering of event/task pins for the map screens.
+#
+# The world is cut into square tiles of 360 / 2**zoom degrees (a plain
+# lng/lat grid), and each tile into MAP_CLUSTER_GRID x MAP_CLUSTER_GRID
+# cells. A request's bbox is rounded out to whole tiles; tiles already in
+# the cache are reused and the rest are computed together by one
+# aggregation that buckets points into cells and returns a count and
+# centroid per cell. Tiles are cached for MAP_CLUSTER_CACHE_SECONDS, so
+# panning mostly re-reads cached tiles and new pins show up within that
+# window.
+
+BBox = Tuple[float, float, float, float]  # min_lng, min_lat, max_lng, max_lat
+Tile = Tuple[int, int]
+
+_tile_cache = TTLCache(maxsize=settings.MAP_CLUSTER_CACHE_SIZE, ttl=settings.MAP_CLUSTER_CACHE_SECONDS)
+
+# Big-polygon CRS: lets $geoWithin take polygons wider than a hemisphere
+_STRICT_WINDING = {'type': 'name', 'properties': {'name': 'urn:x-mongodb:crs:strictwinding:EPSG:4326'}}
+
+
+def parse_bbox(bbox: str) -> BBox:
+    """`min_lng,min_lat,max_lng,max_lat` -> tuple; raises ValueError if malformed."""
+    parts = [float(p) for p in bbox.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox needs four numbers')
+    min_lng, min_lat, max_lng, max_lat = parts
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError('bbox out of range')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def tile_size(zoom: int) -> float:
+    return 360.0 / (2 ** zoom)
+
+
+def tiles_for(bbox: BBox, zoom: int) -> List[Tile]:
+    size = tile_size(zoom)
+    min_lng, min_lat, max_lng, max_lat = bbox
+    xs = range(int((min_lng + 180) // size), int(math.ceil((max_lng + 180) / size)))
+    ys = range(int((min_lat + 90) // size), int(math.ceil((max_lat + 90) / size)))
+    return [(x, y) for x in xs for y in ys]
+
+
+def _envelope(tiles: List[Tile], zoom: int) -> BBox:
+    size = tile_size(zoom)
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    return (
+        max(-180.0, min(xs) * size - 180),
+        max(-90.0, min(ys) * size - 90),
+        min(180.0, (max(xs) + 1) * size - 180),
+        min(90.0, (max(ys) + 1) * size - 90),
+    )
+
+
+# Polygon vertices stay this far from the poles (every longitude meets there,
+# so corners at +-90 would be repeated points)
+_POLE_LAT = 90 - 1e-6
+# Longest stretch of a latitude edge between two vertices, in degrees
+_EDGE_STEP = 10.0
+
+
+def _edge(lat: float, from_lng: float, to_lng: float) -> List[List[float]]:
+    steps = max(1, math.ceil(abs(to_lng - from_lng) / _EDGE_STEP))
+    return [[from_lng + (to_lng - from_lng) * i / steps, lat] for i in range(steps)]
+
+
+def _box_polygon(bbox: BBox, margin: float) -> Dict:
+    """$geoWithin filter for `bbox` padded by `margin` degrees.
+
+    Polygon edges are geodesics rather than parallels, so the box is padded
+    and its latitude edges are split into short segments; points that land
+    outside the requested tiles are dropped after grouping. A box spanning
+    every longitude can't be a polygon (its east and west edges would be the
+    same meridian), so it becomes a plain latitude range instead.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    min_lng, max_lng = max(-180.0, min_lng - margin), min(180.0, max_lng + margin)
+    min_lat, max_lat = max(-90.0, min_lat - margin), min(90.0, max_lat + margin)
+    if max_lng - min_lng >= 360:
+        return {'location.coordinates.1': {'$gte': min_lat, '$lte': max_lat}}
+    min_lat, max_lat = max(-_POLE_LAT, min_lat), min(_POLE_LAT, max_lat)
+    ring = _edge(min_lat, min_lng, max_lng) + _edge(max_lat, max_lng, min_lng) + [[min_lng, min_lat]]
+    return {'location': {'$geoWithin': {'$geometry': {'type': 'Polygon', 'coordinates': [ring], 'crs': _STRICT_WINDING}}}}
+
+
+def cluster_pipeline(scope: Dict, bbox: BBox, zoom: int) -> List[Dict]:
+    """Bucket the scope's points inside `bbox` into grid cells: count, centroid, one sample id."""
+    cell = tile_size(zoom) / settings.MAP_CLUSTER_GRID
+    lng = {'$arrayElemAt': ['$location.coordinates', 0]}
+    lat = {'$arrayElemAt': ['$location.coordinates', 1]}
+    return [
+        {'$match': {**scope, **_box_polygon(bbox, cell)}},
+        {'$project': {'lng': lng, 'lat': lat}},
+        {'$group': {
+            '_id': {
+                'x': {'$floor': {'$divide': [{'$add': ['$lng', 180]}, cell]}},
+                'y': {'$floor': {'$divide': [{'$add': ['$lat', 90]}, cell]}},
+            },
+            'count': {'$sum': 1},
+            'lng': {'$avg': '$lng'},
+            'lat': {'$avg': '$lat'},
+            'sample_id': {'$first': '$_id'},
+        }},
+    ]
+
+
+async def clusters_for(db, collection: str, scope: Dict, scope_key: Hashable, bbox: BBox, zoom: int) -> Dict:
+    """Clusters for every tile `bbox` touches, computing only the uncached tiles."""
+    tiles = tiles_for(bbox, zoom)
+    if len(tiles) > settings.MAP_CLUSTER_MAX_TILES:
+        raise ValueError('bbox covers too many tiles for this zoom')
+
+    per_tile: Dict[Tile, List[Dict]] = {}
+    missing = []
+    for tile in tiles:
+        cached = _tile_cache.get((collection, scope_key, zoom, tile))
+        if cached is None:
+            missing.append(tile)
+        else:
+            per_tile[tile] = cached
+
+    if missing:
+        wanted = set(missing)
+        computed: Dict[Tile, List[Dict]] = {tile: [] for tile in missing}
+        grid = settings.MAP_CLUSTER_GRID
+        async for row in db[collection].aggregate(cluster_pipeline(scope, _envelope(missing, zoom), zoom)):
+            tile = (int(row['_id']['x']) // grid, int(row['_id']['y']) // grid)
+            if tile not in wanted:
+                continue
+            cluster = {'lng': row['lng'], 'lat': row['lat'], 'count': row['count']}
+            if row['count'] == 1:
+                cluster['id'] = str(row['sample_id'])
+            computed[tile].append(cluster)
+        for tile, clusters in computed.items():
+            _tile_cache.set((collection, scope_key, zoom, tile), clusters)
+        per_tile.update(computed)
+
+    return {
+        'zoom': zoom,
+        'tiles': len(tiles),
+        'cached_tiles': len(tiles) - len(missing),
+        'clusters': [c for tile in tiles for c in per_tile[tile]],
+    }
@@ -9,6 +9,16 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Build the request principal from token claims instead of a users lookup
+    AUTH_CLAIMS_PRINCIPAL: bool = True
+    # How long a user's token_version is trusted before sensitive routes re-read it
+    TOKEN_VERSION_CACHE_SECONDS: int = 30
+
+    # Password hashing cost and the process pool it runs in (0 = one worker per CPU)
+    PASSWORD_HASH_ROUNDS: int = 29000
+    PASSWORD_HASH_WORKERS: int = 0
+    # Max hashes queued or running at once (0 = twice the worker count)
+    PASSWORD_HASH_CONCURRENCY: int = 0
     MONGO_URL: str
 
     MONGO_USER: str | None = None
@@ -24,11 +34,75 @@ class Settings(BaseSettings):
     SMTP_FROM: str | None = None
     SMTP_TLS: bool = True
     SENDGRID_API_KEY: str | None = None
+    # Reused SMTP sessions idle longer than this are checked with NOOP before sending
+    SMTP_IDLE_SECONDS: int = 60
+    # Envelope recipients per SMTP message in a broadcast (many servers refuse more than 100)
+    SMTP_MAX_RECIPIENTS: int = 100
+    # Background outbox worker: batch size, idle poll interval, claim lease and retry policy
+    EMAIL_OUTBOX_WORKER: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_MAX_ATTEMPTS: int = 6
+    EMAIL_RETRY_BASE_SECONDS: int = 30
+    EMAIL_RETRY_MAX_SECONDS: int = 3600
+    # Roster rows fetched per cursor round trip when resolving broadcast recipients
+    BROADCAST_CURSOR_BATCH_SIZE: int = 1000
+    # In-app notifications: docs per unordered insert, and the audience size at which an
+    # event gets one shared notification (fan-out on read) instead of one per recipient
+    NOTIFY_WRITE_BATCH_SIZE: int = 1000
+    NOTIFY_FANOUT_ON_READ_MIN: int = 5000
+    # Retention (app/retention.py): a user's read notifications expire this long after being read; anything
+    # older than NOTIFY_ARCHIVE_AFTER_DAYS (with its read markers) moves to notifications_archive.
+    # Interval 0 disables the job.
+    NOTIFY_READ_RETENTION_DAYS: int = 30
+    NOTIFY_ARCHIVE_AFTER_DAYS: int = 90
+    NOTIFY_ARCHIVE_BATCH_SIZE: int = 1000
+    NOTIFY_ARCHIVE_INTERVAL_SECONDS: int = 6 * 3600
+    # Live updates (SSE): per-stream backlog before a resync, heartbeat interval, streams per worker
+    LIVE_QUEUE_SIZE: int = 100
+    LIVE_HEARTBEAT_SECONDS: float = 20
+    LIVE_MAX_CONNECTIONS: int = 10000
 
     FRONTEND_URL: str = "http://localhost:19006"
     DEBUG_EMAIL_FALLBACK: bool = True
 
     GOOGLE_MAPS_API_KEY: str | None = None
+    # Upstream geocoder (point at a local stand-in server for testing)
+    GEOCODE_URL: str = "https://maps.googleapis.com/maps/api/geocode/json"
+    GEOCODE_TIMEOUT_SECONDS: float = 10
+    # Keep-alive connections held open to the geocoder
+    GEOCODE_POOL_SIZE: int = 10
+    # In-process cache of normalized address -> result, and how long "no results" answers are kept
+    GEOCODE_CACHE_SIZE: int = 5000
+    GEOCODE_CACHE_TTL_SECONDS: int = 86400
+    GEOCODE_NEGATIVE_TTL_SECONDS: int = 300
+    # Shared Mongo-backed tier (geocode_cache collection, expired by a TTL index)
+    GEOCODE_PERSISTENT_CACHE: bool = False
+    GEOCODE_PERSISTENT_TTL_SECONDS: int = 30 * 86400
+
+    # Seconds between background passes that repair event_tasks.volunteer_count (0 disables)
+    VOLUNTEER_COUNT_RECONCILE_SECONDS: int = 300
+
+    # Keyset pagination: page size when `limit` is omitted, and the hard cap
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 500
+    # Roster entries embedded in event detail responses (the rest via /events/{id}/roster)
+    ROSTER_PAGE_SIZE: int = 50
+
+    # Run leave/remove cascades (app/cascade.py) in a transaction when the server is a replica set
+    CASCADE_TRANSACTIONS: bool = True
+
+    # Upper bound on the radius accepted by the /near endpoints, in metres
+    GEO_MAX_RADIUS_M: int = 100_000
+    # /map/clusters: cells per tile side, tile cache size/lifetime, and max tiles per request
+    MAP_CLUSTER_GRID: int = 8
+    MAP_CLUSTER_CACHE_SIZE: int = 4096
+    MAP_CLUSTER_CACHE_SECONDS: int = 60
+    MAP_CLUSTER_MAX_TILES: int = 64
+
+    # Responses smaller than this many bytes are sent uncompressed
+    GZIP_MINIMUM_SIZE: int = 1024
 
     model_config = SettingsConfigDict(
             env_file=str(BASE_DIR / ".env"),
@@ -1,14 +1,44 @@
-from pymongo.mongo_client import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 from contextlib import asynccontextmanager
+import asyncio
 from .config import settings
+from .indexes import ensure_indexes
+from .assignments import run_volunteer_count_reconciler
+from .hashing import start_hash_pool, shutdown_hash_pool
+from .geocoding import geocoder
+from .email_outbox import run_email_outbox_worker
+from .retention import run_notification_retention
+from .orgs import run_org_key_backfill
+from .join_codes import run_join_code_backfill
 from fastapi import FastAPI, Request
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.mongo_client = MongoClient(settings.MONGO_URL)
+    app.mongo_client = AsyncIOMotorClient(settings.MONGO_URL)
     app.db = app.mongo_client['GatorGather']
+    await ensure_indexes(app.db)
+    start_hash_pool()
+    background = [
+        asyncio.create_task(run_org_key_backfill(app.db)),
+        asyncio.create_task(run_join_code_backfill(app.db)),
+    ]
+    if settings.VOLUNTEER_COUNT_RECONCILE_SECONDS > 0:
+        background.append(asyncio.create_task(
+            run_volunteer_count_reconciler(app.db, settings.VOLUNTEER_COUNT_RECONCILE_SECONDS)
+        ))
+    if settings.EMAIL_OUTBOX_WORKER:
+        background.append(asyncio.create_task(run_email_outbox_worker(app.db)))
+    if settings.NOTIFY_ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(
+            run_notification_retention(app.db, settings.NOTIFY_ARCHIVE_INTERVAL_SECONDS)
+        ))
     yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    shutdown_hash_pool()
+    geocoder.close()
     app.mongo_client.close()
 
 def get_db(request: Request):
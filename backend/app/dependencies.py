@@ -1,16 +1,6 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from .auth import verify_token
-from .models import TokenData
+# Request dependencies for route handlers. `get_current_user` builds the
+# principal from token claims; use `get_verified_user` on routes that must
+# honour token revocation (admin views, removals, event edits).
+from .auth import get_current_user, get_verified_user
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
-
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    payload = verify_token(token)
-    email: str = payload.get('sub')
-    if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Invalid authentication credentials',
-        )
-    return TokenData(email=email)
\ No newline at end of file
+__all__ = ['get_current_user', 'get_verified_user']
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .email_service import make_transport, EmailNotConfigured
+
+logger = logging.getLogger('uvicorn.error')
+
+# Transactional email goes through the `email_outbox` collection: request
+# handlers only insert a message, and a background worker started from
+# `lifespan` drains the outbox in batches over one reused provider
+# connection. A message moves pending -> sending -> sent, or back to
+# pending with exponential backoff on failure until EMAIL_MAX_ATTEMPTS,
+# after which it is left as failed. Finished messages lose their body and
+# expire a week later. Claims are leased, so messages held by
+# a worker that died are picked up again once the lease runs out, and
+# several app processes can drain the same outbox.
+#
+# A message's `to` is either one address or, for broadcasts (see
+# app/broadcasts.py), a list sent in one provider call with `send_many`.
+# Broadcast messages carry a `broadcast_id`, and their outcomes are added
+# to that broadcast's sent/failed counters as they are recorded.
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+_wakeup: asyncio.Event | None = None
+
+
+def _wake() -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def outbox_message(to: str | List[str], subject: str, body: str, **extra) -> Dict:
+    now = datetime.utcnow()
+    return {
+        'to': to,
+        'subject': subject,
+        'body': body,
+        'status': PENDING,
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+        **extra,
+    }
+
+
+async def enqueue_email(db, to: str, subject: str, body: str, **extra) -> ObjectId:
+    """Queue one message; returns its outbox id. `extra` fields are stored alongside."""
+    result = await db['email_outbox'].insert_one(outbox_message(to, subject, body, **extra))
+    _wake()
+    return result.inserted_id
+
+
+async def enqueue_many(db, messages: Iterable[Dict]) -> int:
+    """Queue documents built with `outbox_message` in one unordered insert."""
+    docs = list(messages)
+    if not docs:
+        return 0
+    await db['email_outbox'].insert_many(docs, ordered=False)
+    _wake()
+    return len(docs)
+
+
+async def claim_batch(db, limit: int) -> List[Dict]:
+    """Lease up to `limit` due messages to this worker."""
+    now = datetime.utcnow()
+    due = {'$or': [
+        {'status': PENDING, 'next_attempt_at': {'$lte': now}},
+        {'status': SENDING, 'locked_until': {'$lte': now}},
+    ]}
+    ids = [d['_id'] async for d in db['email_outbox'].find(due, {'_id': 1}).sort('next_attempt_at', 1).limit(limit)]
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    await db['email_outbox'].update_many(
+        {'_id': {'$in': ids}, **due},
+        {'$set': {
+            'status': SENDING,
+            'claim': claim,
+            'locked_until': now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+        }},
+    )
+    # Only what this claim won; another worker may have taken some of the ids
+    return await db['email_outbox'].find({'claim': claim}).to_list(None)
+
+
+Outcome = Tuple[str | None, List[str]]  # (error, refused recipients)
+
+
+def _send_all(transport, batch: List[Dict]) -> List[Outcome]:
+    """Send a claimed batch on one connection (runs in a worker thread)."""
+    outcomes = []
+    for msg in batch:
+        try:
+            if isinstance(msg['to'], list):
+                refused = transport.send_many(msg['to'], msg['subject'], msg['body'])
+            else:
+                transport.send(msg['to'], msg['subject'], msg['body'])
+                refused = []
+            outcomes.append((None, refused))
+        except Exception as e:
+            outcomes.append((str(e) or type(e).__name__, []))
+    return outcomes
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(settings.EMAIL_RETRY_MAX_SECONDS, settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+async def _tally_broadcasts(db, tally: Dict[ObjectId, Dict[str, int]]) -> None:
+    """Add recorded outcomes to their broadcasts and close the ones now complete."""
+    if not tally:
+        return
+    now = datetime.utcnow()
+    await db['broadcasts'].bulk_write(
+        [UpdateOne({'_id': bid}, {'$inc': counts, '$set': {'updated_at': now}}) for bid, counts in tally.items()],
+        ordered=False,
+    )
+    await close_finished_broadcasts(db, list(tally))
+
+
+async def close_finished_broadcasts(db, ids: List[ObjectId]) -> None:
+    """Mark fully queued broadcasts whose every recipient has an outcome as done."""
+    await db['broadcasts'].update_many(
+        {
+            '_id': {'$in': ids},
+            'status': 'sending',
+            '$expr': {'$gte': [{'$add': ['$sent', '$failed']}, '$total']},
+        },
+        {'$set': {'status': 'done', 'finished_at': datetime.utcnow()}},
+    )
+
+
+async def _record(db, batch: List[Dict], outcomes: List[Outcome]) -> None:
+    now = datetime.utcnow()
+    ops = []
+    tally: Dict[ObjectId, Dict[str, int]] = defaultdict(lambda: {'sent': 0, 'failed': 0})
+    for msg, (error, refused) in zip(batch, outcomes):
+        attempts = msg.get('attempts', 0) + 1
+        recipients = len(msg['to']) if isinstance(msg['to'], list) else 1
+        final = error is None or attempts >= settings.EMAIL_MAX_ATTEMPTS
+        if final and msg.get('broadcast_id'):
+            counts = tally[msg['broadcast_id']]
+            counts['sent'] += 0 if error else recipients - len(refused)
+            counts['failed'] += recipients if error else len(refused)
+        # Finished rows drop the body: it can carry secrets such as password reset links
+        if error is None:
+            done = {'status': SENT, 'sent_at': now, 'attempts': attempts}
+            if refused:
+                done['refused'] = refused
+            update = {'$set': done, '$unset': {'claim': '', 'locked_until': '', 'body': ''}}
+        elif attempts >= settings.EMAIL_MAX_ATTEMPTS:
+            update = {
+                '$set': {'status': FAILED, 'failed_at': now, 'attempts': attempts, 'last_error': error},
+                '$unset': {'claim': '', 'locked_until': '', 'body': ''},
+            }
+        else:
+            update = {
+                '$set': {'status': PENDING, 'attempts': attempts, 'last_error': error, 'next_attempt_at': now + _backoff(attempts)},
+                '$unset': {'claim': '', 'locked_until': ''},
+            }
+        ops.append(UpdateOne({'_id': msg['_id'], 'claim': msg['claim']}, update))
+    if ops:
+        await db['email_outbox'].bulk_write(ops, ordered=False)
+    await _tally_broadcasts(db, tally)
+
+
+async def drain_once(db, transport) -> int:
+    """Claim, send and record one batch; returns the number of messages handled."""
+    batch = await claim_batch(db, settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0
+    outcomes = await run_in_threadpool(_send_all, transport, batch)
+    await _record(db, batch, outcomes)
+    errors = [e for e, _ in outcomes if e]
+    if errors:
+        logger.warning('email outbox: %d of %d sends failed (%s)', len(errors), len(batch), errors[0])
+    return len(batch)
+
+
+async def scrub_finished(db) -> int:
+    """Strip bodies from sent / failed rows written before they were dropped on completion,
+    and stamp old failed rows so the TTL index expires them."""
+    now = datetime.utcnow()
+    scrubbed = await db['email_outbox'].update_many(
+        {'status': {'$in': [SENT, FAILED]}, 'body': {'$exists': True}},
+        {'$unset': {'body': ''}},
+    )
+    await db['email_outbox'].update_many(
+        {'status': FAILED, 'failed_at': {'$exists': False}},
+        {'$set': {'failed_at': now}},
+    )
+    return scrubbed.modified_count
+
+
+async def run_email_outbox_worker(db) -> None:
+    """Background loop started from `lifespan`."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    transport = None
+    try:
+        await scrub_finished(db)
+    except Exception as e:
+        logger.warning('email outbox scrub failed: %s', e)
+    try:
+        while True:
+            try:
+                if transport is None:
+                    transport = make_transport()
+                handled = await drain_once(db, transport)
+            except asyncio.CancelledError:
+                raise
+            except EmailNotConfigured as e:
+                logger.warning('email outbox idle: %s', e)
+                handled = 0
+                await asyncio.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS * 10)
+            except Exception as e:
+                logger.warning('email outbox pass failed: %s', e)
+                handled = 0
+            if handled:
+                continue  # more may be due; keep draining
+            # The transport stays open while idle; it checks the session before reusing it
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.EMAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if transport is not None:
+            transport.close()
+        _wakeup = None
@@ -2,69 +2,213 @@ import json
 import http.client
 import smtplib
 import ssl
+import time
 from email.message import EmailMessage
+from typing import List
 from app.config import settings
 
-def send_email(to: str, subject: str, body: str) -> tuple[bool, str | None]:
-    """Send email via SendGrid API or SMTP based on EMAIL_PROVIDER setting."""
-    provider = settings.EMAIL_PROVIDER.lower()
-    
-    if provider == "sendgrid":
+# Transports hold one provider connection open across sends so the outbox
+# worker (app/email_outbox.py) pays for the SMTP/TLS or HTTPS handshake once
+# rather than per message. They are blocking; call them from a worker thread.
+#
+# `send_many` delivers one message to a list of recipients in a single
+# provider call (up to `recipient_limit()`), each recipient seeing only their
+# own address, and returns the addresses the provider refused.
+
+
+class EmailNotConfigured(Exception):
+    pass
+
+
+def _sendgrid_from() -> str:
+    return settings.EMAIL_FROM.split("<")[-1].replace(">", "").strip() if "<" in settings.EMAIL_FROM else settings.EMAIL_FROM
+
+
+def _smtp_from() -> str | None:
+    return settings.SMTP_FROM or settings.EMAIL_FROM or settings.SMTP_USER
+
+
+def email_config_error() -> str | None:
+    """Why email can't be sent with the current settings, or None if it can."""
+    if settings.EMAIL_PROVIDER.lower() == "sendgrid":
         if not settings.SENDGRID_API_KEY or not settings.EMAIL_FROM:
-            return False, "SendGrid not configured"
+            return "SendGrid not configured"
+        return None
+    if not (settings.SMTP_HOST and _smtp_from()):
+        return "SMTP not configured (set SMTP_* in .env)"
+    return None
+
+
+class SendGridTransport:
+    """Keep-alive HTTPS connection to the SendGrid v3 API."""
+
+    # SendGrid accepts at most 1000 personalizations per /mail/send request
+    max_recipients = 1000
+
+    def __init__(self):
+        self._conn: http.client.HTTPSConnection | None = None
+
+    def _request(self, body: str) -> http.client.HTTPResponse:
+        if self._conn is None:
+            self._conn = http.client.HTTPSConnection("api.sendgrid.com", timeout=30)
+        headers = {
+            "Authorization": f"Bearer {settings.SENDGRID_API_KEY}",
+            "Content-Type": "application/json"
+        }
         try:
-            conn = http.client.HTTPSConnection("api.sendgrid.com")
-            from_email = settings.EMAIL_FROM.split("<")[-1].replace(">", "").strip() if "<" in settings.EMAIL_FROM else settings.EMAIL_FROM
-            payload = {
-                "personalizations": [{"to": [{"email": to}]}],
-                "from": {"email": from_email},
-                "subject": subject,
-                "content": [{"type": "text/plain", "value": body}]
-            }
-            headers = {
-                "Authorization": f"Bearer {settings.SENDGRID_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            conn.request("POST", "/v3/mail/send", json.dumps(payload), headers)
-            resp = conn.getresponse()
-            if resp.status in (200, 202):
-                return True, None
-            return False, f"SendGrid status {resp.status}"
-        except Exception as e:
-            return False, str(e)
-
-    # SMTP fallback
-    host = settings.SMTP_HOST
-    port = settings.SMTP_PORT
-    user = settings.SMTP_USER
-    pwd = settings.SMTP_PASS
-    from_addr = settings.SMTP_FROM or settings.EMAIL_FROM or user
-    
-    if not (host and user and pwd and from_addr):
-        return False, "SMTP not configured (set SMTP_* in .env)"
-    
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = from_addr
-    msg["To"] = to
-    msg.set_content(body)
-    
-    try:
+            self._conn.request("POST", "/v3/mail/send", body, headers)
+            resp = self._conn.getresponse()
+            resp.read()  # drain so the connection can be reused
+            return resp
+        except Exception:
+            self.close()
+            raise
+
+    def _post(self, payload: dict) -> None:
+        body = json.dumps(payload)
+        try:
+            resp = self._request(body)
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # Keep-alive connection was closed by the server while idle: reconnect once
+            resp = self._request(body)
+        if resp.status not in (200, 202):
+            raise RuntimeError(f"SendGrid status {resp.status}")
+
+    def send(self, to: str, subject: str, body: str) -> None:
+        self._post({
+            "personalizations": [{"to": [{"email": to}]}],
+            "from": {"email": _sendgrid_from()},
+            "subject": subject,
+            "content": [{"type": "text/plain", "value": body}]
+        })
+
+    def send_many(self, recipients: List[str], subject: str, body: str) -> List[str]:
+        # One personalization per recipient keeps the addresses private to each
+        self._post({
+            "personalizations": [{"to": [{"email": to}]} for to in recipients],
+            "from": {"email": _sendgrid_from()},
+            "subject": subject,
+            "content": [{"type": "text/plain", "value": body}]
+        })
+        return []
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SMTPTransport:
+    """One SMTP session reused across messages, re-opened if it went idle or dropped."""
+
+    def __init__(self):
+        self._conn: smtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    @property
+    def max_recipients(self) -> int:
+        return settings.SMTP_MAX_RECIPIENTS
+
+    def _connect(self) -> smtplib.SMTP:
+        host, port = settings.SMTP_HOST, settings.SMTP_PORT
         if port == 465:
-            with smtplib.SMTP_SSL(host, port, context=ssl.create_default_context()) as s:
-                s.login(user, pwd)
-                s.send_message(msg)
+            conn = smtplib.SMTP_SSL(host, port, context=ssl.create_default_context(), timeout=30)
         else:
-            with smtplib.SMTP(host, port) as s:
-                if settings.SMTP_TLS:
-                    s.starttls(context=ssl.create_default_context())
-                s.login(user, pwd)
-                s.send_message(msg)
+            conn = smtplib.SMTP(host, port, timeout=30)
+            if settings.SMTP_TLS:
+                conn.starttls(context=ssl.create_default_context())
+        # Local debugging servers take mail without auth
+        if settings.SMTP_USER and settings.SMTP_PASS:
+            conn.login(settings.SMTP_USER, settings.SMTP_PASS)
+        return conn
+
+    def _session(self) -> smtplib.SMTP:
+        if self._conn is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+            try:
+                self._conn.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _send(self, msg: EmailMessage, recipients: List[str] | None = None) -> dict:
+        try:
+            refused = self._session().send_message(msg, to_addrs=recipients)
+        except smtplib.SMTPRecipientsRefused:
+            # An answer about the addresses, not the session
+            raise
+        except (smtplib.SMTPException, OSError):
+            # Server dropped or broke the session between messages: reconnect once
+            self.close()
+            refused = self._session().send_message(msg, to_addrs=recipients)
+        self._last_used = time.monotonic()
+        return refused
+
+    def send(self, to: str, subject: str, body: str) -> None:
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = _smtp_from()
+        msg["To"] = to
+        msg.set_content(body)
+        self._send(msg)
+
+    def send_many(self, recipients: List[str], subject: str, body: str) -> List[str]:
+        # One DATA transfer with every recipient on the envelope only (RCPT TO), not in the headers
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = _smtp_from()
+        msg["To"] = "undisclosed-recipients:;"
+        msg.set_content(body)
+        try:
+            return list(self._send(msg, recipients))
+        except smtplib.SMTPRecipientsRefused as e:
+            # Every address refused: nothing to retry
+            return list(e.recipients)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
+
+def make_transport():
+    error = email_config_error()
+    if error:
+        raise EmailNotConfigured(error)
+    if settings.EMAIL_PROVIDER.lower() == "sendgrid":
+        return SendGridTransport()
+    return SMTPTransport()
+
+
+def recipient_limit() -> int:
+    """Recipients per `send_many` call for the configured provider."""
+    if settings.EMAIL_PROVIDER.lower() == "sendgrid":
+        return SendGridTransport.max_recipients
+    return settings.SMTP_MAX_RECIPIENTS
+
+
+def send_email(to: str, subject: str, body: str) -> tuple[bool, str | None]:
+    """Send one email right now on a fresh connection (SendGrid or SMTP per EMAIL_PROVIDER).
+
+    Request handlers should use app.email_outbox.enqueue_email instead.
+    """
+    try:
+        transport = make_transport()
+    except EmailNotConfigured as e:
+        return False, str(e)
+    try:
+        transport.send(to, subject, body)
         return True, None
     except Exception as e:
         return False, str(e)
+    finally:
+        transport.close()
 
-def send_password_reset(to: str, token: str) -> tuple[bool, str | None]:
+def password_reset_message(token: str) -> tuple[str, str]:
     subject = "Password Reset Instructions"
     body = (
         "You requested a password reset for your account.\n\n"
@@ -72,4 +216,7 @@ def send_password_reset(to: str, token: str) -> tuple[bool, str | None]:
         "Open the app, go to the password reset screen, and paste your token to set a new password.\n"
         "If you did not request this, ignore this email."
     )
-    return send_email(to, subject, body)
\ No newline at end of file
+    return subject, body
+
+def send_password_reset(to: str, token: str) -> tuple[bool, str | None]:
+    return send_email(to, *password_reset_message(token))
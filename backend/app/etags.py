@@ -0,0 +1,37 @@
+import hashlib
+
+from fastapi import Request, Response
+
+# Conditional GET. Routes derive a strong ETag from change stamps they can
+# read cheaply (event versions, notification read flags) plus everything
+# else that shapes the body (caller, role, page, fields). When the client's
+# If-None-Match matches, the route returns 304 before running the queries
+# and serialization that would build the body.
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so a `W/` prefix is ignored."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in header.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag})
+
+
+def conditional(request: Request, response: Response, etag: str) -> Response | None:
+    """Return a 304 for a matching request, otherwise tag `response` and return None."""
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
+    return None
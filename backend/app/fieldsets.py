@@ -0,0 +1,70 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, create_model
+
+# Sparse fieldsets: `?fields=name,start_date,location` on a read endpoint
+# becomes a Mongo projection (so unused fields are neither sent by the
+# server nor decoded from BSON) and a slimmed copy of the response model
+# holding just those fields. Field names are the keys clients see in the
+# JSON, i.e. the alias where a model field has one (`_id` on EventOut).
+
+Fieldset = Optional[FrozenSet[str]]
+
+
+def response_keys(model: type[BaseModel]) -> FrozenSet[str]:
+    return frozenset(f.alias or name for name, f in model.model_fields.items())
+
+
+def parse_fields(fields: str | None, model: type[BaseModel]) -> Fieldset:
+    """Validate a comma-separated `fields` value against `model`; None means "everything"."""
+    if not fields:
+        return None
+    names = frozenset(f.strip() for f in fields.split(',') if f.strip())
+    unknown = names - response_keys(model)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return names or None
+
+
+def fieldset(model: type[BaseModel]):
+    """Route dependency parsing `?fields=` for responses of type `model`."""
+    def dependency(fields: Optional[str] = Query(default=None, description='Comma-separated response fields')) -> Fieldset:
+        return parse_fields(fields, model)
+    return dependency
+
+
+def projection(fields: Fieldset, renames: Dict[str, str] | None = None, always: Iterable[str] = ()) -> Dict | None:
+    """Mongo projection for the requested response keys.
+
+    `renames` maps response keys to document fields where they differ
+    (e.g. TaskOut's `id` is the document `_id`); keys with no document
+    counterpart can be mapped to None. `always` lists document fields the
+    route itself needs regardless of what the client asked for.
+    """
+    if fields is None:
+        return None
+    renames = renames or {}
+    wanted = {renames.get(f, f) for f in fields} | set(always)
+    wanted.discard(None)
+    proj = {f: 1 for f in wanted}
+    if '_id' not in wanted:
+        proj['_id'] = 0
+    return proj
+
+
+@lru_cache(maxsize=256)
+def sparse_model(model: type[BaseModel], fields: FrozenSet[str]) -> type[BaseModel]:
+    """`model` restricted to `fields` (cached per distinct fieldset)."""
+    picked = {
+        name: (f.annotation, f)
+        for name, f in model.model_fields.items()
+        if (f.alias or name) in fields
+    }
+    return create_model(f'{model.__name__}Sparse', __config__=model.model_config, **picked)
+
+
+def render(model: type[BaseModel], data: Dict, fields: Fieldset) -> BaseModel:
+    return (sparse_model(model, fields) if fields else model).model_validate(data)
+
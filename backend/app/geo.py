@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .pagination import PageParams, Sort, aggregate_page_stages
+
+# Proximity queries over the GeoJSON `location` points on events and tasks,
+# served by the 2dsphere indexes in app/indexes.py. Results come back
+# nearest first with the distance in metres, and page by
+# (distance_m, _id) like the other keyset-paginated lists.
+
+DISTANCE_FIELD = 'distance_m'
+
+NEAREST_FIRST: Sort = [(DISTANCE_FIELD, 1), ('_id', 1)]
+
+
+def overlap_filter(start_field: str, end_field: str, window_start: Optional[datetime], window_end: Optional[datetime]) -> Dict:
+    """Match documents whose [start_field, end_field] span overlaps the window."""
+    query: Dict = {}
+    if window_start is not None:
+        query[end_field] = {'$gte': window_start}
+    if window_end is not None:
+        query[start_field] = {'$lte': window_end}
+    return query
+
+
+def near_pipeline(lng: float, lat: float, radius_m: float, query: Dict, page: PageParams) -> List[Dict]:
+    """$geoNear over `location` within `radius_m`, then one keyset page.
+
+    $geoNear must be the first stage and emits documents nearest first; a
+    resumed page starts the index scan at the cursor's distance
+    (`minDistance` is inclusive) and the keyset match breaks ties on `_id`.
+    """
+    geo_near: Dict = {
+        'near': {'type': 'Point', 'coordinates': [lng, lat]},
+        'key': 'location',
+        'distanceField': DISTANCE_FIELD,
+        'maxDistance': radius_m,
+        'spherical': True,
+        'query': query,
+    }
+    if page.after:
+        geo_near['minDistance'] = page.after[0]
+    return [{'$geoNear': geo_near}] + aggregate_page_stages(NEAREST_FIRST, page)
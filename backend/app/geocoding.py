@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .config import settings
+
+logger = logging.getLogger('uvicorn.error')
+
+# Geocoding proxy behind GET /geocode. Lookups are keyed on a normalized
+# address and served, in order, from:
+#   1. an in-process LRU (TTLCache), bounded and per worker;
+#   2. optionally the `geocode_cache` collection, shared across workers and
+#      restarts, expired by a TTL index on `expires_at`;
+#   3. the upstream API, through one pooled keep-alive session.
+# Concurrent misses for the same address share a single upstream call.
+# "No results" answers are cached too, briefly and in memory only.
+
+
+class GeocodingUnavailable(Exception):
+    """The upstream service could not be reached or answered with a non-200."""
+
+
+class GeocodingFailed(Exception):
+    """The upstream answered with an error status (quota, denied key, ...)."""
+
+
+def normalize_address(address: str) -> str:
+    return re.sub(r'\s+', ' ', address).strip().casefold()
+
+
+class Geocoder:
+    def __init__(self):
+        self.cache = TTLCache(maxsize=settings.GEOCODE_CACHE_SIZE, ttl=settings.GEOCODE_CACHE_TTL_SECONDS)
+        self._session: requests.Session | None = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.persistent_hits = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.GEOCODE_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict:
+        return {
+            'memory': self.cache.stats(),
+            'persistent_hits': self.persistent_hits,
+            'upstream_calls': self.upstream_calls,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'inflight': len(self._inflight),
+        }
+
+    async def lookup(self, db, address: str) -> Optional[Dict]:
+        """Geocode `address`; returns None when the address has no match.
+
+        Raises GeocodingUnavailable if the upstream call fails and
+        GeocodingFailed if it returns an error status; neither is cached.
+        """
+        key = normalize_address(address)
+        cached = self.cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            # shield: one caller disconnecting must not cancel the shared lookup
+            return await asyncio.shield(pending)
+
+        pending = asyncio.ensure_future(self._resolve(db, key, address))
+        self._inflight[key] = pending
+        pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _resolve(self, db, key: str, address: str) -> Optional[Dict]:
+        if settings.GEOCODE_PERSISTENT_CACHE and db is not None:
+            doc = await db['geocode_cache'].find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+            if doc:
+                self.persistent_hits += 1
+                self.cache.set(key, doc['result'])
+                return doc['result']
+
+        result = await self._fetch(address)
+        if result is None:
+            self.cache.set(key, None, ttl=settings.GEOCODE_NEGATIVE_TTL_SECONDS)
+            return None
+        self.cache.set(key, result)
+        if settings.GEOCODE_PERSISTENT_CACHE and db is not None:
+            try:
+                await db['geocode_cache'].replace_one(
+                    {'_id': key},
+                    {
+                        'result': result,
+                        'expires_at': datetime.utcnow() + timedelta(seconds=settings.GEOCODE_PERSISTENT_TTL_SECONDS),
+                    },
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.warning('geocode cache write failed: %s', e)
+        return result
+
+    async def _fetch(self, address: str) -> Optional[Dict]:
+        self.upstream_calls += 1
+        try:
+            resp = await run_in_threadpool(
+                self.session.get,
+                settings.GEOCODE_URL,
+                params={'address': address, 'key': settings.GOOGLE_MAPS_API_KEY},
+                timeout=settings.GEOCODE_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            self.errors += 1
+            raise GeocodingUnavailable(str(e))
+        if resp.status_code != 200:
+            self.errors += 1
+            raise GeocodingUnavailable(f'HTTP {resp.status_code}')
+
+        data = resp.json()
+        status_val = data.get('status')
+        results = data.get('results', [])
+        if status_val == 'ZERO_RESULTS' or (status_val == 'OK' and not results):
+            return None
+        if status_val != 'OK':
+            # OVER_QUERY_LIMIT, REQUEST_DENIED, ...: not an answer about the address, so don't cache it
+            self.errors += 1
+            raise GeocodingFailed(status_val or 'unknown status')
+
+        first = results[0]
+        loc = first['geometry']['location']
+        return {
+            'formatted_address': first['formatted_address'],
+            'lat': loc['lat'],
+            'lng': loc['lng'],
+        }
+
+
+_MISSING = object()
+
+geocoder = Geocoder()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+# Rounds are per deployment; raising PASSWORD_HASH_ROUNDS makes older hashes
+# report `needs_update`, and they're upgraded the next time the user logs in.
+pwd_context = CryptContext(
+    schemes=['pbkdf2_sha256'],
+    deprecated='auto',
+    pbkdf2_sha256__rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def hash_password_sync(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update_sync(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def start_hash_pool() -> None:
+    """Start the worker processes used for hashing. Called from `lifespan`."""
+    global _executor, _slots
+    workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+    _executor = ProcessPoolExecutor(max_workers=workers)
+    _slots = asyncio.Semaphore(settings.PASSWORD_HASH_CONCURRENCY or workers * 2)
+
+
+def shutdown_hash_pool() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _slots = None
+
+
+async def _run(fn, *args):
+    # Outside the app (scripts, shells) there is no pool; use a thread instead.
+    if _executor is None or _slots is None:
+        return await run_in_threadpool(fn, *args)
+    async with _slots:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify a password; the second item is a new hash when the stored one is outdated."""
+    return await _run(verify_and_update_sync, plain_password, hashed_password)
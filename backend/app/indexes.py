@@ -0,0 +1,249 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+from datetime import datetime
+import logging
+
+from .config import settings
+
+logger = logging.getLogger('uvicorn.error')
+
+# Index manifest: collection name -> indexes the routes in main.py rely on.
+# Unique indexes mirror the places where the code already assumes a single
+# match (e.g. `find_one` on a join code, or "check then insert" assignments).
+INDEXES: dict[str, list[IndexModel]] = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        IndexModel([('reset_token_hash', ASCENDING)], name='reset_token_hash', sparse=True),
+    ],
+    'events': [
+        IndexModel([('created_by', ASCENDING), ('_id', ASCENDING)], name='created_by_id'),
+        IndexModel([('location', GEOSPHERE), ('start_date', ASCENDING)], name='location_2dsphere_start_date'),
+        IndexModel(
+            [('delegate_join_code', ASCENDING)],
+            name='delegate_join_code_unique',
+            unique=True,
+            partialFilterExpression={'delegate_join_code': {'$type': 'string'}},
+        ),
+    ],
+    'event_volunteers': [
+        IndexModel(
+            [('event_id', ASCENDING), ('role', ASCENDING), ('delegate_org_code', ASCENDING), ('_id', ASCENDING)],
+            name='event_role_org_code_id',
+        ),
+        IndexModel([('event_id', ASCENDING), ('role', ASCENDING), ('_id', ASCENDING)], name='event_role_id'),
+        IndexModel([('event_id', ASCENDING), ('user_id', ASCENDING)], name='event_user'),
+        IndexModel([('user_id', ASCENDING), ('role', ASCENDING)], name='user_role'),
+        IndexModel([('delegate_org_code', ASCENDING), ('role', ASCENDING)], name='org_code_role'),
+        # Case-insensitive organization lookups, see app/orgs.py
+        IndexModel([('organization_key', ASCENDING), ('role', ASCENDING)], name='organization_key_role'),
+    ],
+    'event_tasks': [
+        IndexModel([('event_id', ASCENDING), ('_id', ASCENDING)], name='event_id_id'),
+        IndexModel([('location', GEOSPHERE), ('event_id', ASCENDING)], name='location_2dsphere_event_id'),
+        IndexModel(
+            [('task_join_code', ASCENDING)],
+            name='task_join_code_unique',
+            unique=True,
+            partialFilterExpression={'task_join_code': {'$type': 'string'}},
+        ),
+    ],
+    'task_assignments': [
+        IndexModel([('activity_id', ASCENDING), ('user_id', ASCENDING)], name='activity_user_unique', unique=True),
+        IndexModel([('event_id', ASCENDING), ('user_id', ASCENDING)], name='event_user'),
+    ],
+    'email_outbox': [
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt'),
+        IndexModel([('status', ASCENDING), ('locked_until', ASCENDING)], name='status_locked_until'),
+        IndexModel([('claim', ASCENDING)], name='claim', sparse=True),
+        # Delivered and given-up messages are kept a week (without their body) for troubleshooting
+        IndexModel([('sent_at', ASCENDING)], name='sent_at_ttl', expireAfterSeconds=7 * 86400),
+        IndexModel([('failed_at', ASCENDING)], name='failed_at_ttl', expireAfterSeconds=7 * 86400),
+    ],
+    'broadcasts': [
+        IndexModel([('event_id', ASCENDING), ('created_at', DESCENDING)], name='event_created_at'),
+    ],
+    'geocode_cache': [
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ],
+    'notifications': [
+        IndexModel(
+            [('user_email', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='user_created_at_id',
+        ),
+        # Retention (app/retention.py): read items expire, old ones are archived by age
+        IndexModel(
+            [('read_at', ASCENDING)],
+            name='read_at_ttl',
+            expireAfterSeconds=settings.NOTIFY_READ_RETENTION_DAYS * 86400,
+        ),
+        IndexModel([('created_at', ASCENDING)], name='created_at'),
+        # Unread badge counts only ever touch unread entries
+        IndexModel(
+            [('user_email', ASCENDING)],
+            name='user_unread',
+            partialFilterExpression={'read': False},
+        ),
+        # Event-level (fan-out on read) notifications, see app/notifications.py
+        IndexModel(
+            [('event_audience', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='event_audience_created_at_id',
+            partialFilterExpression={'event_audience': {'$exists': True}},
+        ),
+    ],
+    'notification_reads': [
+        IndexModel([('user_email', ASCENDING), ('notification_id', ASCENDING)], name='user_notification_unique', unique=True),
+        # Markers live as long as their notification: app/retention.py removes them when it archives it
+        IndexModel([('notification_id', ASCENDING)], name='notification_id'),
+    ],
+    'notifications_archive': [
+        IndexModel(
+            [('user_email', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='user_created_at_id',
+        ),
+    ],
+}
+
+# Indexes replaced by a wider one above (usually to add the `_id` tie-breaker
+# that keyset pagination sorts on). Dropped by ensure_indexes.
+RETIRED_INDEXES: dict[str, list[str]] = {
+    'events': ['created_by'],
+    'event_volunteers': ['event_role_org_code'],
+    'event_tasks': ['event_id'],
+    'notifications': ['user_created_at'],
+    'notification_reads': ['user_event', 'read_at_ttl'],
+}
+
+# $geoNear can't be explained through `find`; $nearSphere uses the same 2dsphere index.
+_NEAR = {'$nearSphere': {'$geometry': {'type': 'Point', 'coordinates': [-82.3, 29.6]}, '$maxDistance': 5000}}
+_WHEN = datetime(2026, 1, 1)
+
+# Query shapes issued by the routes, used by the explain() audit. Values are
+# placeholders; the planner only cares about which fields are constrained.
+QUERY_SHAPES: list[dict] = [
+    {'collection': 'users', 'filter': {'email': 'x@example.com'}},
+    {'collection': 'users', 'filter': {'reset_token_hash': 'x'}},
+    {'collection': 'events', 'filter': {'created_by': 'x@example.com'}, 'sort': {'_id': 1}},
+    {'collection': 'events', 'filter': {'delegate_join_code': 'ABC123'}},
+    {'collection': 'events', 'filter': {'location': _NEAR, 'end_date': {'$gte': _WHEN}}},
+    {'collection': 'event_volunteers', 'filter': {'event_id': 'x', 'role': 'volunteer'}, 'sort': {'_id': 1}},
+    {'collection': 'event_volunteers', 'filter': {'event_id': 'x', 'role': 'volunteer', 'delegate_org_code': 'ABC123'}, 'sort': {'_id': 1}},
+    {'collection': 'event_volunteers', 'filter': {'event_id': 'x', 'user_id': 'x@example.com'}},
+    {'collection': 'event_volunteers', 'filter': {'event_id': 'x', 'role': {'$in': ['volunteer', 'delegate']}}, 'sort': {'user_id': 1}},
+    {'collection': 'event_volunteers', 'filter': {'user_id': 'x@example.com'}},
+    {'collection': 'event_volunteers', 'filter': {'event_id': 'x', 'user_id': 'x@example.com', 'role': 'delegate'}},
+    {'collection': 'event_volunteers', 'filter': {'user_id': 'x@example.com', 'role': 'delegate'}},
+    {'collection': 'event_volunteers', 'filter': {'delegate_org_code': 'ABC123', 'role': 'volunteer'}},
+    {'collection': 'event_volunteers', 'filter': {'organization_key': 'x', 'role': 'delegate'}},
+    {'collection': 'event_volunteers', 'filter': {'delegate_org_code': 'ABC123', 'role': 'delegate'}},
+    {'collection': 'event_tasks', 'filter': {'event_id': 'x'}, 'sort': {'_id': 1}},
+    {'collection': 'event_tasks', 'filter': {'event_id': 'x', 'assigned_delegate': 'x@example.com'}},
+    {'collection': 'event_tasks', 'filter': {'task_join_code': 'ABC123'}},
+    {'collection': 'event_tasks', 'filter': {'location': _NEAR, 'event_id': 'x'}},
+    {'collection': 'task_assignments', 'filter': {'activity_id': 'x'}},
+    {'collection': 'task_assignments', 'filter': {'activity_id': 'x', 'user_id': 'x@example.com'}},
+    {'collection': 'task_assignments', 'filter': {'user_id': 'x@example.com', 'event_id': 'x'}},
+    {'collection': 'task_assignments', 'filter': {'event_id': 'x', 'user_id': {'$in': ['x@example.com']}}},
+    {'collection': 'notifications', 'filter': {'user_email': 'x@example.com'}, 'sort': {'created_at': -1, '_id': -1}},
+    {
+        'collection': 'notifications',
+        'filter': {'$or': [{'user_email': 'x@example.com'}, {'event_audience': {'$in': ['x']}}]},
+        'sort': {'created_at': -1, '_id': -1},
+    },
+    {'collection': 'notification_reads', 'filter': {'user_email': 'x@example.com', 'notification_id': {'$in': ['x']}}},
+    {'collection': 'notifications', 'filter': {'user_email': 'x@example.com', 'read': False}},
+    {'collection': 'notifications', 'filter': {'event_audience': {'$in': ['x']}}},
+    {'collection': 'notifications', 'filter': {'created_at': {'$lt': _WHEN}}, 'sort': {'created_at': 1}},
+    {'collection': 'notifications', 'filter': {'read': True, 'read_at': {'$exists': False}}},
+    {'collection': 'notification_reads', 'filter': {'notification_id': {'$in': ['x']}}},
+]
+
+
+async def ensure_indexes(db) -> None:
+    """Create every index in the manifest and drop retired ones. Safe to call on every startup.
+
+    `create_indexes` is a no-op for indexes that already exist with the same
+    spec. A failure on one collection (e.g. duplicates blocking a unique
+    index) is logged and does not stop the app from starting. 2dsphere
+    indexes are created on their own, so a stored document with invalid
+    coordinates can only hold back its geo index, not the others.
+    """
+    for collection, models in INDEXES.items():
+        for batch in _batches(models):
+            try:
+                await db[collection].create_indexes(batch)
+            except OperationFailure as e:
+                if e.code in (85, 86) and await _sync_ttls(db, collection, batch):
+                    continue
+                logger.warning('Index creation failed for %s (%s): %s', collection, ', '.join(m.document['name'] for m in batch), e)
+    for collection, names in RETIRED_INDEXES.items():
+        for name in names:
+            try:
+                await db[collection].drop_index(name)
+            except OperationFailure:
+                pass  # already gone
+
+
+def _batches(models: list[IndexModel]) -> list[list[IndexModel]]:
+    """Plain indexes in one create_indexes call, then one call per 2dsphere index."""
+    geo = [m for m in models if GEOSPHERE in m.document['key'].values()]
+    plain = [m for m in models if m not in geo]
+    return ([plain] if plain else []) + [[m] for m in geo]
+
+
+async def _sync_ttls(db, collection: str, models: list[IndexModel]) -> bool:
+    """Apply changed TTLs with collMod (create_indexes refuses to alter an existing index).
+
+    Returns True when every index in `models` exists once TTLs are synced.
+    """
+    for model in models:
+        doc = model.document
+        if 'expireAfterSeconds' in doc:
+            try:
+                await db.command({'collMod': collection, 'index': {'name': doc['name'], 'expireAfterSeconds': doc['expireAfterSeconds']}})
+            except OperationFailure:
+                pass  # index not there yet; create_indexes below makes it
+    try:
+        await db[collection].create_indexes(models)
+        return True
+    except OperationFailure:
+        return False
+
+
+def _plan_nodes(plan: dict):
+    """Yield every stage of an explain() plan tree (classic or SBE layout)."""
+    if not isinstance(plan, dict):
+        return
+    yield plan
+    for key in ('queryPlan', 'inputStage'):
+        if key in plan:
+            yield from _plan_nodes(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_nodes(child)
+
+
+async def audit_query_shapes(db) -> list[dict]:
+    """Run explain() on each query shape and report the winning plan.
+
+    Each report entry has `indexed=False` when the winning plan contains a
+    COLLSCAN, i.e. the shape is not served by any index, and
+    `in_memory_sort=True` when the sort could not be satisfied by an index.
+    """
+    report = []
+    for shape in QUERY_SHAPES:
+        cmd = {'find': shape['collection'], 'filter': shape['filter']}
+        if shape.get('sort'):
+            cmd['sort'] = shape['sort']
+        explained = await db.command('explain', cmd, verbosity='queryPlanner')
+        winning = explained.get('queryPlanner', {}).get('winningPlan', {})
+        nodes = list(_plan_nodes(winning))
+        stages = [n['stage'] for n in nodes if n.get('stage')]
+        report.append({
+            'collection': shape['collection'],
+            'filter': shape['filter'],
+            'sort': shape.get('sort'),
+            'stages': stages,
+            'indexes': [n['indexName'] for n in nodes if n.get('indexName')],
+            'indexed': 'COLLSCAN' not in stages,
+            'in_memory_sort': 'SORT' in stages,
+        })
+    return report
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import secrets
+import string
+from datetime import datetime
+from typing import Dict
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger('uvicorn.error')
+
+# Every shareable code (event delegate codes, task codes, delegate org codes)
+# lives in one `join_codes` collection keyed by the code itself, so the
+# built-in unique `_id` index does the collision check and redemption is a
+# single point read:  {_id: code, kind, target_id, created_at}
+#
+# Codes issued before the registry existed are copied into it by
+# `backfill_join_codes`, run once on startup, which then records itself in
+# `migrations`. Until that record exists, allocation also checks the
+# documents' own code fields so a fresh code can't repeat a legacy one.
+
+EVENT = 'event'
+TASK = 'task'
+DELEGATE_ORG = 'delegate_org'
+
+MIGRATION_ID = 'join_codes_v1'
+
+_ALPHABET = string.ascii_uppercase + string.digits
+
+# Where codes lived before the registry: (collection, kind, query, field)
+_LEGACY_SOURCES = [
+    ('events', EVENT, {'delegate_join_code': {'$type': 'string'}}, 'delegate_join_code'),
+    ('event_tasks', TASK, {'task_join_code': {'$type': 'string'}}, 'task_join_code'),
+    ('event_volunteers', DELEGATE_ORG, {'role': 'delegate', 'delegate_org_code': {'$type': 'string'}}, 'delegate_org_code'),
+]
+
+_ready = False
+
+
+def generate_join_code(length: int = 6) -> str:
+    return ''.join(secrets.choice(_ALPHABET) for _ in range(length))
+
+
+def normalize_join_code(code: str) -> str:
+    return code.strip().upper()
+
+
+async def allocate_join_code(db, kind: str, target_id: str, length: int = 6, max_attempts: int = 100) -> str:
+    """Reserve a fresh code for `target_id` by inserting it; retry on collision."""
+    for _ in range(max_attempts):
+        code = generate_join_code(length)
+        if not await registry_ready(db) and await _legacy_code_in_use(db, code):
+            continue
+        try:
+            await db['join_codes'].insert_one({
+                '_id': code,
+                'kind': kind,
+                'target_id': target_id,
+                'created_at': datetime.utcnow(),
+            })
+            return code
+        except DuplicateKeyError:
+            continue
+    raise HTTPException(status_code=500, detail='Failed to generate a unique join code')
+
+
+async def registry_ready(db) -> bool:
+    """Whether the legacy backfill has completed (cached once true)."""
+    global _ready
+    if not _ready:
+        _ready = bool(await db['migrations'].find_one({'_id': MIGRATION_ID}, {'_id': 1}))
+    return _ready
+
+
+async def _legacy_code_in_use(db, code: str) -> bool:
+    found = await asyncio.gather(*(
+        db[collection].find_one({**query, field: code}, {'_id': 1})
+        for collection, _, query, field in _LEGACY_SOURCES
+    ))
+    return any(found)
+
+
+async def resolve_join_code(db, code: str, kind: str | None = None) -> Dict | None:
+    entry = await db['join_codes'].find_one({'_id': normalize_join_code(code)})
+    if entry and kind and entry.get('kind') != kind:
+        return None
+    return entry
+
+
+async def find_by_join_code(db, code: str, kind: str, collection: str, legacy_query: Dict) -> Dict | None:
+    """Load the document a code points at.
+
+    Codes issued before the registry existed (or not yet backfilled) are
+    found with `legacy_query` against the owning collection instead.
+    """
+    entry = await resolve_join_code(db, code, kind)
+    if entry:
+        try:
+            doc = await db[collection].find_one({'_id': ObjectId(entry['target_id'])})
+        except Exception:
+            doc = None
+        if doc:
+            return doc
+    return await db[collection].find_one(legacy_query)
+
+
+async def backfill_join_codes(db) -> int:
+    """Register codes that exist on documents but not in `join_codes`; safe to rerun.
+
+    Returns how many were added and records the run in `migrations`.
+    """
+    added = 0
+    now = datetime.utcnow()
+    for collection, kind, query, field in _LEGACY_SOURCES:
+        batch = []
+        async for doc in db[collection].find(query, {field: 1}):
+            batch.append({'_id': normalize_join_code(doc[field]), 'kind': kind, 'target_id': str(doc['_id']), 'created_at': now})
+            if len(batch) >= 1000:
+                added += await _insert_new(db, batch)
+                batch = []
+        if batch:
+            added += await _insert_new(db, batch)
+    await db['migrations'].update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.utcnow(), 'added': added}},
+        upsert=True,
+    )
+    return added
+
+
+async def run_join_code_backfill(db) -> None:
+    """One-shot background task started from `lifespan` until the backfill has completed once."""
+    if await registry_ready(db):
+        return
+    try:
+        added = await backfill_join_codes(db)
+        logger.info('join code backfill done: %s added', added)
+    except Exception as e:
+        logger.warning('join code backfill failed: %s', e)
+
+
+async def _insert_new(db, docs: list[Dict]) -> int:
+    # Unordered so codes that are already registered (duplicate _id) are skipped
+    try:
+        result = await db['join_codes'].insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get('nInserted', 0)
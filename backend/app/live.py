@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Hashable, Iterable, Set
+
+from .config import settings
+from .responses import dumps
+
+logger = logging.getLogger('uvicorn.error')
+
+# Live updates pushed to clients over Server-Sent Events.
+#
+# Mutating routes publish small deltas (a task's new volunteer_count, the
+# fields of an event that changed, a new notification) to topics:
+#   ('event', event_id)   everyone watching an event's screens
+#   ('user', email)       one user's notifications
+#   ('audience', event_id) notifications shared by an event's participants
+# and each open stream holds one bounded queue subscribed to its topics.
+# Publishing never waits: when a client falls LIVE_QUEUE_SIZE messages
+# behind, its backlog is dropped and replaced by a single `resync` message
+# telling it to refetch, so a slow or stalled connection costs at most one
+# queue. Idle streams get a comment line every LIVE_HEARTBEAT_SECONDS to
+# keep proxies from closing them and to notice dead peers.
+#
+# The hub is per process: with several workers, a client only sees what
+# was published by the worker its stream is connected to.
+
+Topic = Hashable
+
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    def __init__(self, topics: Iterable[Topic]):
+        self.topics = list(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+
+    def offer(self, message: Dict) -> bool:
+        """Queue `message`; returns False if the backlog was dropped for a resync."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # Too far behind to catch up delta by delta: make the client refetch instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return False
+
+
+class Hub:
+    def __init__(self):
+        self._subs: Dict[Topic, Set[Subscription]] = defaultdict(set)
+        self.connections = 0
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self, topics: Iterable[Topic]) -> Subscription:
+        sub = Subscription(topics)
+        for topic in sub.topics:
+            self._subs[topic].add(sub)
+        self.connections += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for topic in sub.topics:
+            subs = self._subs.get(topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[topic]
+        self.connections -= 1
+
+    def publish(self, topic: Topic, message: Dict) -> None:
+        subs = self._subs.get(topic)
+        if not subs:
+            return
+        self.published += 1
+        for sub in subs:
+            if not sub.offer(message):
+                self.resyncs += 1
+
+    def watched(self, topic: Topic) -> bool:
+        return topic in self._subs
+
+    def full(self) -> bool:
+        return self.connections >= settings.LIVE_MAX_CONNECTIONS
+
+    def stats(self) -> Dict:
+        return {
+            'connections': self.connections,
+            'topics': len(self._subs),
+            'published': self.published,
+            'resyncs': self.resyncs,
+        }
+
+
+hub = Hub()
+
+
+def publish_event(event_id: str | None, type: str, **data) -> None:
+    if event_id:
+        hub.publish(('event', str(event_id)), {'type': type, 'event_id': str(event_id), **data})
+
+
+def publish_user(email: str | None, type: str, **data) -> None:
+    if email:
+        hub.publish(('user', email), {'type': type, **data})
+
+
+def publish_audience(event_id: str, type: str, **data) -> None:
+    hub.publish(('audience', str(event_id)), {'type': type, 'event_id': str(event_id), **data})
+
+
+def watching_event(event_id: str | None) -> bool:
+    """Whether any stream in this worker follows the event (to skip building unused deltas)."""
+    return bool(event_id) and hub.watched(('event', str(event_id)))
+
+
+def _frame(message: Dict) -> bytes:
+    return b'event: ' + message['type'].encode() + b'\ndata: ' + dumps(message) + b'\n\n'
+
+
+async def stream(topics: Iterable[Topic]) -> AsyncIterator[bytes]:
+    """SSE body subscribed to `topics`; unsubscribes when the client goes away."""
+    # Subscribing here rather than in the route means a response that is never
+    # started can't leave a subscription behind
+    sub = hub.subscribe(topics)
+    try:
+        yield b'retry: 5000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), timeout=settings.LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+                continue
+            yield _frame(message)
+    finally:
+        hub.unsubscribe(sub)
@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator
 from bson import ObjectId
 from typing import Optional, Literal, List
 from datetime import datetime
@@ -19,6 +19,14 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[EmailStr] = None
 
+class CurrentUser(BaseModel):
+    """Authenticated principal built from access-token claims (or the user doc for legacy tokens)."""
+    email: str
+    first_name: str = ""
+    last_name: str = ""
+    admin: bool = False
+    token_version: int = 0
+
 # ------------------------------
 # Users
 # ------------------------------
@@ -43,6 +51,8 @@ class UserInDB(User):
     last_name: str
     email: EmailStr
     hashed_password: str
+    admin: bool = False
+    token_version: int = 0
     created_at: Optional[datetime] = Field(default=None, alias="created_at")
     updated_at: Optional[datetime] = Field(default=None, alias="updated_at")
 
@@ -62,7 +72,18 @@ class UserOut(BaseModel):
 
 class Location(BaseModel):
     type: Literal["Point"] = "Point"
-    coordinates: List[float]  # [lng, lat]
+    coordinates: List[float] = Field(min_length=2, max_length=2)  # [lng, lat]
+
+    @field_validator("coordinates")
+    @classmethod
+    def _lng_lat_in_range(cls, value: List[float]) -> List[float]:
+        # Out-of-range points can't be stored under the 2dsphere indexes
+        lng, lat = value
+        if not -180 <= lng <= 180:
+            raise ValueError("longitude must be between -180 and 180")
+        if not -90 <= lat <= 90:
+            raise ValueError("latitude must be between -90 and 90")
+        return value
 
 # ------------------------------
 # Events
@@ -91,6 +112,17 @@ class EventOut(EventBase):
     created_at: Optional[datetime] = Field(default=None, alias="created_at")
     updated_at: Optional[datetime] = Field(default=None, alias="updated_at")
 
+class NearbyEventOut(BaseModel):
+    """Event discovered by proximity; join codes are left out on purpose."""
+    id: Optional[str] = Field(default=None, alias="_id")
+    name: str
+    description: Optional[str] = None
+    location: Location
+    location_name: Optional[str] = None
+    start_date: datetime
+    end_date: datetime
+    distance_m: float
+
 # ------------------------------
 # Event Roles
 # ------------------------------
@@ -144,6 +176,9 @@ class TaskOut(TaskBase):
     event_id: str = Field(alias="event_id")
     volunteer_count: Optional[int] = Field(default=None, alias="volunteer_count")
 
+class NearbyTaskOut(TaskOut):
+    distance_m: float
+
 # ------------------------------
 # Event Volunteers
 # ------------------------------
@@ -203,8 +238,12 @@ class OrganizerEventDetails(BaseModel):
     end_date: datetime = Field(alias="end_date")
     delegate_join_code: str = Field(alias="delegate_join_code")
     total_attendees: Optional[int] # We will use this for computing total attendees
-    volunteers: Optional[List] # This will return all of the volunteers 
-    delegates: Optional[List] # This will return all of the delegates
+    volunteers: Optional[List] # First page of the volunteers (see volunteers_total / volunteers_next_cursor)
+    delegates: Optional[List] # First page of the delegates
+    volunteers_total: int = 0
+    volunteers_next_cursor: Optional[str] = None
+    delegates_total: int = 0
+    delegates_next_cursor: Optional[str] = None
 
 class VolunteerEventDetails(BaseModel):
     name: str
@@ -232,7 +271,8 @@ class DelegateEventDetails(BaseModel):
     end_date: datetime = Field(alias="end_date")
     volunteer_join_code: str = Field(alias="volunteer_join_code")  # delegate/org join code
     total_attendees: Optional[int] # We will use this for computing total attendees just for this delegate's task
-    volunteers: Optional[List] # This will return all of the volunteers 
+    volunteers: Optional[List] # First page of the org's volunteers; total_attendees is the full count
+    volunteers_next_cursor: Optional[str] = None
     organizer_contact_info: str
     my_role: str
     task_description: str
@@ -240,6 +280,31 @@ class DelegateEventDetails(BaseModel):
     task_location_name: str 
     #checkin_status: str  # add if we have time
 
+# ------------------------------
+# Broadcasts
+# ------------------------------
+
+class BroadcastIn(BaseModel):
+    subject: str = Field(min_length=1, max_length=200)
+    body: str = Field(min_length=1)
+    audience: Literal["everyone", "volunteers", "delegates"] = "everyone"
+    task_id: Optional[str] = None  # only the volunteers assigned to this task
+
+class BroadcastOut(BaseModel):
+    id: str
+    event_id: str
+    subject: str
+    audience: str
+    delegate_org_code: Optional[str] = None
+    task_id: Optional[str] = None
+    status: Literal["resolving", "sending", "done", "failed"]
+    total: int  # recipients queued so far
+    sent: int
+    failed: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
 class DelegateRequest(BaseModel):
     assigned_delegate: str
 
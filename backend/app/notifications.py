@@ -0,0 +1,204 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .config import settings
+from . import live
+
+logger = logging.getLogger('uvicorn.error')
+
+# In-app notifications for an event's participants.
+#
+# Two delivery modes, picked per dispatch from the audience size:
+#   * fan-out on write (small audiences): one `notifications` doc per
+#     recipient and message, keyed by `user_email`. Recipients are streamed
+#     from `event_volunteers` in user_id order (so duplicates are adjacent
+#     and skipped without holding the audience in memory) and written in
+#     unordered insert_many batches of NOTIFY_WRITE_BATCH_SIZE.
+#   * fan-out on read (audiences of NOTIFY_FANOUT_ON_READ_MIN or more): one
+#     `notifications` doc per message with `event_audience` set to the event
+#     id instead of a `user_email`. Readers pick these up through their
+#     event memberships, and per-user read state lives in
+#     `notification_reads` (one marker per user and shared notification,
+#     carrying the event id so unread counts need no join).
+# `inbox_query` / `mark_read` hide the difference from the routes. Either
+# way, connected clients get the new notifications pushed (app/live.py).
+
+PARTICIPANT_ROLES = ('volunteer', 'delegate')
+
+
+async def _insert_batch(db, docs: List[Dict]) -> None:
+    if not docs:
+        return
+    await db['notifications'].insert_many(docs, ordered=False)
+    for doc in docs:
+        push = {'id': str(doc['_id']), 'message': doc['message'], 'created_at': doc['created_at']}
+        if doc.get('event_audience'):
+            live.publish_audience(doc['event_audience'], 'notification', **push)
+        else:
+            live.publish_user(doc['user_email'], 'notification', event_id=doc['event_id'], **push)
+
+
+async def _fan_out_on_write(db, event_id: str, messages: Sequence[str], roles: Sequence[str], now: datetime) -> Dict:
+    cursor = db['event_volunteers'].find(
+        {'event_id': event_id, 'role': {'$in': list(roles)}},
+        {'user_id': 1, '_id': 0},
+    ).sort('user_id', 1).batch_size(settings.NOTIFY_WRITE_BATCH_SIZE)
+    batch: List[Dict] = []
+    recipients = written = 0
+    last = None
+    async for row in cursor:
+        email = row.get('user_id')
+        if not email or email == last:
+            continue
+        last = email
+        recipients += 1
+        for message in messages:
+            batch.append({'user_email': email, 'event_id': event_id, 'message': message, 'created_at': now, 'read': False})
+        if len(batch) >= settings.NOTIFY_WRITE_BATCH_SIZE:
+            await _insert_batch(db, batch)
+            written += len(batch)
+            batch = []
+    await _insert_batch(db, batch)
+    written += len(batch)
+    return {'mode': 'write', 'recipients': recipients, 'documents': written}
+
+
+async def _fan_out_on_read(db, event_id: str, messages: Sequence[str], audience: int, now: datetime) -> Dict:
+    await _insert_batch(db, [
+        {'event_audience': event_id, 'event_id': event_id, 'message': message, 'created_at': now}
+        for message in messages
+    ])
+    return {'mode': 'read', 'recipients': audience, 'documents': len(messages)}
+
+
+async def notify_event(db, event_id: str, messages: Sequence[str], roles: Sequence[str] = PARTICIPANT_ROLES) -> Dict:
+    """Notify everyone holding one of `roles` in the event; returns what was written."""
+    if not messages:
+        return {'mode': None, 'recipients': 0, 'documents': 0}
+    now = datetime.utcnow()
+    # Counts roster rows, not distinct users: close enough to choose a mode
+    audience = await db['event_volunteers'].count_documents({'event_id': event_id, 'role': {'$in': list(roles)}})
+    if audience >= settings.NOTIFY_FANOUT_ON_READ_MIN:
+        result = await _fan_out_on_read(db, event_id, messages, audience, now)
+    else:
+        result = await _fan_out_on_write(db, event_id, messages, roles, now)
+    logger.info('notify event %s: %s', event_id, result)
+    return result
+
+
+async def member_event_ids(db, email: str) -> List[str]:
+    return [e for e in await db['event_volunteers'].distinct('event_id', {'user_id': email}) if e]
+
+
+async def inbox_query(db, email: str) -> Dict:
+    """Match a user's own notifications and the event-level ones of their events."""
+    event_ids = await member_event_ids(db, email)
+    if not event_ids:
+        return {'user_email': email}
+    return {'$or': [{'user_email': email}, {'event_audience': {'$in': event_ids}}]}
+
+
+async def apply_read_markers(db, email: str, docs: List[Dict]) -> None:
+    """Fill in `read` on event-level notifications from the user's read markers."""
+    shared = [d['_id'] for d in docs if d.get('event_audience')]
+    if not shared:
+        return
+    read = {
+        m['notification_id']
+        async for m in db['notification_reads'].find(
+            {'user_email': email, 'notification_id': {'$in': shared}}, {'notification_id': 1, '_id': 0}
+        )
+    }
+    for d in docs:
+        if d.get('event_audience'):
+            d['read'] = d['_id'] in read
+
+
+async def unread_count(db, email: str) -> int:
+    """Unread notifications for `email` using counts only, no documents loaded.
+
+    Own notifications are counted through the partial index on unread
+    items; shared ones as (shared notifications of the user's events) minus
+    (the user's read markers on those very notifications), so a marker
+    whose notification is gone can't cancel out a new one.
+    """
+    own = await db['notifications'].count_documents({'user_email': email, 'read': False})
+    event_ids = await member_event_ids(db, email)
+    if not event_ids:
+        return own
+    shared = await db['notifications'].distinct('_id', {'event_audience': {'$in': event_ids}})
+    if not shared:
+        return own
+    marked = await db['notification_reads'].count_documents({'user_email': email, 'notification_id': {'$in': shared}})
+    return own + len(shared) - marked
+
+
+async def _write_read_markers(db, email: str, docs: List[Dict]) -> int:
+    """Upsert a read marker per shared notification; returns how many were new."""
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {'notification_id': d['_id'], 'user_email': email},
+            {'$setOnInsert': {'event_id': d['event_audience'], 'read_at': now}},
+            upsert=True,
+        )
+        for d in docs
+    ]
+    try:
+        result = await db['notification_reads'].bulk_write(ops, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        # Concurrent mark of the same notification: the other request's marker stands
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+        return e.details.get('nUpserted', 0)
+
+
+async def mark_read(db, email: str, ids: Optional[List[ObjectId]] = None, before: Optional[datetime] = None) -> int:
+    """Mark the user's notifications read: the given `ids`, or everything created up to `before`.
+
+    Own notifications take one update_many. Shared ones get a read marker
+    each, upserted in one unordered bulk write. Returns how many were newly
+    marked.
+    """
+    scope: Dict = {'_id': {'$in': ids}} if ids is not None else {'created_at': {'$lte': before}}
+    result = await db['notifications'].update_many(
+        {**scope, 'user_email': email, 'read': False}, {'$set': {'read': True, 'read_at': datetime.utcnow()}}
+    )
+    marked = result.modified_count
+    event_ids = await member_event_ids(db, email)
+    if event_ids:
+        shared = await db['notifications'].find(
+            {**scope, 'event_audience': {'$in': event_ids}}, {'event_audience': 1}
+        ).to_list(None)
+        if shared:
+            marked += await _write_read_markers(db, email, shared)
+    if marked:
+        await _push_unread(db, email)
+    return marked
+
+
+async def mark_one_read(db, email: str, notification_id: ObjectId) -> bool:
+    """Mark a single notification read; False if it isn't in the user's inbox."""
+    result = await db['notifications'].update_one(
+        # $min: marking an already-read notification again doesn't postpone its expiry
+        {'_id': notification_id, 'user_email': email}, {'$set': {'read': True}, '$min': {'read_at': datetime.utcnow()}}
+    )
+    if not result.matched_count:
+        doc = await db['notifications'].find_one({'_id': notification_id, 'event_audience': {'$exists': True}}, {'event_audience': 1})
+        if not doc or not await db['event_volunteers'].find_one({'event_id': doc['event_audience'], 'user_id': email}, {'_id': 1}):
+            return False
+        await _write_read_markers(db, email, [doc])
+    await _push_unread(db, email)
+    return True
+
+
+async def _push_unread(db, email: str) -> None:
+    # Keeps badges on the user's other connected devices in step
+    if live.hub.watched(('user', email)):
+        live.publish_user(email, 'notifications.read', unread=await unread_count(db, email))
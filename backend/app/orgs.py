@@ -0,0 +1,123 @@
+import logging
+import re
+from datetime import datetime
+from typing import Callable, Dict
+
+from pymongo import UpdateOne
+
+from . import join_codes
+
+logger = logging.getLogger('uvicorn.error')
+
+# Index-friendly lookups for delegate organizations.
+#
+# Organization names are matched case- and whitespace-insensitively through
+# a stored `organization_key`, and org codes are stored uppercased (as
+# `join_codes.normalize_join_code` produces them), so both lookups are
+# equality reads on an index instead of anchored `$regex` scans.
+#
+# Documents written before this carry neither. `backfill_org_keys` fixes
+# them in batches while the app keeps serving and then records itself in
+# `migrations`; until that record exists, lookups that miss fall back to the
+# old regex queries so nothing written earlier is overlooked.
+
+MIGRATION_ID = 'org_keys_v1'
+BATCH_SIZE = 1000
+
+# Codes with lowercase letters or surrounding whitespace
+_NOT_NORMALIZED = {'$regex': r'[a-z]|^\s|\s$'}
+
+_ready = False
+
+
+def organization_key(name: str) -> str:
+    return re.sub(r'\s+', ' ', name).strip().casefold()
+
+
+def org_fields(name: str | None) -> Dict:
+    """`organization` plus its lookup key, for $set / insert documents."""
+    return {'organization': name, 'organization_key': organization_key(name) if name else None}
+
+
+async def keys_ready(db) -> bool:
+    """Whether the backfill has completed (cached once true)."""
+    global _ready
+    if not _ready:
+        _ready = bool(await db['migrations'].find_one({'_id': MIGRATION_ID}, {'_id': 1}))
+    return _ready
+
+
+async def find_delegate_by_org(db, org_name: str) -> Dict | None:
+    key = organization_key(org_name)
+    doc = await db['event_volunteers'].find_one({'organization_key': key, 'role': 'delegate'})
+    if doc or await keys_ready(db):
+        return doc
+    return await db['event_volunteers'].find_one({
+        'role': 'delegate',
+        'organization': {'$regex': f'^{re.escape(org_name.strip())}$', '$options': 'i'},
+    })
+
+
+async def find_delegate_by_code(db, code: str) -> Dict | None:
+    """The delegate record an org code belongs to: via the join_codes registry, else by stored code."""
+    doc = await join_codes.find_by_join_code(db, code, join_codes.DELEGATE_ORG, 'event_volunteers', {
+        'delegate_org_code': join_codes.normalize_join_code(code),
+        'role': 'delegate',
+    })
+    if doc or await keys_ready(db):
+        return doc
+    return await db['event_volunteers'].find_one({
+        'delegate_org_code': {'$regex': f'^{re.escape(code.strip())}$', '$options': 'i'},
+        'role': 'delegate',
+    })
+
+
+async def _backfill(db, collection: str, query: Dict, source: str, target: str, normalize: Callable[[str], str]) -> int:
+    """Set `target` = normalize(`source`) on every doc matching `query`, one _id-ordered batch at a time."""
+    updated = 0
+    last_id = None
+    while True:
+        page = query if last_id is None else {**query, '_id': {'$gt': last_id}}
+        docs = await db[collection].find(page, {source: 1}).sort('_id', 1).limit(BATCH_SIZE).to_list(None)
+        if not docs:
+            return updated
+        ops = [UpdateOne({'_id': d['_id']}, {'$set': {target: normalize(d[source])}}) for d in docs]
+        result = await db[collection].bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        last_id = docs[-1]['_id']
+
+
+async def backfill_org_keys(db) -> Dict[str, int]:
+    """Add `organization_key` and uppercase org codes on existing documents; safe to rerun."""
+    counts = {
+        'organization_key': await _backfill(
+            db, 'event_volunteers',
+            {'organization': {'$type': 'string'}, 'organization_key': {'$exists': False}},
+            'organization', 'organization_key', organization_key,
+        ),
+        'delegate_org_code': await _backfill(
+            db, 'event_volunteers', {'delegate_org_code': _NOT_NORMALIZED},
+            'delegate_org_code', 'delegate_org_code', join_codes.normalize_join_code,
+        ),
+        'assigned_delegate_org_code': await _backfill(
+            db, 'event_tasks', {'assigned_delegate_org_code': _NOT_NORMALIZED},
+            'assigned_delegate_org_code', 'assigned_delegate_org_code', join_codes.normalize_join_code,
+        ),
+    }
+    await db['migrations'].update_one(
+        {'_id': MIGRATION_ID},
+        {'$set': {'completed_at': datetime.utcnow(), 'counts': counts}},
+        upsert=True,
+    )
+    return counts
+
+
+async def run_org_key_backfill(db) -> None:
+    """One-shot background task started from `lifespan` until the backfill has completed once."""
+    if await keys_ready(db):
+        return
+    try:
+        counts = await backfill_org_keys(db)
+        logger.info('org key backfill done: %s', counts)
+    except Exception as e:
+        logger.warning('org key backfill failed: %s', e)
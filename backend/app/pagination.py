@@ -0,0 +1,110 @@
+import base64
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Query, Response
+
+from .config import settings
+
+# Keyset ("seek") pagination. A page is the next `limit` documents after the
+# last one the client saw, in a fixed sort order that ends in `_id` so ties
+# are broken deterministically. The continuation token is the sort-key
+# values of that last document, so a page costs one index range scan no
+# matter how deep the client has paged.
+#
+# List endpoints keep returning a JSON array; the token for the next page is
+# sent in the `X-Next-Cursor` response header (absent on the last page).
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+Sort = List[Tuple[str, int]]
+
+ID_ASC: Sort = [('_id', 1)]
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque token for a list of sort-key values (ObjectIds and datetimes survive the round trip)."""
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> List[Any]:
+    padded = token + '=' * (-len(token) % 4)
+    values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError('cursor is not a key list')
+    return values
+
+
+@dataclass
+class PageParams:
+    limit: int
+    after: Optional[List[Any]] = None
+
+
+def page_params(
+    limit: Optional[int] = Query(default=None, ge=1),
+    after: Optional[str] = Query(default=None),
+) -> PageParams:
+    """Route dependency for `?limit=&after=`; clamps the limit to PAGE_SIZE_MAX."""
+    decoded = None
+    if after:
+        try:
+            decoded = decode_cursor(after)
+        except Exception:
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+    return PageParams(limit=min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX), after=decoded)
+
+
+def keyset_filter(sort: Sort, after: Optional[List[Any]]) -> Dict:
+    """Match documents strictly after `after` in `sort` order.
+
+    For [(a, 1), (_id, 1)] this is `a > x OR (a == x AND _id > y)`.
+    """
+    if not after:
+        return {}
+    if len(after) != len(sort):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: after[j] for j, (f, _) in enumerate(sort[:i])}
+        clause[field] = {'$gt' if direction > 0 else '$lt': after[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def with_keyset(query: Dict, sort: Sort, after: Optional[List[Any]]) -> Dict:
+    seek = keyset_filter(sort, after)
+    if not seek:
+        return query
+    return {'$and': [query, seek]} if query else seek
+
+
+def page_from(docs: List[Dict], sort: Sort, limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """Trim a `limit + 1` fetch to `limit` and build the token for the next page."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor([last.get(field) for field, _ in sort])
+
+
+async def find_page(collection, query: Dict, sort: Sort, page: PageParams, projection: Dict | None = None) -> Tuple[List[Dict], Optional[str]]:
+    """One indexed range read: `query` past the cursor, in `sort` order, `limit + 1` docs."""
+    cursor = collection.find(with_keyset(query, sort, page.after), projection).sort(sort).limit(page.limit + 1)
+    return page_from(await cursor.to_list(None), sort, page.limit)
+
+
+def aggregate_page_stages(sort: Sort, page: PageParams) -> List[Dict]:
+    """Pipeline tail equivalent to `find_page` for aggregation results."""
+    stages = []
+    seek = keyset_filter(sort, page.after)
+    if seek:
+        stages.append({'$match': seek})
+    stages += [{'$sort': dict(sort)}, {'$limit': page.limit + 1}]
+    return stages
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,74 @@
+import json
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+from .fieldsets import Fieldset
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+# Fast path for list endpoints that serve documents we wrote ourselves.
+#
+# The default FastAPI path validates every document into the response model
+# and then validates and serializes it again through `response_model`. Here
+# a document is instead reshaped once into the model's output keys (aliases,
+# defaults for missing fields, `fields=` applied) and encoded straight to
+# JSON. The route's `response_model` still documents the shape in OpenAPI.
+# ObjectIds must already be strings by the time documents get here (the
+# DAO-boundary rule from app/database.py); the encoder only stringifies
+# stray ones as a safety net.
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json', by_alias=True)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=256)
+def _row_template(model: type[BaseModel], fields: Fieldset) -> Tuple[Tuple[str, Any], ...]:
+    """(output key, default) for each field of `model` that `fields` selects."""
+    template = []
+    for name, f in model.model_fields.items():
+        key = f.alias or name
+        if fields is not None and key not in fields:
+            continue
+        default = f.get_default(call_default_factory=True)
+        template.append((key, None if default is PydanticUndefined else default))
+    return tuple(template)
+
+
+def trusted_rows(model: type[BaseModel], docs: Iterable[Dict], fields: Fieldset = None) -> List[Dict]:
+    """Shape trusted documents like `model` would serialize them, without validation."""
+    template = _row_template(model, fields)
+    return [{key: doc.get(key, default) for key, default in template} for doc in docs]
+
+
+def fast_list_response(rows: List[Dict], response: Response) -> FastJSONResponse:
+    """Return `rows` directly, carrying over headers already set on the injected `response`."""
+    return FastJSONResponse(rows, headers=dict(response.headers))
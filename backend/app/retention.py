@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo.errors import BulkWriteError
+
+from .config import settings
+
+logger = logging.getLogger('uvicorn.error')
+
+# Keeps `notifications` down to the working set the inbox actually reads.
+#
+#   * A user's own read notifications carry `read_at` and are expired by a
+#     TTL index after NOTIFY_READ_RETENTION_DAYS (app/indexes.py).
+#   * Anything still in `notifications` after NOTIFY_ARCHIVE_AFTER_DAYS
+#     (unread items, shared event-level items) is moved to
+#     `notifications_archive` by `archive_notifications`, in batches of
+#     NOTIFY_ARCHIVE_BATCH_SIZE: copy, delete what was copied, then delete
+#     the read markers of the shared ones. Markers have no TTL of their own,
+#     so a shared notification never turns unread again while it is still
+#     listed. A batch interrupted before its delete is simply copied again
+#     next time; the duplicate inserts are ignored.
+#
+# The job runs from `lifespan` every NOTIFY_ARCHIVE_INTERVAL_SECONDS and on
+# demand through POST /admin/notifications/archive, which reports
+# collection and index sizes before and after.
+
+ARCHIVE = 'notifications_archive'
+
+
+async def collection_stats(db, name: str) -> Optional[Dict]:
+    """Document count and data / storage / index sizes in bytes, or None if unavailable."""
+    try:
+        rows = await db[name].aggregate([{'$collStats': {'storageStats': {}}}]).to_list(None)
+    except Exception as e:
+        logger.warning('collStats on %s failed: %s', name, e)
+        return None
+    if not rows:
+        return None
+    storage = rows[0].get('storageStats', {})
+    return {
+        'count': storage.get('count', 0),
+        'size': storage.get('size', 0),
+        'storage_size': storage.get('storageSize', 0),
+        'index_size': storage.get('totalIndexSize', 0),
+        'index_sizes': storage.get('indexSizes', {}),
+    }
+
+
+async def stamp_legacy_reads(db) -> int:
+    """Give read notifications from before `read_at` existed one, so the TTL index picks them up."""
+    result = await db['notifications'].update_many(
+        {'read': True, 'read_at': {'$exists': False}},
+        {'$set': {'read_at': datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
+async def _copy_to_archive(db, docs) -> None:
+    try:
+        await db[ARCHIVE].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Already archived by an earlier interrupted pass
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+
+
+async def archive_notifications(db, older_than_days: Optional[int] = None) -> int:
+    """Move notifications older than the cutoff to the archive; returns how many moved."""
+    days = settings.NOTIFY_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived_at = datetime.utcnow()
+    moved = 0
+    while True:
+        docs = await db['notifications'].find({'created_at': {'$lt': cutoff}}).sort('created_at', 1).limit(
+            settings.NOTIFY_ARCHIVE_BATCH_SIZE
+        ).to_list(None)
+        if not docs:
+            return moved
+        for doc in docs:
+            doc['archived_at'] = archived_at
+        await _copy_to_archive(db, docs)
+        ids = [d['_id'] for d in docs]
+        result = await db['notifications'].delete_many({'_id': {'$in': ids}})
+        moved += result.deleted_count
+        shared = [d['_id'] for d in docs if d.get('event_audience')]
+        if shared:
+            await db['notification_reads'].delete_many({'notification_id': {'$in': shared}})
+        # Let request traffic in between batches
+        await asyncio.sleep(0)
+
+
+async def run_retention(db, older_than_days: Optional[int] = None) -> Dict:
+    """One retention pass with sizes before and after."""
+    before = {name: await collection_stats(db, name) for name in ('notifications', ARCHIVE)}
+    stamped = await stamp_legacy_reads(db)
+    moved = await archive_notifications(db, older_than_days)
+    after = {name: await collection_stats(db, name) for name in ('notifications', ARCHIVE)}
+    report = {'stamped_read_at': stamped, 'archived': moved, 'before': before, 'after': after}
+    if stamped or moved:
+        logger.info('notification retention: stamped %d, archived %d', stamped, moved)
+    return report
+
+
+async def run_notification_retention(db, interval_seconds: int) -> None:
+    """Background loop started from `lifespan`."""
+    while True:
+        try:
+            await run_retention(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning('notification retention failed: %s', e)
+        await asyncio.sleep(interval_seconds)
@@ -1,6 +1,6 @@
 from .models import User, UserInDB, UserCreate
 from .database import get_db
-from passlib.context import CryptContext
+from .hashing import hash_password, verify_and_update
 from bson import ObjectId
 from fastapi import HTTPException, status
 import logging
@@ -8,16 +8,16 @@ import logging
 logger = logging.getLogger('uvicorn.error')
 logger.setLevel(logging.DEBUG)
 
-pwd_context = CryptContext(schemes=['pbkdf2_sha256'], deprecated='auto')
+# Hashing is CPU bound; app/hashing.py runs it in a bounded process pool.
+async def get_password_hash(password: str) -> str:
+    return await hash_password(password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    ok, _ = await verify_and_update(plain_password, hashed_password)
+    return ok
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_by_email(db, email: str) -> UserInDB | None:
-    user_data = db['users'].find_one({'email': email})
+async def get_by_email(db, email: str) -> UserInDB | None:
+    user_data = await db['users'].find_one({'email': email})
     if user_data:
         # If the stored _id is a string (from older records), convert it to
         # a bson.ObjectId so downstream code that expects ObjectId sees a
@@ -29,17 +29,25 @@ def get_by_email(db, email: str) -> UserInDB | None:
                 # leave as-is if it isn't a valid ObjectId string
                 pass
 
-        return UserInDB(**user_data)
+        # Trusted document we wrote ourselves: skip re-running EmailStr and friends
+        return UserInDB.model_construct(**user_data)
     return None
 
-def authenticate_user(db, email: str, password: str) -> UserInDB | None:
-    user = get_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db, email: str, password: str) -> UserInDB | None:
+    user = await get_by_email(db, email)
+    if not user:
+        return None
+    ok, new_hash = await verify_and_update(password, user.hashed_password)
+    if not ok:
         return None
+    if new_hash:
+        # Stored hash used an older cost; upgrade it now that we know the password.
+        await db['users'].update_one({'_id': user.id, 'hashed_password': user.hashed_password}, {'$set': {'hashed_password': new_hash}})
+        user.hashed_password = new_hash
     return user
 
-def create_user(db, user_in: UserCreate):
-    existing_user = db['users'].find_one({'email': user_in.email})
+async def create_user(db, user_in: UserCreate):
+    existing_user = await db['users'].find_one({'email': user_in.email})
     if existing_user:
         raise HTTPException(
             status_code = status.HTTP_400_BAD_REQUEST,
@@ -56,7 +64,7 @@ def create_user(db, user_in: UserCreate):
         first_name=user_in.first_name,
         last_name=user_in.last_name,
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await get_password_hash(user_in.password),
     )
 
     # Never log secrets; if needed, log only keys for debugging
@@ -67,7 +75,7 @@ def create_user(db, user_in: UserCreate):
     # ensures later reads can construct UserInDB(**doc) without missing
     # alias-only fields.
     doc = user.model_dump(by_alias=True)
-    result = db['users'].insert_one(doc)
+    result = await db['users'].insert_one(doc)
     # Store the actual ObjectId returned by Mongo so future reads return
     # a proper bson.ObjectId. This keeps DB representation natural.
     doc['_id'] = result.inserted_id
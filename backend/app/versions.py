@@ -0,0 +1,40 @@
+from typing import Iterable
+
+from bson import ObjectId
+
+# Every event document carries a `version` counter that is bumped whenever
+# something shown in the event's views changes: the event itself, its tasks
+# and their volunteer counts, its delegates and volunteers. Readers use it
+# as a cheap change stamp (ETags on the detail and task endpoints) without
+# loading the rosters or tasks it summarises. Documents that predate the
+# field read as version 0 and fall back on `updated_at`.
+
+
+def _event_oids(event_ids: Iterable[str | ObjectId | None]) -> list[ObjectId]:
+    oids = []
+    for event_id in event_ids:
+        if isinstance(event_id, ObjectId):
+            oids.append(event_id)
+        elif event_id:
+            try:
+                oids.append(ObjectId(event_id))
+            except Exception:
+                continue
+    return list(dict.fromkeys(oids))
+
+
+async def touch_events(db, *event_ids: str | ObjectId | None) -> None:
+    """Bump `version` on each event (ids may be strings, ObjectIds or None)."""
+    oids = _event_oids(event_ids)
+    if len(oids) == 1:
+        await db['events'].update_one({'_id': oids[0]}, {'$inc': {'version': 1}})
+    elif oids:
+        await db['events'].update_many({'_id': {'$in': oids}}, {'$inc': {'version': 1}})
+
+
+def event_stamp(event_doc: dict | None) -> tuple:
+    """The (version, updated_at) pair that identifies a state of an event."""
+    if not event_doc:
+        return (None, None)
+    updated_at = event_doc.get('updated_at')
+    return (event_doc.get('version', 0), updated_at.isoformat() if updated_at else None)
@@ -0,0 +1,61 @@
+"""Measure pbkdf2_sha256 throughput to pick PASSWORD_HASH_ROUNDS.
+
+Usage (from the backend/ directory):
+    python bench_password_hash.py                       # default round counts
+    python bench_password_hash.py --rounds 29000 100000 --seconds 3
+
+For each round count it reports single-core hashes/sec and latency, then
+the aggregate rate across a process pool and the resulting rate per core.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+
+def _hash_n(rounds: int, n: int) -> int:
+    ctx = CryptContext(schemes=['pbkdf2_sha256'], pbkdf2_sha256__rounds=rounds)
+    for _ in range(n):
+        ctx.hash('correct horse battery staple')
+    return n
+
+
+def single_core(rounds: int, seconds: float) -> tuple[float, float]:
+    ctx = CryptContext(schemes=['pbkdf2_sha256'], pbkdf2_sha256__rounds=rounds)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        ctx.hash('correct horse battery staple')
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed / count * 1000
+
+
+def pooled(rounds: int, workers: int, per_worker: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm the workers so process start-up isn't measured
+        list(pool.map(_hash_n, [rounds] * workers, [1] * workers))
+        start = time.perf_counter()
+        total = sum(pool.map(_hash_n, [rounds] * workers, [per_worker] * workers))
+        return total / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, nargs='+', default=[29000, 100000, 300000, 600000])
+    parser.add_argument('--seconds', type=float, default=2.0, help='time budget for the single-core run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>8} {'1-core h/s':>11} {'ms/hash':>8} {'pool h/s':>10} {'h/s/core':>9}  ({args.workers} workers)")
+    for rounds in args.rounds:
+        rate, latency = single_core(rounds, args.seconds)
+        per_worker = max(1, int(rate * args.seconds / 2))
+        pool_rate = pooled(rounds, args.workers, per_worker)
+        print(f"{rounds:>8} {rate:>11.1f} {latency:>8.1f} {pool_rate:>10.1f} {pool_rate / args.workers:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure per-item cost of building a list response from Mongo documents.
+
+Usage (from the backend/ directory):
+    python bench_responses.py                  # 10k events, 5 repeats
+    python bench_responses.py --items 50000 --repeat 3
+
+Compares the validated path the list routes used to take (model_validate
+per document, then FastAPI's response_model validation and JSON encoding)
+with the trusted-document path in app/responses.py, for full documents and
+for a `fields=` subset. No database is needed; documents are synthesised in
+the shape upsert_event writes.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from app.models import EventOut
+from app.responses import dumps, orjson, trusted_rows
+
+
+def make_docs(n: int) -> list[dict]:
+    start = datetime(2026, 1, 1, 9, 30, 0, 123000)
+    return [
+        {
+            '_id': str(ObjectId()),
+            'name': f'Event {i}',
+            'description': 'Beach clean-up and sorting of collected recyclables. ' * 3,
+            'location': {'type': 'Point', 'coordinates': [-82.3248 + i * 1e-5, 29.6516]},
+            'location_name': 'Reitz Union',
+            'start_date': start + timedelta(days=i % 365),
+            'end_date': start + timedelta(days=i % 365, hours=4),
+            'delegate_join_code': 'ABC123',
+            'created_by': 'organizer@example.com',
+            'created_at': start,
+            'updated_at': start,
+            'version': 3,
+        }
+        for i in range(n)
+    ]
+
+
+_adapter = TypeAdapter(List[EventOut])
+
+
+def validated(docs: list[dict]) -> bytes:
+    items = [EventOut.model_validate(d) for d in docs]
+    # What FastAPI does with response_model=List[EventOut]
+    checked = _adapter.validate_python(items, from_attributes=True)
+    content = _adapter.dump_python(checked, mode='json', by_alias=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def trusted(docs: list[dict]) -> bytes:
+    return dumps(trusted_rows(EventOut, docs))
+
+
+def trusted_sparse(docs: list[dict]) -> bytes:
+    return dumps(trusted_rows(EventOut, docs, frozenset({'_id', 'name', 'start_date', 'location'})))
+
+
+def timed(fn, docs: list[dict], repeat: int) -> tuple[float, int]:
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(docs)
+        best = min(best, time.perf_counter() - start)
+        size = len(body)
+    return best, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='best-of runs per path')
+    args = parser.parse_args()
+
+    docs = make_docs(args.items)
+    # Both paths must produce the same JSON for full documents
+    assert json.loads(validated(docs[:50])) == json.loads(trusted(docs[:50])), 'fast path output differs'
+
+    print(f"{args.items} events, encoder: {'orjson' if orjson else 'stdlib json'}")
+    print(f"{'path':<16} {'total ms':>9} {'us/item':>8} {'bytes':>10}")
+    baseline = None
+    for label, fn in (('validated', validated), ('trusted', trusted), ('trusted+fields', trusted_sparse)):
+        seconds, size = timed(fn, docs, args.repeat)
+        baseline = baseline or seconds
+        print(f"{label:<16} {seconds * 1000:>9.1f} {seconds / args.items * 1e6:>8.2f} {size:>10}  ({baseline / seconds:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Database diagnostics.
+
+Usage (from the backend/ directory):
+    python check_db.py                 # apply the index manifest, then audit
+    python check_db.py --audit-only    # only run the explain() audit
+    python check_db.py --backfill-join-codes
+                                       # register pre-existing codes in join_codes
+                                       # (also run once by the app on startup)
+    python check_db.py --backfill-org-keys
+                                       # add organization_key / uppercase org codes
+                                       # (also run once by the app on startup)
+
+The audit runs explain() on every query shape used by the routes and exits
+with status 1 if any of them falls back to a collection scan.
+"""
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import settings
+from app.indexes import audit_query_shapes, ensure_indexes
+from app.join_codes import backfill_join_codes
+from app.orgs import backfill_org_keys
+
+
+async def _run(audit_only: bool) -> list[dict]:
+    client = AsyncIOMotorClient(settings.MONGO_URL)
+    db = client['GatorGather']
+    try:
+        if not audit_only:
+            await ensure_indexes(db)
+        return await audit_query_shapes(db)
+    finally:
+        client.close()
+
+
+async def _backfill_join_codes() -> int:
+    client = AsyncIOMotorClient(settings.MONGO_URL)
+    try:
+        return await backfill_join_codes(client['GatorGather'])
+    finally:
+        client.close()
+
+
+async def _backfill_org_keys() -> dict:
+    client = AsyncIOMotorClient(settings.MONGO_URL)
+    try:
+        return await backfill_org_keys(client['GatorGather'])
+    finally:
+        client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='GatorGather index provisioning and query-shape audit')
+    parser.add_argument('--audit-only', action='store_true', help='skip index creation, only run explain()')
+    parser.add_argument('--backfill-join-codes', action='store_true', help='register existing codes in join_codes and exit')
+    parser.add_argument('--backfill-org-keys', action='store_true', help='normalize organization keys and org codes and exit')
+    args = parser.parse_args()
+
+    if args.backfill_join_codes:
+        added = asyncio.run(_backfill_join_codes())
+        print(f"Registered {added} join codes")
+        return 0
+
+    if args.backfill_org_keys:
+        counts = asyncio.run(_backfill_org_keys())
+        print(f"Updated {counts}")
+        return 0
+
+    report = asyncio.run(_run(args.audit_only))
+
+    failures = 0
+    for entry in report:
+        ok = entry['indexed'] and not entry['in_memory_sort']
+        if not ok:
+            failures += 1
+        status = 'OK  ' if ok else 'SCAN'
+        used = ','.join(entry['indexes']) or '-'
+        sort = f" sort={entry['sort']}" if entry['sort'] else ''
+        print(f"{status} {entry['collection']:<18} {entry['filter']}{sort}  [{' > '.join(entry['stages'])}] index={used}")
+
+    print(f"\n{len(report) - failures}/{len(report)} query shapes served by an index")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,40 @@
+import sys
+
+
 class NotificationManager:
-    
+    """Console notifications for the in-memory Event model.
+
+    Each message is formatted once per call and written for all users in one
+    batch. The API stores notifications through app/notifications.py.
+    """
+
+    @staticmethod
+    def _deliver(users, tag, message):
+        sys.stdout.write("".join(f"[{tag} {user}]: {message}\n" for user in users))
+
     @staticmethod
     def send_time_change(users, event, old_time):
-        for user in users:
-            print(f"[Notification to {user}]: Event '{event.title}' time changed from {old_time} to {event.time}.")
+        NotificationManager._deliver(users, "Notification to", f"Event '{event.title}' time changed from {old_time} to {event.time}.")
 
     @staticmethod
     def send_address_change(users, event, old_address):
-        for user in users:
-            print(f"[Notification to {user}]: Address for '{event.title}' changed from {old_address} to {event.address}.")
+        NotificationManager._deliver(users, "Notification to", f"Address for '{event.title}' changed from {old_address} to {event.address}.")
 
     @staticmethod
     def send_general_tip(users, event, message):
-        for user in users:
-            print(f"[Heads-Up to {user}]: {message} (Event: {event.title})")
+        NotificationManager._deliver(users, "Heads-Up to", f"{message} (Event: {event.title})")
 
     @staticmethod
     def send_attendance_change(users, event, change_description):
-        for user in users:
-            print(f"[Notification to {user}]: Attendance update for '{event.title}': {change_description}")
+        NotificationManager._deliver(users, "Notification to", f"Attendance update for '{event.title}': {change_description}")
 
     @staticmethod
     def send_requirements(users, event, message):
-        for user in users:
-            print(f"[Requirements for {user}]: {message} (Event: {event.title})")
+        NotificationManager._deliver(users, "Requirements for", f"{message} (Event: {event.title})")
 
     @staticmethod
     def send_reminders(users, event):
-        for user in users:
-            print(f"[Reminder to {user}]: Don't forget about '{event.title}' happening at {event.time}!")
+        NotificationManager._deliver(users, "Reminder to", f"Don't forget about '{event.title}' happening at {event.time}!")
 
     @staticmethod
     def send_welcome_message(user, event):
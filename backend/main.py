@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query, BackgroundTasks
 import os
 import smtplib
 import ssl
@@ -6,21 +6,45 @@ import requests
 from email.message import EmailMessage
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordRequestForm
-from app.auth import create_access_token
+from app.auth import create_access_token, access_token_claims, invalidate_token_state
 from app.models import *
-from app.auth import get_current_user
+from app.dependencies import get_current_user, get_verified_user
 from app.database import lifespan, get_db
 from app.users import get_by_email, create_user, authenticate_user
+from app.assignments import insert_assignment, delete_assignments, apply_assignments, assign_users_to_task, CapacityExceeded
+from app import join_codes
+from app.pagination import (
+    PageParams, page_params, find_page, aggregate_page_stages, page_from, set_next_cursor,
+    ID_ASC, NEXT_CURSOR_HEADER,
+)
+from app.versions import touch_events, event_stamp
+from app.etags import make_etag, conditional
+from app.fieldsets import Fieldset, fieldset, parse_fields, projection, render, response_keys
+from app.responses import trusted_rows, fast_list_response
+from app.geocoding import geocoder, GeocodingUnavailable, GeocodingFailed
+from app.geo import near_pipeline, overlap_filter, NEAREST_FIRST
+from app import clusters
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import Optional, List, Dict, Union
 from bson import ObjectId
-from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from datetime import datetime, timezone
 from fastapi import HTTPException
 from pydantic import EmailStr
 from app.config import settings
-from app.email_service import send_password_reset, send_email
-import re
+from app.email_service import password_reset_message, email_config_error
+from app.email_outbox import enqueue_email
+from app import broadcasts
+from app import notifications
+from app import live
+from app import retention
+from app import orgs
+from app import cascade
+from fastapi.responses import StreamingResponse
+import asyncio
 
 app = FastAPI(lifespan=lifespan)
 
@@ -35,87 +59,47 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Continuation token for paginated lists (see app/pagination.py) and conditional-GET validators
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
     allow_credentials=False
 )
+# Compress JSON bodies above the threshold for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
 
-def _generate_join_code(length: int = 6) -> str:
-    import secrets, string
-    alphabet = string.ascii_uppercase + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
-
-def _code_exists(db, code: str, exclude_id: ObjectId | None = None) -> bool:
-    query: Dict = {
-        '$or': [
-            {'delegate_join_code': code},
-            {'volunteer_join_code': code},
-        ]
-    }
-    if exclude_id is not None:
-        query['_id'] = {'$ne': exclude_id}
-    return db['events'].find_one(query) is not None
-
-def _generate_unique_join_code(db, length: int = 6, max_attempts: int = 100, exclude_id: ObjectId | None = None) -> str:
-    for _ in range(max_attempts):
-        code = _generate_join_code(length)
-        if not _code_exists(db, code, exclude_id=exclude_id):
-            return code
-    raise HTTPException(status_code=500, detail='Failed to generate a unique join code')
-
-def _generate_unique_task_code(db, length: int = 6, max_attempts: int = 100) -> str:
-    import secrets, string
-    alphabet = string.ascii_uppercase + string.digits
-    for _ in range(max_attempts):
-        code = ''.join(secrets.choice(alphabet) for _ in range(length))
-        if db['event_tasks'].find_one({'task_join_code': code}) is None:
-            return code
-    raise HTTPException(status_code=500, detail="Failed to generate unique task code")
-
-def _generate_unique_delegate_org_code(db, length: int = 6, max_attempts: int = 100) -> str:
-    import secrets, string
-    alphabet = string.ascii_uppercase + string.digits
-    for _ in range(max_attempts):
-        code = ''.join(secrets.choice(alphabet) for _ in range(length))
-        if db['event_volunteers'].find_one({'delegate_org_code': code}) is None:
-            return code
-    raise HTTPException(status_code=500, detail='Failed to generate delegate org code')
-
-def _auto_assign_volunteers_for_delegate(db, event_id: str, task_oid: ObjectId, delegate_doc: Dict, assigned_by: str):
-    code = delegate_doc.get("delegate_org_code")
+async def _org_volunteer_ids(db, event_id: str, delegate_doc: Dict | None) -> List[str]:
+    """User ids of the volunteers who joined the event through this delegate's org."""
+    code = delegate_doc.get("delegate_org_code") if delegate_doc else None
     if not code:
-        return
-    volunteers = list(db['event_volunteers'].find({
-        "event_id": event_id,
-        "role": "volunteer",
-        "delegate_org_code": code
-    }))
-    now = datetime.utcnow()
-    for vol in volunteers:
-        if not vol.get("user_id"):
-            continue
-        existing_assignment = db["task_assignments"].find_one({
-            "activity_id": str(task_oid),
-            "user_id": vol["user_id"],
-        })
-        if not existing_assignment:
-            db["task_assignments"].insert_one({
-                "event_id": event_id,
-                "activity_id": str(task_oid),
-                "user_id": vol["user_id"],
-                "assigned_by": assigned_by,
-                "assigned_at": now,
-            })
-
-def _find_delegate_by_org(db, org_name: str):
-    """Find existing delegate record for an organization (case-insensitive)."""
+        return []
+    return [
+        v["user_id"]
+        async for v in db['event_volunteers'].find(
+            {"event_id": event_id, "role": "volunteer", "delegate_org_code": code},
+            {"user_id": 1, "_id": 0},
+        )
+        if v.get("user_id")
+    ]
+
+async def _names_for(db, emails: List[str | None]) -> Dict[str, str]:
+    """Resolve display names for many users with a single `$in` query."""
+    wanted = list({e for e in emails if e})
+    if not wanted:
+        return {}
+    names = {}
+    async for user_doc in db["users"].find({"email": {"$in": wanted}}, {"email": 1, "first_name": 1, "last_name": 1}):
+        first = user_doc.get("first_name") or ""
+        last = user_doc.get("last_name") or ""
+        names[user_doc["email"]] = f"{first} {last}".strip()
+    return names
+
+async def _find_delegate_by_org(db, org_name: str):
+    """Find existing delegate record for an organization (case-insensitive, see app/orgs.py)."""
     if not org_name:
         return None
-    return db["event_volunteers"].find_one({
-        "role": "delegate",
-        "organization": {"$regex": f"^{re.escape(org_name)}$", "$options": "i"}
-    })
+    return await orgs.find_delegate_by_org(db, org_name)
 
 @app.post('/token', response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db = Depends(get_db),
@@ -126,7 +110,7 @@ def login_for_access_token(
     store the token. The token is also returned in the response body to
     support clients that prefer to store it themselves.
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -134,7 +118,7 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token({"sub": user.email})
+    access_token = create_access_token(access_token_claims(user))
 
     # Set cookie for browser-based clients. HttpOnly prevents JS access.
     # For local development we don't set Secure=True so cookies work over http.
@@ -146,25 +130,11 @@ def login_for_access_token(
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    # authenticate_user expects db instance; obtain via request? use app.db via get_db shim
-    # Since get_db is a dependency that expects Request, reuse users.authenticate_user by querying directly
-    # create a dummy request-like object is not needed; instead access app.db directly
-    db_instance = app.db
-    user = authenticate_user(db_instance, form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='Incorrect username or password',
-            headers={'WWW-Authenticate': 'Bearer'},
-        )
-    access_token = create_access_token(data={'sub': user.email})
-    return {'access_token': access_token, 'token_type': 'bearer'}
 
 @app.post('/signup')
-def signup(user: UserCreate, db = Depends(get_db)):
+async def signup(user: UserCreate, db = Depends(get_db)):
     try:
-        new_user = create_user(db, user)
+        new_user = await create_user(db, user)
     except HTTPException as e:
         raise e
     
@@ -185,10 +155,16 @@ class EventUpsert(EventBase):
     delegate_join_code: Optional[str] = Field(default=None, alias='delegate_join_code')
     volunteer_join_code: Optional[str] = Field(default=None, alias='volunteer_join_code')
 
+def _naive_utc(value):
+    """Stored datetimes are naive UTC; clients send ISO strings with an offset (`...Z`)."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @app.patch('/event', response_model=EventOut)
-def upsert_event(event: EventUpsert, current_user=Depends(get_current_user)):
+async def upsert_event(event: EventUpsert, background_tasks: BackgroundTasks, current_user=Depends(get_verified_user)):
     db = app.db
-    payload = event.model_dump(by_alias=True, exclude_unset=True)
+    payload = {k: _naive_utc(v) for k, v in event.model_dump(by_alias=True, exclude_unset=True).items()}
     now = datetime.utcnow()
 
     doc: Dict = {}
@@ -199,21 +175,35 @@ def upsert_event(event: EventUpsert, current_user=Depends(get_current_user)):
             raise HTTPException(status_code=400, detail='Invalid event id')
         payload.pop('_id', None)
         payload['updated_at'] = now
-        res = db['events'].update_one({'_id': oid}, {'$set': payload})
-        if res.matched_count == 0:
+        before = await db['events'].find_one_and_update(
+            {'_id': oid}, {'$set': payload, '$inc': {'version': 1}}, return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
             raise HTTPException(status_code=404, detail='Event not found')
-        doc = db['events'].find_one({'_id': oid}) or {}
+        doc = {**before, **payload, 'version': before.get('version', 0) + 1}
+        diff = {k: v for k, v in payload.items() if k != 'updated_at' and v != before.get(k)}
+        changed = {
+            field: {'old': before.get(field), 'new': diff[field]}
+            for field in _NOTIFY_FIELDS
+            if field in diff
+        }
+        # Participants are notified after the response is sent
+        background_tasks.add_task(_create_notifications, db, doc, changed)
+        live.publish_event(str(oid), 'event.updated', version=doc['version'], changes=diff)
     else:
         payload['created_by'] = getattr(current_user, 'email', None) or (
             current_user.get('email') if isinstance(current_user, dict) else None
         )
         if not payload['created_by']:
             raise HTTPException(status_code=500, detail='Unable to determine creator email')
-        payload['delegate_join_code'] = _generate_unique_join_code(db)
+        # Pick the id up front so the join code can be registered against it
+        payload['_id'] = ObjectId()
+        payload['delegate_join_code'] = await join_codes.allocate_join_code(db, join_codes.EVENT, str(payload['_id']))
         payload['created_at'] = now
         payload['updated_at'] = now
-        result = db['events'].insert_one(payload)
-        doc = db['events'].find_one({'_id': result.inserted_id}) or {}
+        payload['version'] = 1
+        result = await db['events'].insert_one(payload)
+        doc = await db['events'].find_one({'_id': result.inserted_id}) or {}
 
     if doc.get('_id'):
         doc['_id'] = str(doc['_id'])
@@ -222,8 +212,39 @@ def upsert_event(event: EventUpsert, current_user=Depends(get_current_user)):
 
 
 
+# Declared before /events/{event_id} so "near" isn't taken for an event id
+@app.get("/events/near", response_model=List[NearbyEventOut])
+async def events_near(
+    response: Response,
+    lng: float = Query(ge=-180, le=180),
+    lat: float = Query(ge=-90, le=90),
+    radius_m: float = Query(default=5000, gt=0, le=settings.GEO_MAX_RADIUS_M),
+    window_start: Optional[datetime] = None,
+    window_end: Optional[datetime] = None,
+    page: PageParams = Depends(page_params),
+    current_user=Depends(get_current_user),
+):
+    """Events within `radius_m` of (lng, lat), nearest first, optionally overlapping a time window."""
+    db = app.db
+    query = overlap_filter("start_date", "end_date", window_start, window_end)
+    docs = await db["events"].aggregate(near_pipeline(lng, lat, radius_m, query, page)).to_list(None)
+    docs, next_cursor = page_from(docs, NEAREST_FIRST, page.limit)
+    set_next_cursor(response, next_cursor)
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return fast_list_response(trusted_rows(NearbyEventOut, docs), response)
+
+
 @app.get("/events/{event_id}")
-def get_event_details(event_id: str, role: str, delegate_org_code: Optional[str] = None, current_user=Depends(get_current_user)):
+async def get_event_details(
+    event_id: str,
+    role: str,
+    request: Request,
+    response: Response,
+    delegate_org_code: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user=Depends(get_current_user),
+):
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
@@ -234,37 +255,58 @@ def get_event_details(event_id: str, role: str, delegate_org_code: Optional[str]
     except:
         raise HTTPException(status_code=400, detail="Invalid event id")
 
-    event = db["events"].find_one({"_id": oid})
+    details_model = _DETAILS_MODELS.get(role)
+    if details_model is None:
+        raise HTTPException(status_code=400, detail="Invalid role")
+    wanted = parse_fields(fields, details_model)
+
+    event = await db["events"].find_one(
+        {"_id": oid},
+        projection(wanted & _EVENT_DOC_KEYS if wanted else None, always=("_id", "version", "updated_at")),
+    )
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
 
+    # Everything below (rosters, assignments, tasks) is covered by the event's version
+    etag = make_etag("event", event_id, event_stamp(event), email, role, delegate_org_code, sorted(wanted or ()))
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
+
     event["id"] = str(event["_id"])
     del event["_id"]
 
     if role == "organizer":
-        vols = list(db["event_volunteers"].find({"event_id": event_id, "role": "volunteer"}))
-        dels = list(db["event_volunteers"].find({"event_id": event_id, "role": "delegate"}))
-        for v in vols:
-            v["_id"] = str(v["_id"])
-        for d in dels:
-            d["_id"] = str(d["_id"])
-        event["volunteers"] = vols
-        event["delegates"] = dels
-        event["total_attendees"] = len(vols) + len(dels)
-        return OrganizerEventDetails(**event)
+        # Rosters are embedded as a first page plus a total; the rest is paged via /events/{id}/roster.
+        # With `fields`, only the rosters that were asked for are read.
+        vols = dels = ([], 0, None)
+        want_vols = _wants(wanted, "volunteers", "volunteers_total", "volunteers_next_cursor", "total_attendees")
+        want_dels = _wants(wanted, "delegates", "delegates_total", "delegates_next_cursor", "total_attendees")
+        if want_vols or want_dels:
+            vols, dels = await asyncio.gather(
+                _roster_page(db, {"event_id": event_id, "role": "volunteer"}) if want_vols else _no_roster(),
+                _roster_page(db, {"event_id": event_id, "role": "delegate"}) if want_dels else _no_roster(),
+            )
+        event["volunteers"], event["volunteers_total"], event["volunteers_next_cursor"] = vols
+        event["delegates"], event["delegates_total"], event["delegates_next_cursor"] = dels
+        event["total_attendees"] = event["volunteers_total"] + event["delegates_total"]
+        return render(OrganizerEventDetails, event, wanted)
 
     if role == "volunteer":
         # If a specific org code was provided, ensure membership exists
         if delegate_org_code:
-            membership = db["event_volunteers"].find_one({"user_id": email, "role": "volunteer", "delegate_org_code": delegate_org_code, "event_id": event_id})
+            membership, assignment = await asyncio.gather(
+                db["event_volunteers"].find_one({"user_id": email, "role": "volunteer", "delegate_org_code": delegate_org_code, "event_id": event_id}),
+                db["task_assignments"].find_one({"user_id": email, "event_id": event_id}),
+            )
             if not membership:
                 raise HTTPException(status_code=404, detail="Volunteer not in this org for the event")
-
-        assignment = db["task_assignments"].find_one({"user_id": email, "event_id": event_id})
+        else:
+            assignment = await db["task_assignments"].find_one({"user_id": email, "event_id": event_id})
         if not assignment:
             raise HTTPException(status_code=400, detail="Volunteer is not assigned to a task")
 
-        task = db["event_tasks"].find_one({"_id": ObjectId(assignment["activity_id"])})
+        task = await db["event_tasks"].find_one({"_id": ObjectId(assignment["activity_id"])})
         if not task:
             raise HTTPException(status_code=400, detail="Task not found")
 
@@ -278,109 +320,262 @@ def get_event_details(event_id: str, role: str, delegate_org_code: Optional[str]
         event["task_description"] = task.get("description", "")
         event["task_location"] = task.get("location", {})
         event["task_location_name"] = str(task.get("location_name", ""))
-        return VolunteerEventDetails(**event)
+        return render(VolunteerEventDetails, event, wanted)
 
     if role == "delegate":
-        delegate_doc = db["event_volunteers"].find_one({"event_id": event_id, "user_id": email, "role": "delegate"})
-        assignment = db["task_assignments"].find_one({"user_id": email, "event_id": event_id})
+        delegate_doc, assignment = await asyncio.gather(
+            db["event_volunteers"].find_one({"event_id": event_id, "user_id": email, "role": "delegate"}),
+            db["task_assignments"].find_one({"user_id": email, "event_id": event_id}),
+        )
         if not assignment:
             raise HTTPException(status_code=400, detail="Delegate is not assigned to a task")
 
-        task = db["event_tasks"].find_one({"_id": ObjectId(assignment["activity_id"])})
-        if not task:
-            raise HTTPException(status_code=400, detail="Task not found")
-
-        volunteers = list(db["event_volunteers"].find({
+        # The task and the org roster only depend on the two lookups above
+        roster_query = {
             "event_id": event_id,
             "role": "volunteer",
             "delegate_org_code": delegate_doc.get("delegate_org_code") if delegate_doc else None
-        }))
-        event["total_attendees"] = len(volunteers)
-        for v in volunteers:
-            v["_id"] = str(v.get("_id", ""))
+        }
+        task, (volunteers, total, next_cursor) = await asyncio.gather(
+            db["event_tasks"].find_one({"_id": ObjectId(assignment["activity_id"])}),
+            _roster_page(db, roster_query)
+            if _wants(wanted, "volunteers", "volunteers_next_cursor", "total_attendees") else _no_roster(),
+        )
+        if not task:
+            raise HTTPException(status_code=400, detail="Task not found")
+
+        event["total_attendees"] = total
         event["volunteers"] = volunteers
+        event["volunteers_next_cursor"] = next_cursor
         event["organizer_contact_info"] = task.get("organizer_contact_info") or event.get("organizer_contact_info", "")
         event["my_role"] = "delegate"
         event["volunteer_join_code"] = task.get("task_join_code", "")
         event["task_description"] = task.get("description", "")
         event["task_location"] = task.get("location", {})
         event["task_location_name"] = str(task.get("location_name", ""))
-        return DelegateEventDetails(**event)
+        return render(DelegateEventDetails, event, wanted)
 
     raise HTTPException(status_code=400, detail="Invalid role")
 
 
+_DETAILS_MODELS = {
+    "organizer": OrganizerEventDetails,
+    "volunteer": VolunteerEventDetails,
+    "delegate": DelegateEventDetails,
+}
+# Detail keys read straight off the event document (everything else is derived)
+_EVENT_DOC_KEYS = response_keys(EventOut) | {"organizer_contact_info"}
+
+
+def _wants(fields: Fieldset, *keys: str) -> bool:
+    return fields is None or any(k in fields for k in keys)
+
+
+async def _no_roster():
+    return [], 0, None
+
+
+async def _roster_page(db, query: Dict, page: PageParams | None = None):
+    """One page of event_volunteers matching `query`, with the total and next-page token."""
+    page = page or PageParams(limit=settings.ROSTER_PAGE_SIZE)
+    (docs, next_cursor), total = await asyncio.gather(
+        find_page(db["event_volunteers"], query, ID_ASC, page),
+        db["event_volunteers"].count_documents(query),
+    )
+    for d in docs:
+        d["_id"] = str(d["_id"])
+    return docs, total, next_cursor
+
+
+@app.get("/events/{event_id}/roster")
+async def get_event_roster(
+    event_id: str,
+    response: Response,
+    role: str,
+    delegate_org_code: Optional[str] = None,
+    page: PageParams = Depends(page_params),
+    current_user=Depends(get_verified_user),
+):
+    """Page through an event's volunteers or delegates (continuation of the detail rosters).
+
+    The organizer (or an admin) can read either roster; a delegate can read
+    the volunteers of their own org.
+    """
+    db = app.db
+    email = getattr(current_user, "email", None)
+    if role not in ("volunteer", "delegate"):
+        raise HTTPException(status_code=400, detail="Invalid role")
+    try:
+        oid = ObjectId(event_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid event id")
+
+    event, delegate_doc = await asyncio.gather(
+        db["events"].find_one({"_id": oid}, {"created_by": 1}),
+        db["event_volunteers"].find_one({"event_id": event_id, "user_id": email, "role": "delegate"}, {"delegate_org_code": 1}),
+    )
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    query = {"event_id": event_id, "role": role}
+    if event.get("created_by") == email or getattr(current_user, "admin", False):
+        if delegate_org_code:
+            query["delegate_org_code"] = delegate_org_code
+    elif role == "volunteer" and delegate_doc and delegate_doc.get("delegate_org_code"):
+        query["delegate_org_code"] = delegate_doc["delegate_org_code"]
+    else:
+        raise HTTPException(status_code=403, detail="Not allowed to view this roster")
+
+    docs, total, next_cursor = await _roster_page(db, query, page)
+    set_next_cursor(response, next_cursor)
+    return {"items": docs, "total": total, "next_cursor": next_cursor}
+
+
+def _live_response(topics: List) -> StreamingResponse:
+    if live.hub.full():
+        raise HTTPException(status_code=503, detail="Too many live connections, poll instead")
+    return StreamingResponse(
+        live.stream(topics),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back until its buffer fills
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/events/{event_id}/live")
+async def event_live(event_id: str, current_user=Depends(get_verified_user)):
+    """Server-Sent Events stream of task and event changes (see app/live.py).
+
+    Open to the organizer, admins and the event's volunteers and delegates.
+    """
+    db = app.db
+    email = getattr(current_user, "email", None)
+    try:
+        oid = ObjectId(event_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid event id")
+    event, member = await asyncio.gather(
+        db["events"].find_one({"_id": oid}, {"created_by": 1}),
+        db["event_volunteers"].find_one({"event_id": event_id, "user_id": email}, {"_id": 1}),
+    )
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if not (member or event.get("created_by") == email or getattr(current_user, "admin", False)):
+        raise HTTPException(status_code=403, detail="Not allowed to follow this event")
+    return _live_response([("event", event_id)])
+
+@app.get("/live/stats")
+async def live_stats(current_user=Depends(get_verified_user)):
+    """Open streams and publish counters for this worker (admin only)."""
+    if not current_user.admin:
+        raise HTTPException(status_code=401, detail='User does not have admin privileges')
+    return live.hub.stats()
+
 
 # -------- Event listing & joining endpoints --------
+def _my_events_pipeline(email: str, role: str) -> List[Dict]:
+    """Aggregation over event_volunteers that yields the user's event documents.
+
+    Volunteers who joined a task directly (no delegate org) only see the
+    event while they still hold an assignment in it.
+    """
+    pipeline: List[Dict] = [
+        {'$match': {'user_id': email, 'role': role, 'event_id': {'$type': 'string'}}},
+    ]
+    if role == 'volunteer':
+        pipeline += [
+            {'$lookup': {
+                'from': 'task_assignments',
+                'localField': 'event_id',
+                'foreignField': 'event_id',
+                'pipeline': [{'$match': {'user_id': email}}, {'$limit': 1}, {'$project': {'_id': 1}}],
+                'as': 'assignment',
+            }},
+            {'$match': {'$or': [
+                {'delegate_org_code': {'$nin': [None, '']}},
+                {'assignment.0': {'$exists': True}},
+            ]}},
+        ]
+    pipeline += [
+        {'$group': {'_id': '$event_id'}},
+        # event_id is stored as a string; invalid ids become null and drop out at the $unwind
+        {'$project': {'oid': {'$convert': {'input': '$_id', 'to': 'objectId', 'onError': None, 'onNull': None}}}},
+        {'$lookup': {'from': 'events', 'localField': 'oid', 'foreignField': '_id', 'as': 'event'}},
+        {'$unwind': '$event'},
+        {'$replaceRoot': {'newRoot': '$event'}},
+    ]
+    return pipeline
+
 @app.get('/events', response_model=List[EventOut])
-def list_events(role: str, current_user=Depends(get_current_user)):
-    """List events for a user by role: organizer|delegate|volunteer."""
+async def list_events(
+    role: str,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    fields: Fieldset = Depends(fieldset(EventOut)),
+    current_user=Depends(get_current_user),
+):
+    """List events for a user by role: organizer|delegate|volunteer (paged by `_id`)."""
     db = app.db
     email = getattr(current_user, 'email', None)
     if not email:
         raise HTTPException(status_code=500, detail='Missing user email')
-    cursor = None
+    proj = projection(fields, always=('_id', 'version', 'updated_at'))
     if role == 'organizer':
-        cursor = db['events'].find({'created_by': email})
+        docs, next_cursor = await find_page(db['events'], {'created_by': email}, ID_ASC, page, proj)
     elif role in ('delegate','volunteer'):
-        # Lookup event volunteer docs then fetch events
-        ev_docs = list(db['event_volunteers'].find({'user_id': email, 'role': role}))
-        event_ids = []
-        for d in ev_docs:
-            ev_id = d.get('event_id')
-            if not ev_id:
-                continue
-            # For volunteers without a delegate org, only include if they still have a task assignment
-            if role == 'volunteer' and not d.get('delegate_org_code'):
-                has_assignment = db['task_assignments'].find_one({"event_id": ev_id, "user_id": email})
-                if not has_assignment:
-                    continue
-            event_ids.append(ev_id)
-        # event_id stored as string; convert back to ObjectId for query
-        oids = []
-        for eid in event_ids:
-            try:
-                oids.append(ObjectId(eid))
-            except Exception:
-                continue
-        cursor = db['events'].find({'_id': {'$in': oids}}) if oids else []
+        # Memberships, assignment check and event fetch in one server-side pipeline
+        pipeline = _my_events_pipeline(email, role) + aggregate_page_stages(ID_ASC, page)
+        if proj:
+            pipeline.append({'$project': proj})
+        docs, next_cursor = page_from(await db['event_volunteers'].aggregate(pipeline).to_list(None), ID_ASC, page.limit)
     else:
         raise HTTPException(status_code=400, detail='Invalid role')
 
-    results = []
-    for doc in cursor:
+    set_next_cursor(response, next_cursor)
+    etag = make_etag(
+        'events', email, role, page.limit, page.after, sorted(fields or ()),
+        [(str(d['_id']), event_stamp(d)) for d in docs],
+    )
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
+    return _event_list_response(docs, fields, response)
+
+def _event_list_response(docs: List[Dict], fields: Fieldset, response: Response):
+    # Our own documents: reshape and encode once instead of validating twice
+    for doc in docs:
         if doc.get('_id'):
             doc['_id'] = str(doc['_id'])
-        results.append(EventOut.model_validate(doc))
-    return results
+    return fast_list_response(trusted_rows(EventOut, docs, fields), response)
 
 class JoinEventIn(BaseModel):
     code: str
 
 @app.post("/event/join/{delegate_code}", response_model=EventOut)
-def join_event(delegate_code: str, current_user=Depends(get_current_user)):
+async def join_event(delegate_code: str, current_user=Depends(get_current_user)):
     db = app.db
     code = delegate_code.strip().upper()
     if len(code) != 6:
         raise HTTPException(status_code=400, detail="Code must be 6 characters")
-    event_doc = db["events"].find_one({"delegate_join_code": code})
+    event_doc = await join_codes.find_by_join_code(db, code, join_codes.EVENT, "events", {"delegate_join_code": code})
     if not event_doc:
         raise HTTPException(status_code=404, detail="Invalid delegate join code")
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
     event_id_str = str(event_doc["_id"])
-    existing = db["event_volunteers"].find_one({"event_id": event_id_str, "user_id": email})
+    existing = await db["event_volunteers"].find_one({"event_id": event_id_str, "user_id": email})
     if existing:
         if existing.get("role") != "delegate":
-            db["event_volunteers"].update_one({"_id": existing["_id"]}, {"$set": {"role": "delegate"}})
+            await db["event_volunteers"].update_one({"_id": existing["_id"]}, {"$set": {"role": "delegate"}})
     else:
-        db["event_volunteers"].insert_one({
+        await db["event_volunteers"].insert_one({
             "event_id": event_id_str,
             "user_id": email,
             "role": "delegate",
             "joined_at": datetime.utcnow(),
     })
+    await touch_events(db, event_id_str)
     event_doc["_id"] = event_id_str
     return EventOut.model_validate(event_doc)
 
@@ -388,7 +583,7 @@ class DelegateRegister(BaseModel):
     organization: str
 
 @app.post("/delegate/register")
-def register_delegate(payload: DelegateRegister, current_user=Depends(get_current_user), event_id: str | None = None):
+async def register_delegate(payload: DelegateRegister, current_user=Depends(get_current_user), event_id: str | None = None):
     """
     Allow a delegate to register without an existing event. They can optionally pass an event_id or delegate code.
     If no event is provided, we store the delegate with event_id=None and generate an org code they can share now.
@@ -402,60 +597,67 @@ def register_delegate(payload: DelegateRegister, current_user=Depends(get_curren
     if event_id:
         try:
             oid = ObjectId(event_id)
-            event_doc = db["events"].find_one({"_id": oid})
+            event_doc = await db["events"].find_one({"_id": oid})
         except Exception:
-            code = event_id.strip().upper()
+            code = join_codes.normalize_join_code(event_id)
             if len(code) == 6:
-                event_doc = db["events"].find_one({"delegate_join_code": code})
+                event_doc = await join_codes.find_by_join_code(db, code, join_codes.EVENT, "events", {"delegate_join_code": code})
 
     event_id_str = str(event_doc["_id"]) if event_doc else None
 
     # If org already has a delegate record, reuse its code and update linkage/user/org
-    existing_org_delegate = _find_delegate_by_org(db, payload.organization)
+    existing_org_delegate = await _find_delegate_by_org(db, payload.organization)
     delegate_code = None
     if existing_org_delegate:
-        delegate_code = existing_org_delegate.get("delegate_org_code") or _generate_unique_delegate_org_code(db)
-        db["event_volunteers"].update_one(
+        delegate_code = existing_org_delegate.get("delegate_org_code") or await join_codes.allocate_join_code(
+            db, join_codes.DELEGATE_ORG, str(existing_org_delegate["_id"])
+        )
+        await db["event_volunteers"].update_one(
             {"_id": existing_org_delegate["_id"]},
             {"$set": {
-                "organization": payload.organization,
+                **orgs.org_fields(payload.organization),
                 "delegate_org_code": delegate_code,
                 "user_id": email,  # current user becomes the delegate contact for this org
                 "event_id": event_id_str or existing_org_delegate.get("event_id"),
             }},
         )
     else:
-        delegate_code = event_doc.get("delegate_join_code") if event_doc else _generate_unique_delegate_org_code(db)
-        db["event_volunteers"].insert_one({
+        delegate_oid = ObjectId()
+        delegate_code = event_doc.get("delegate_join_code") if event_doc else await join_codes.allocate_join_code(
+            db, join_codes.DELEGATE_ORG, str(delegate_oid)
+        )
+        await db["event_volunteers"].insert_one({
+            "_id": delegate_oid,
             "event_id": event_id_str,
             "user_id": email,
             "role": "delegate",
-            "organization": payload.organization,
+            **orgs.org_fields(payload.organization),
             "delegate_org_code": delegate_code,
             "joined_at": datetime.utcnow(),
         })
 
     # Also ensure a delegate record exists for this specific user+event (if different)
-    existing_user_delegate = db["event_volunteers"].find_one({"event_id": event_id_str, "user_id": email, "role": "delegate"})
+    existing_user_delegate = await db["event_volunteers"].find_one({"event_id": event_id_str, "user_id": email, "role": "delegate"})
     if existing_user_delegate and existing_user_delegate.get("delegate_org_code") != delegate_code:
-        db["event_volunteers"].update_one(
+        await db["event_volunteers"].update_one(
             {"_id": existing_user_delegate["_id"]},
-            {"$set": {"delegate_org_code": delegate_code, "organization": payload.organization}},
+            {"$set": {"delegate_org_code": delegate_code, **orgs.org_fields(payload.organization)}},
         )
     elif not existing_user_delegate:
-        db["event_volunteers"].insert_one({
+        await db["event_volunteers"].insert_one({
             "event_id": event_id_str,
             "user_id": email,
             "role": "delegate",
-            "organization": payload.organization,
+            **orgs.org_fields(payload.organization),
             "delegate_org_code": delegate_code,
             "joined_at": datetime.utcnow(),
         })
 
+    await touch_events(db, event_id_str, existing_org_delegate.get("event_id") if existing_org_delegate else None)
     return {"event_id": event_id_str, "delegate_org_code": delegate_code}
 
 @app.post("/delegate/attach/{event_id}/{delegate_org_code}")
-def attach_delegate_to_event(event_id: str, delegate_org_code: str, current_user=Depends(get_current_user)):
+async def attach_delegate_to_event(event_id: str, delegate_org_code: str, current_user=Depends(get_current_user)):
     """
     Later step: attach a previously registered delegate/org (and their volunteers) to a specific event.
     """
@@ -464,109 +666,55 @@ def attach_delegate_to_event(event_id: str, delegate_org_code: str, current_user
     event_doc = None
     try:
         oid = ObjectId(event_id)
-        event_doc = db["events"].find_one({"_id": oid})
+        event_doc = await db["events"].find_one({"_id": oid})
     except Exception:
         # Try event lookup by delegate join code
-        join_code = event_id.strip().upper()
+        join_code = join_codes.normalize_join_code(event_id)
         if len(join_code) == 6:
-            event_doc = db["events"].find_one({"delegate_join_code": join_code})
+            event_doc = await join_codes.find_by_join_code(db, join_code, join_codes.EVENT, "events", {"delegate_join_code": join_code})
     if not event_doc:
         raise HTTPException(status_code=404, detail="Event not found")
     event_id_str = str(event_doc["_id"])
 
-    delegate_doc = db["event_volunteers"].find_one({"delegate_org_code": code, "role": "delegate"})
+    delegate_doc = await orgs.find_delegate_by_code(db, code)
     if not delegate_doc:
         raise HTTPException(status_code=404, detail="Delegate org code not found")
 
-    db["event_volunteers"].update_one({"_id": delegate_doc["_id"]}, {"$set": {"event_id": event_id_str}})
+    await db["event_volunteers"].update_one({"_id": delegate_doc["_id"]}, {"$set": {"event_id": event_id_str}})
 
-    db["event_volunteers"].update_many(
+    await db["event_volunteers"].update_many(
         {"delegate_org_code": code, "role": "volunteer"},
         {"$set": {"event_id": event_id_str}},
     )
 
+    await touch_events(db, event_id_str, delegate_doc.get("event_id"))
     return {"event_id": event_id_str, "delegate_org_code": code}
 
 class DelegateRemovePayload(BaseModel):
     delegate_email: EmailStr
 
 @app.post("/delegate/remove/{event_id}")
-def remove_delegate_from_event(event_id: str, payload: DelegateRemovePayload, current_user=Depends(get_current_user)):
+async def remove_delegate_from_event(event_id: str, payload: DelegateRemovePayload, current_user=Depends(get_verified_user)):
     """
     Remove a delegate from an event and clear their volunteers and task assignments.
     """
     db = app.db
     try:
-        oid = ObjectId(event_id)
-    except Exception:
-        oid = None
-
-    # locate delegate doc
-    delegate_doc = db["event_volunteers"].find_one({
-        "event_id": event_id,
-        "user_id": payload.delegate_email,
-        "role": "delegate"
-    })
-    if not delegate_doc and oid:
-        delegate_doc = db["event_volunteers"].find_one({
-            "event_id": str(oid),
-            "user_id": payload.delegate_email,
-            "role": "delegate"
-        })
-    if not delegate_doc:
-        raise HTTPException(status_code=404, detail="Delegate not found for this event")
-
-    code = delegate_doc.get("delegate_org_code")
-
-    # Remove volunteers belonging to this delegate/org for the event
-    volunteers = list(db["event_volunteers"].find({
-        "event_id": event_id,
-        "role": "volunteer",
-        "delegate_org_code": code
-    }))
-    volunteer_ids = [v.get("user_id") for v in volunteers if v.get("user_id")]
-
-    db["event_volunteers"].delete_many({
-        "event_id": event_id,
-        "delegate_org_code": code,
-    })
-
-    # Clear task assignments for these users (and the delegate) on this event
-    db["task_assignments"].delete_many({
-        "event_id": event_id,
-        "user_id": {"$in": volunteer_ids + [payload.delegate_email]},
-    })
-
-    # Unassign tasks that were assigned to this delegate
-    db["event_tasks"].update_many(
-        {"event_id": event_id, "assigned_delegate": payload.delegate_email},
-        {"$unset": {"assigned_delegate": "", "assigned_delegate_org_code": "", "assigned_delegate_org": ""}}
-    )
-
-    # Remove the delegate record itself
-    db["event_volunteers"].delete_one({"_id": delegate_doc["_id"]})
-
-    return {"ok": True, "removed_delegate": payload.delegate_email, "removed_volunteers": len(volunteer_ids)}
+        removed = await cascade.remove_delegate(db, event_id, payload.delegate_email)
+    except cascade.Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await touch_events(db, removed["event_id"])
+    return {"ok": True, "removed_delegate": payload.delegate_email, "removed_volunteers": removed["removed_volunteers"]}
 
 @app.get("/delegate/profile")
-def delegate_profile(current_user=Depends(get_current_user)):
+async def delegate_profile(current_user=Depends(get_current_user)):
     """Return delegate profile: name/email, organization, code, volunteers list and count."""
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
 
-    def _name_for(user_email: str | None):
-        if not user_email:
-            return ""
-        user_doc = db["users"].find_one({"email": user_email})
-        if not user_doc:
-            return ""
-        first = user_doc.get("first_name") or ""
-        last = user_doc.get("last_name") or ""
-        return f"{first} {last}".strip()
-
-    delegate_doc = db["event_volunteers"].find_one({"user_id": email, "role": "delegate"})
+    delegate_doc = await db["event_volunteers"].find_one({"user_id": email, "role": "delegate"})
     if not delegate_doc:
         raise HTTPException(status_code=404, detail="Delegate not found")
 
@@ -574,32 +722,23 @@ def delegate_profile(current_user=Depends(get_current_user)):
     org = delegate_doc.get("organization")
     event_id = delegate_doc.get("event_id")
 
-    volunteers = list(db["event_volunteers"].find({
-        "delegate_org_code": code,
-        "role": "volunteer"
-    }))
-    volunteer_count = len(volunteers)
-    for v in volunteers:
-        v["_id"] = str(v.get("_id", ""))
-
-    user_doc = db["users"].find_one({"email": email})
-    full_name = ""
-    if user_doc:
-        first = user_doc.get("first_name") or ""
-        last = user_doc.get("last_name") or ""
-        full_name = f"{first} {last}".strip()
+    volunteers = await db["event_volunteers"].find(
+        {"delegate_org_code": code, "role": "volunteer"},
+        {"user_id": 1, "organization": 1},
+    ).to_list(None)
+    names = await _names_for(db, [email] + [v.get("user_id") for v in volunteers])
 
     return {
         "email": email,
-        "name": full_name,
+        "name": names.get(email, ""),
         "organization": org,
         "delegate_org_code": code,
         "event_id": event_id,
-        "volunteer_count": volunteer_count,
+        "volunteer_count": len(volunteers),
         "volunteers": [
             {
                 "email": v.get("user_id"),
-                "name": _name_for(v.get("user_id")),
+                "name": names.get(v.get("user_id"), ""),
                 "organization": v.get("organization"),
             }
             for v in volunteers
@@ -607,7 +746,7 @@ def delegate_profile(current_user=Depends(get_current_user)):
     }
 
 @app.post("/delegate/join/{delegate_org_code}")
-def join_via_delegate(delegate_org_code: str, current_user=Depends(get_current_user)):
+async def join_via_delegate(delegate_org_code: str, current_user=Depends(get_current_user)):
     """Volunteers join via a delegate's org code."""
     db = app.db
     code = delegate_org_code.strip()
@@ -615,58 +754,55 @@ def join_via_delegate(delegate_org_code: str, current_user=Depends(get_current_u
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
 
-    delegate_doc = db["event_volunteers"].find_one({
-        "delegate_org_code": {"$regex": f"^{code}$", "$options": "i"},
-        "role": "delegate"
-    })
+    delegate_doc = await orgs.find_delegate_by_code(db, code)
     if not delegate_doc:
         raise HTTPException(status_code=404, detail="Invalid delegate org code")
+    # Store the code exactly as issued, not as the user typed it
+    code = delegate_doc.get("delegate_org_code") or code
 
     event_id = delegate_doc.get("event_id")
     organization = delegate_doc.get("organization")
     delegate_user_id = delegate_doc.get("user_id")
 
-    existing = db["event_volunteers"].find_one({"event_id": event_id, "user_id": email})
+    existing = await db["event_volunteers"].find_one({"event_id": event_id, "user_id": email})
     if existing:
-        db["event_volunteers"].update_one(
+        await db["event_volunteers"].update_one(
             {"_id": existing["_id"]},
-            {"$set": {"role": "volunteer", "organization": organization, "delegate_org_code": code, "delegate_user_id": delegate_user_id}},
+            {"$set": {"role": "volunteer", **orgs.org_fields(organization), "delegate_org_code": code, "delegate_user_id": delegate_user_id}},
         )
     else:
-        db["event_volunteers"].insert_one({
+        await db["event_volunteers"].insert_one({
             "event_id": event_id,
             "user_id": email,
             "role": "volunteer",
-            "organization": organization,
+            **orgs.org_fields(organization),
             "delegate_org_code": code,
             "delegate_user_id": delegate_user_id,
             "joined_at": datetime.utcnow(),
         })
 
     if event_id:
-        assigned_tasks = list(db["event_tasks"].find({
+        assigned_tasks = await db["event_tasks"].find({
             "event_id": event_id,
             "$or": [
                 {"assigned_delegate": delegate_user_id},
                 {"assigned_delegate_org_code": code}
             ]
-        }))
-        now = datetime.utcnow()
-        for t in assigned_tasks:
-            activity_id = str(t["_id"])
-            exists = db["task_assignments"].find_one({"activity_id": activity_id, "user_id": email})
-            if not exists:
-                db["task_assignments"].insert_one({
-                    "event_id": event_id,
-                    "activity_id": activity_id,
-                    "user_id": email,
-                    "assigned_by": delegate_user_id or getattr(current_user, "email", None) or "",
-                    "assigned_at": now
-                })
+        }, {"_id": 1}).to_list(None)
+        await apply_assignments(db, [
+            {
+                "event_id": event_id,
+                "activity_id": str(t["_id"]),
+                "user_id": email,
+                "assigned_by": delegate_user_id or getattr(current_user, "email", None) or "",
+            }
+            for t in assigned_tasks
+        ])
+    await touch_events(db, event_id)
 
     try:
         oid = ObjectId(event_id)
-        event_doc = db["events"].find_one({"_id": oid})
+        event_doc = await db["events"].find_one({"_id": oid})
     except Exception:
         event_doc = None
     if event_doc and event_doc.get("_id"):
@@ -675,54 +811,57 @@ def join_via_delegate(delegate_org_code: str, current_user=Depends(get_current_u
     return {"event_id": event_id}
 
 @app.get("/volunteer/profile")
-def volunteer_profile(current_user=Depends(get_current_user)):
+async def volunteer_profile(current_user=Depends(get_current_user)):
     """Return volunteer profile: delegate info, org code, and volunteers in the same org."""
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
 
-    def _name_for(user_email: str | None):
-        if not user_email:
-            return ""
-        user_doc = db["users"].find_one({"email": user_email})
-        if not user_doc:
-            return ""
-        first = user_doc.get("first_name") or ""
-        last = user_doc.get("last_name") or ""
-        return f"{first} {last}".strip()
+    vol_docs = await db["event_volunteers"].find({"user_id": email, "role": "volunteer"}).to_list(None)
+    # Skip non-org (task-only) memberships so they don't appear in "My Groups"
+    vol_docs = [v for v in vol_docs if v.get("delegate_org_code")]
+    codes = list({v["delegate_org_code"] for v in vol_docs})
+    if not codes:
+        return {"email": email, "memberships": []}
+
+    # One query for every org's delegate and one for every org's roster,
+    # instead of a pair per membership.
+    delegate_docs, roster_docs = await asyncio.gather(
+        db["event_volunteers"].find(
+            {"delegate_org_code": {"$in": codes}, "role": "delegate"},
+            {"delegate_org_code": 1, "user_id": 1},
+        ).to_list(None),
+        db["event_volunteers"].find(
+            {"delegate_org_code": {"$in": codes}, "role": "volunteer"},
+            {"delegate_org_code": 1, "user_id": 1, "organization": 1},
+        ).to_list(None),
+    )
+    delegate_by_code: Dict[str, str | None] = {}
+    for d in delegate_docs:
+        delegate_by_code.setdefault(d["delegate_org_code"], d.get("user_id"))
+    rosters: Dict[str, List[Dict]] = {code: [] for code in codes}
+    for v in roster_docs:
+        rosters[v["delegate_org_code"]].append(v)
 
-    vol_docs = list(db["event_volunteers"].find({"user_id": email, "role": "volunteer"}))
+    names = await _names_for(db, list(delegate_by_code.values()) + [v.get("user_id") for v in roster_docs])
 
     memberships = []
     for vol_doc in vol_docs:
-        if not vol_doc.get("delegate_org_code"):
-            # Skip non-org (task-only) memberships so they don't appear in "My Groups"
-            continue
-        code = vol_doc.get("delegate_org_code")
-        event_id = vol_doc.get("event_id")
-        organization = vol_doc.get("organization")
-        delegate_doc = db["event_volunteers"].find_one({"delegate_org_code": code, "role": "delegate"})
-
-        volunteers = list(db["event_volunteers"].find({
-            "delegate_org_code": code,
-            "role": "volunteer"
-        }))
-        volunteer_count = len(volunteers)
-        for v in volunteers:
-            v["_id"] = str(v.get("_id", ""))
-
+        code = vol_doc["delegate_org_code"]
+        delegate_email = delegate_by_code.get(code)
+        volunteers = rosters[code]
         memberships.append({
-            "organization": organization,
+            "organization": vol_doc.get("organization"),
             "delegate_org_code": code,
-            "event_id": event_id,
-            "delegate_email": delegate_doc.get("user_id") if delegate_doc else None,
-            "delegate_name": _name_for(delegate_doc.get("user_id") if delegate_doc else None),
-            "volunteer_count": volunteer_count,
+            "event_id": vol_doc.get("event_id"),
+            "delegate_email": delegate_email,
+            "delegate_name": names.get(delegate_email, "") if delegate_email else "",
+            "volunteer_count": len(volunteers),
             "volunteers": [
                 {
                     "email": v.get("user_id"),
-                    "name": _name_for(v.get("user_id")),
+                    "name": names.get(v.get("user_id"), ""),
                     "organization": v.get("organization"),
                 }
                 for v in volunteers
@@ -742,103 +881,67 @@ class VolunteerLeavePayload(BaseModel):
     event_id: Optional[str] = None
 
 @app.post("/delegate/volunteer/remove")
-def remove_volunteer(payload: RemoveVolunteer, current_user=Depends(get_current_user)):
+async def remove_volunteer(payload: RemoveVolunteer, current_user=Depends(get_verified_user)):
     """Allow a delegate to remove a volunteer from their org."""
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
-    delegate_doc = db["event_volunteers"].find_one({"user_id": email, "role": "delegate"})
-    if not delegate_doc:
-        raise HTTPException(status_code=403, detail="Not a delegate")
-    code = delegate_doc.get("delegate_org_code")
-    vol_doc = db["event_volunteers"].find_one({"delegate_org_code": code, "role": "volunteer", "user_id": payload.volunteer_email})
-    if not vol_doc:
-        raise HTTPException(status_code=404, detail="Volunteer not found in your org")
-    event_id = vol_doc.get("event_id")
-    db["event_volunteers"].delete_one({"_id": vol_doc["_id"]})
-    if event_id:
-        db["task_assignments"].delete_many({"event_id": event_id, "user_id": payload.volunteer_email})
+    try:
+        removed = await cascade.remove_volunteer(db, email, payload.volunteer_email)
+    except cascade.Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await touch_events(db, removed["event_id"])
     return {"ok": True}
 
 @app.post("/volunteer/leave")
-def volunteer_leave(payload: VolunteerLeavePayload, current_user=Depends(get_current_user)):
+async def volunteer_leave(payload: VolunteerLeavePayload, current_user=Depends(get_current_user)):
     """Volunteer leaves a specific org (or first if none specified); removes membership and task assignments."""
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
-    query = {"user_id": email, "role": "volunteer"}
-    if payload.delegate_org_code:
-        query["delegate_org_code"] = payload.delegate_org_code
-    if payload.event_id:
-        query["event_id"] = payload.event_id
-
-    vols = list(db["event_volunteers"].find(query))
-    if not vols:
-        raise HTTPException(status_code=404, detail="Not a volunteer in that org")
-
-    codes = [v.get("delegate_org_code") for v in vols if v.get("delegate_org_code")]
-    event_ids = [v.get("event_id") for v in vols if v.get("event_id")]
-
-    db["event_volunteers"].delete_many(query)
-
-    for ev in event_ids:
-        if ev:
-            db["task_assignments"].delete_many({"event_id": ev, "user_id": email})
-
-    return {"ok": True, "delegate_org_codes": codes}
+    try:
+        left = await cascade.volunteer_leave(db, email, payload.delegate_org_code, payload.event_id)
+    except cascade.Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await touch_events(db, *left["event_ids"])
+    return {"ok": True, "delegate_org_codes": left["delegate_org_codes"]}
 
 
 @app.post("/delegate/leave")
-def delegate_leave(current_user=Depends(get_current_user)):
+async def delegate_leave(current_user=Depends(get_current_user)):
     """Allow a delegate to detach their org from an event and clear related assignments."""
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
 
-    delegate_doc = db["event_volunteers"].find_one({"user_id": email, "role": "delegate"})
-    if not delegate_doc:
-        raise HTTPException(status_code=404, detail="Delegate not found")
-
-    event_id = delegate_doc.get("event_id")
-    delegate_org_code = delegate_doc.get("delegate_org_code")
-
-    # Detach the delegate from the event while keeping their org code
-    db["event_volunteers"].update_one({"_id": delegate_doc["_id"]}, {"$set": {"event_id": None}})
-
-    # Detach all volunteers in the same org
-    volunteers = list(db["event_volunteers"].find({"delegate_org_code": delegate_org_code, "role": "volunteer"}))
-    if volunteers:
-        db["event_volunteers"].update_many(
-            {"delegate_org_code": delegate_org_code, "role": "volunteer"},
-            {"$set": {"event_id": None}},
-        )
-
-    # Remove task assignments for this org tied to the event
-    if event_id:
-        user_ids = [email] + [v.get("user_id") for v in volunteers if v.get("user_id")]
-        db["task_assignments"].delete_many({"event_id": event_id, "user_id": {"$in": user_ids}})
-
-    return {"ok": True, "delegate_org_code": delegate_org_code, "event_id": event_id}
+    try:
+        left = await cascade.delegate_leave(db, email)
+    except cascade.Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await touch_events(db, left["event_id"])
+    return {"ok": True, "delegate_org_code": left["delegate_org_code"], "event_id": left["event_id"]}
 
 
 # --------------- Task APIs ----------------
 @app.post('/events/{event_id}/tasks', response_model=TaskOut)
-def create_task(event_id: str, task: TaskCreate, current_user=Depends(get_current_user)):
+async def create_task(event_id: str, task: TaskCreate, current_user=Depends(get_current_user)):
     db = app.db
     task_dump = task.model_dump()
     task_dump['event_id'] = event_id
     task_dump['created_by'] = getattr(current_user, 'email', None)
     task_dump['organizer_contact_info'] = task_dump.get('organizer_contact_info') or getattr(current_user, 'email', None) or ""
-    task_dump['task_join_code'] = _generate_unique_task_code(db)  # unique code per task
+    task_dump['_id'] = ObjectId()
+    task_dump['task_join_code'] = await join_codes.allocate_join_code(db, join_codes.TASK, str(task_dump['_id']))  # unique code per task
     task_dump['created_at'] = datetime.utcnow()
     task_dump['updated_at'] = datetime.utcnow()
+    task_dump['volunteer_count'] = 0
 
     assigned_delegate = task_dump.get('assigned_delegate')
     if assigned_delegate:
-        delegate_doc = db['event_volunteers'].find_one({
+        delegate_doc = await db['event_volunteers'].find_one({
             "event_id": event_id,
             "user_id": assigned_delegate,
             "role": "delegate",
@@ -847,44 +950,118 @@ def create_task(event_id: str, task: TaskCreate, current_user=Depends(get_curren
             task_dump['assigned_delegate_org_code'] = delegate_doc.get("delegate_org_code")
             task_dump['assigned_delegate_org'] = delegate_doc.get("organization")
 
-    result = db['event_tasks'].insert_one(task_dump)
+    result = await db['event_tasks'].insert_one(task_dump)
     task_id_str = str(result.inserted_id)
 
-    # Ensure the assigned delegate is also in task_assignments
+    # Ensure the assigned delegate and their org's volunteers are in task_assignments
     if assigned_delegate:
-        existing_delegate_assignment = db["task_assignments"].find_one({
-            "activity_id": task_id_str,
-            "user_id": assigned_delegate,
-        })
-        if not existing_delegate_assignment:
-            db["task_assignments"].insert_one({
-                "event_id": event_id,
-                "activity_id": task_id_str,
-                "user_id": assigned_delegate,
-                "assigned_by": getattr(current_user, "email", None) or "",
-                "assigned_at": datetime.utcnow(),
-            })
-        if delegate_doc:
-            _auto_assign_volunteers_for_delegate(db, event_id, result.inserted_id, delegate_doc, getattr(current_user, "email", None) or "")
+        user_ids = [assigned_delegate] + await _org_volunteer_ids(db, event_id, delegate_doc)
+        assigned = await assign_users_to_task(db, task_dump, user_ids, getattr(current_user, "email", None) or "")
+        task_dump['volunteer_count'] = assigned.inserted
 
+    await touch_events(db, event_id)
     task_dump['id'] = task_id_str
-    task_dump['volunteer_count'] = db['task_assignments'].count_documents({"activity_id": task_id_str})
+    live.publish_event(
+        event_id, 'task.created', task_id=task_id_str, name=task_dump.get('name'),
+        volunteer_count=task_dump['volunteer_count'], assigned_delegate=assigned_delegate,
+    )
     return TaskOut(**task_dump)
 
 
 @app.get('/events/{event_id}/tasks', response_model=List[TaskOut])
-def get_tasks_for_event(event_id: str):
+async def get_tasks_for_event(
+    event_id: str,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    fields: Fieldset = Depends(fieldset(TaskOut)),
+):
+    db = app.db
+    try:
+        event = await db['events'].find_one({'_id': ObjectId(event_id)}, {'version': 1, 'updated_at': 1})
+    except Exception:
+        event = None
+    # Task writes bump the event's version, so it stands in for the task list
+    etag = make_etag('tasks', event_id, event_stamp(event), page.limit, page.after, sorted(fields or ()))
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
+    # volunteer_count is maintained on the task document itself, so the
+    # listing is a single query.
+    proj = projection(fields, renames={'id': '_id'}, always=('_id',))
+    tasks, next_cursor = await find_page(db['event_tasks'], {'event_id': event_id}, ID_ASC, page, proj)
+    set_next_cursor(response, next_cursor)
+    for t in tasks:
+        t['id'] = str(t['_id'])
+    return fast_list_response(trusted_rows(TaskOut, tasks, fields), response)
+
+
+@app.get('/events/{event_id}/tasks/near', response_model=List[NearbyTaskOut])
+async def tasks_near(
+    event_id: str,
+    response: Response,
+    lng: float = Query(ge=-180, le=180),
+    lat: float = Query(ge=-90, le=90),
+    radius_m: float = Query(default=2000, gt=0, le=settings.GEO_MAX_RADIUS_M),
+    window_start: Optional[datetime] = None,
+    window_end: Optional[datetime] = None,
+    page: PageParams = Depends(page_params),
+):
+    """The event's tasks within `radius_m` of (lng, lat), nearest first."""
     db = app.db
-    tasks = list(db['event_tasks'].find({'event_id': event_id}))
+    query = {'event_id': event_id, **overlap_filter('start_time', 'end_time', window_start, window_end)}
+    tasks = await db['event_tasks'].aggregate(near_pipeline(lng, lat, radius_m, query, page)).to_list(None)
+    tasks, next_cursor = page_from(tasks, NEAREST_FIRST, page.limit)
+    set_next_cursor(response, next_cursor)
     for t in tasks:
         t['id'] = str(t['_id'])
-        count = db['task_assignments'].count_documents({"activity_id": t['id']})
-        t['volunteer_count'] = count
-    return [TaskOut(**t) for t in tasks]
+    return fast_list_response(trusted_rows(NearbyTaskOut, tasks), response)
+
+
+# --------------- Map APIs ----------------
+@app.get('/map/clusters')
+async def map_clusters(
+    bbox: str,
+    zoom: int = Query(ge=0, le=22),
+    layer: str = 'events',
+    event_id: Optional[str] = None,
+    current_user=Depends(get_verified_user),
+):
+    """Grid clusters (count + centroid) of event or task pins inside `bbox` (min_lng,min_lat,max_lng,max_lat).
+
+    `layer=events` covers the caller's own events (every event for admins);
+    `layer=tasks` covers one event's tasks and needs `event_id`.
+    """
+    db = app.db
+    try:
+        box = clusters.parse_bbox(bbox)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid bbox')
+
+    if layer == 'events':
+        email = getattr(current_user, 'email', None)
+        if getattr(current_user, 'admin', False):
+            collection, scope, scope_key = 'events', {}, 'all'
+        else:
+            collection, scope, scope_key = 'events', {'created_by': email}, ('created_by', email)
+    elif layer == 'tasks':
+        if not event_id:
+            raise HTTPException(status_code=400, detail='event_id is required for the tasks layer')
+        collection, scope, scope_key = 'event_tasks', {'event_id': event_id}, ('event', event_id)
+    else:
+        raise HTTPException(status_code=400, detail='Invalid layer')
+
+    try:
+        return await clusters.clusters_for(db, collection, scope, scope_key, box, zoom)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OperationFailure as e:
+        # A bbox the server can't turn into a valid geo query
+        raise HTTPException(status_code=400, detail=f'Invalid bbox: {e}')
 
 
 @app.patch("/events/{event_id}/tasks/{task_id}", response_model=TaskOut)
-def update_task(
+async def update_task(
     event_id: str,
     task_id: str,
     task_in: TaskCreate,
@@ -900,27 +1077,32 @@ def update_task(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task_id")
 
-    task = db["event_tasks"].find_one({"_id": oid, "event_id": event_id})
+    task = await db["event_tasks"].find_one({"_id": oid, "event_id": event_id})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
     update_data = task_in.model_dump(exclude_unset=True)
     if update_data:
-        db["event_tasks"].update_one({"_id": oid}, {"$set": update_data})
+        await db["event_tasks"].update_one({"_id": oid}, {"$set": update_data})
 
-    updated_task = db["event_tasks"].find_one({"_id": oid})
-    updated_task["task_id"] = str(updated_task["_id"])
-    updated_task["id"] = str(updated_task["_id"])
     # If a delegate was added/changed, sync volunteer assignments
     if update_data.get("assigned_delegate"):
-        delegate_doc = db["event_volunteers"].find_one({
+        delegate_doc = await db["event_volunteers"].find_one({
             "event_id": event_id,
             "user_id": update_data["assigned_delegate"],
             "role": "delegate"
         })
         if delegate_doc:
-            _auto_assign_volunteers_for_delegate(db, event_id, oid, delegate_doc, getattr(current_user, "email", None) or "")
-    updated_task["volunteer_count"] = db["task_assignments"].count_documents({"activity_id": str(updated_task["_id"])})
+            await assign_users_to_task(db, task, await _org_volunteer_ids(db, event_id, delegate_doc), getattr(current_user, "email", None) or "")
+
+    await touch_events(db, event_id)
+    updated_task = await db["event_tasks"].find_one({"_id": oid})
+    updated_task["task_id"] = str(updated_task["_id"])
+    updated_task["id"] = str(updated_task["_id"])
+    live.publish_event(
+        event_id, 'task.updated', task_id=task_id, changes=update_data,
+        volunteer_count=updated_task.get("volunteer_count", 0),
+    )
     return TaskOut(**updated_task)
 
 class DelegateRequest(BaseModel):
@@ -928,82 +1110,55 @@ class DelegateRequest(BaseModel):
 
 # Api for adding a delegate to a task
 @app.patch("/events/{event_id}/tasks/{task_id}/assign", response_model = TaskOut)
-def assign_delegate(event_id: str, task_id: str, request: DelegateRequest, current_user = Depends(get_current_user)):
+async def assign_delegate(event_id: str, task_id: str, request: DelegateRequest, current_user = Depends(get_current_user)):
     db = app.db
     try:
         oid = ObjectId(task_id)
     except:
         raise HTTPException(status_code=400, detail="Invalid task id")
 
-    task = db['event_tasks'].find_one({"_id":oid, 'event_id':event_id})
+    task = await db['event_tasks'].find_one({"_id":oid, 'event_id':event_id})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    delegate_doc = db['event_volunteers'].find_one({
+    delegate_doc = await db['event_volunteers'].find_one({
         "event_id": event_id,
         "user_id": request.assigned_delegate,
         "role": "delegate"
     })
+    # The delegate plus every volunteer who joined via their org. Capacity is
+    # checked against this set before anything is written.
+    user_ids = [request.assigned_delegate] + await _org_volunteer_ids(db, event_id, delegate_doc)
+    try:
+        await assign_users_to_task(
+            db, task, user_ids,
+            getattr(current_user, "email", None) or (delegate_doc or {}).get("user_id", ""),
+            enforce_capacity=True,
+        )
+    except CapacityExceeded:
+        raise HTTPException(status_code=400, detail="Assigning this delegate would exceed the max volunteers for this task")
+
     update_set = {'assigned_delegate': request.assigned_delegate}
     if delegate_doc:
         update_set['assigned_delegate_org_code'] = delegate_doc.get("delegate_org_code")
         update_set['assigned_delegate_org'] = delegate_doc.get("organization")
 
-    db['event_tasks'].update_one({'_id': oid}, {'$set': update_set})
-
-    now = datetime.utcnow()
-    existing_delegate_assignment = db["task_assignments"].find_one({
-        "activity_id": str(oid),
-        "user_id": request.assigned_delegate,
-    })
-    if not existing_delegate_assignment:
-        db["task_assignments"].insert_one({
-            "event_id": event_id,
-            "activity_id": str(oid),
-            "user_id": request.assigned_delegate,
-            "assigned_by": getattr(current_user, "email", None) or "",
-            "assigned_at": now,
-        })
+    await db['event_tasks'].update_one({'_id': oid}, {'$set': update_set})
+    await touch_events(db, event_id)
 
-    updated_task = db['event_tasks'].find_one({'_id': oid})
+    updated_task = await db['event_tasks'].find_one({'_id': oid})
     updated_task['task_id'] = str(updated_task['_id'])
     updated_task['id'] = str(updated_task['_id'])
-
-    # Auto-assign volunteers who joined via this delegate/org to this task
-    if delegate_doc and delegate_doc.get("delegate_org_code"):
-        code = delegate_doc["delegate_org_code"]
-        volunteers = list(db['event_volunteers'].find({
-            "event_id": event_id,
-            "role": "volunteer",
-            "delegate_org_code": code
-        }))
-        now = datetime.utcnow()
-        for vol in volunteers:
-            if not vol.get("user_id"):
-                continue
-            existing_assignment = db["task_assignments"].find_one({
-                "activity_id": str(oid),
-                "user_id": vol["user_id"],
-            })
-            if not existing_assignment:
-                db["task_assignments"].insert_one({
-                    "event_id": event_id,
-                    "activity_id": str(oid),
-                    "user_id": vol["user_id"],
-                    "assigned_by": getattr(current_user, "email", None) or delegate_doc.get("user_id", ""),
-                    "assigned_at": now,
-                })
-
-    # Capacity check
-    new_count = db['task_assignments'].count_documents({"activity_id": str(updated_task["_id"])})
-    if updated_task.get("max_volunteers") and new_count > updated_task["max_volunteers"]:
-        raise HTTPException(status_code=400, detail="Assigning this delegate would exceed the max volunteers for this task")
-    updated_task['volunteer_count'] = new_count
+    live.publish_event(
+        event_id, 'task.assigned', task_id=task_id, assigned_delegate=request.assigned_delegate,
+        assigned_delegate_org=update_set.get('assigned_delegate_org'),
+        volunteer_count=updated_task.get('volunteer_count', 0),
+    )
     return TaskOut(**updated_task)
 
 
 @app.patch("/events/{event_id}/tasks/{task_id}/unassign", response_model=TaskOut)
-def unassign_delegate(event_id: str, task_id: str, current_user = Depends(get_current_user)):
+async def unassign_delegate(event_id: str, task_id: str, current_user = Depends(get_current_user)):
     """Clear the assigned delegate from a task and remove that delegate's org volunteers from the task."""
     db = app.db
     try:
@@ -1011,14 +1166,14 @@ def unassign_delegate(event_id: str, task_id: str, current_user = Depends(get_cu
     except:
         raise HTTPException(status_code=400, detail="Invalid task id")
 
-    task = db["event_tasks"].find_one({"_id": oid, "event_id": event_id})
+    task = await db["event_tasks"].find_one({"_id": oid, "event_id": event_id})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
     assigned_delegate = task.get("assigned_delegate")
     assigned_org_code = task.get("assigned_delegate_org_code")
 
-    db["event_tasks"].update_one(
+    await db["event_tasks"].update_one(
         {"_id": oid},
         {"$unset": {"assigned_delegate": "", "assigned_delegate_org_code": "", "assigned_delegate_org": ""}}
     )
@@ -1028,40 +1183,41 @@ def unassign_delegate(event_id: str, task_id: str, current_user = Depends(get_cu
     if assigned_delegate:
         users_to_remove.append(assigned_delegate)
     if assigned_org_code:
-        org_vols = list(db["event_volunteers"].find({
+        org_vols = await db["event_volunteers"].find({
             "event_id": event_id,
             "role": "volunteer",
             "delegate_org_code": assigned_org_code
-        }))
+        }).to_list(None)
         users_to_remove.extend([v.get("user_id") for v in org_vols if v.get("user_id")])
     if users_to_remove:
-        db["task_assignments"].delete_many({
+        await delete_assignments(db, {
             "activity_id": str(oid),
             "user_id": {"$in": users_to_remove}
         })
 
-    updated_task = db["event_tasks"].find_one({"_id": oid})
+    await touch_events(db, event_id)
+    updated_task = await db["event_tasks"].find_one({"_id": oid})
     updated_task["task_id"] = str(updated_task["_id"])
     updated_task["id"] = str(updated_task["_id"])
-    updated_task["volunteer_count"] = db["task_assignments"].count_documents({"activity_id": str(updated_task["_id"])})
+    live.publish_event(event_id, 'task.unassigned', task_id=task_id, volunteer_count=updated_task.get("volunteer_count", 0))
     return TaskOut(**updated_task)
 
 @app.post("/tasks/join/{task_code}", response_model=TaskOut)
-def join_task(task_code: str, current_user=Depends(get_current_user)):
+async def join_task(task_code: str, current_user=Depends(get_current_user)):
     db = app.db
     code = task_code.strip().upper()
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
 
-    task = db["event_tasks"].find_one({"task_join_code": code})
+    task = await join_codes.find_by_join_code(db, code, join_codes.TASK, "event_tasks", {"task_join_code": code})
     if not task:
         raise HTTPException(status_code=404, detail="Invalid task join code")
 
     task_id_str = str(task["_id"])
     event_id = task["event_id"]
 
-    existing_assignment = db["task_assignments"].find_one({
+    existing_assignment = await db["task_assignments"].find_one({
         "activity_id": task_id_str,
         "user_id": email
     })
@@ -1071,69 +1227,62 @@ def join_task(task_code: str, current_user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Already joined this task")
 
     # Add event membership if not present, but without tying to any org
-    existing_event_member = db["event_volunteers"].find_one({
+    existing_event_member = await db["event_volunteers"].find_one({
         "event_id": event_id,
         "user_id": email
     })
     if not existing_event_member:
-        db["event_volunteers"].insert_one({
+        await db["event_volunteers"].insert_one({
             "event_id": event_id,
             "user_id": email,
             "role": "volunteer",
             "joined_at": datetime.utcnow(),
         })
     elif existing_event_member.get("role") != "volunteer":
-        db["event_volunteers"].update_one(
+        await db["event_volunteers"].update_one(
             {"_id": existing_event_member["_id"]},
             {"$set": {"role": "volunteer"}}
         )
 
-    db["task_assignments"].insert_one({
+    new_count = await insert_assignment(db, {
         "event_id": event_id,
         "activity_id": task_id_str,
         "user_id": email,
         "assigned_by": task.get("assigned_delegate", ""),
         "assigned_at": datetime.utcnow()
     })
+    if new_count is None:
+        raise HTTPException(status_code=400, detail="Already joined this task")
+    await touch_events(db, event_id)
 
     task["id"] = task_id_str
-    task["volunteer_count"] = db["task_assignments"].count_documents({"activity_id": task_id_str})
+    task["volunteer_count"] = new_count
+    live.publish_event(event_id, 'task.count', task_id=task_id_str, volunteer_count=new_count)
     return TaskOut(**task)
 
 class LeaveTaskIn(BaseModel):
     task_id: str
 
 @app.post("/tasks/leave")
-def leave_task(payload: LeaveTaskIn, current_user=Depends(get_current_user)):
+async def leave_task(payload: LeaveTaskIn, current_user=Depends(get_current_user)):
     db = app.db
     email = getattr(current_user, "email", None)
     if not email:
         raise HTTPException(status_code=500, detail="Missing user email")
-    try:
-        oid = ObjectId(payload.task_id)
-    except Exception:
+    if not ObjectId.is_valid(payload.task_id):
         raise HTTPException(status_code=400, detail="Invalid task id")
-    task = db["event_tasks"].find_one({"_id": oid})
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    assignment = db["task_assignments"].find_one({"activity_id": payload.task_id, "user_id": email})
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Not assigned to this task")
-
-    # remove the task assignment
-    db["task_assignments"].delete_one({"_id": assignment["_id"]})
-
-    # remove all volunteer memberships for this user/event (leave event entirely)
-    event_id = task.get("event_id")
-    if event_id:
-        db["event_volunteers"].delete_many({
-            "event_id": event_id,
-            "user_id": email,
-            "role": "volunteer",
-        })
-        db["task_assignments"].delete_many({"event_id": event_id, "user_id": email})
-
+    # Leaving a task leaves its event entirely: memberships and every assignment there
+    try:
+        left = await cascade.leave_task(db, email, payload.task_id)
+    except cascade.Rejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    event_id = left["event_id"]
+
+    await touch_events(db, event_id)
+    if live.watching_event(event_id):
+        oids = [ObjectId(t) for t in left["affected_tasks"] if ObjectId.is_valid(t)]
+        async for t in db["event_tasks"].find({"_id": {"$in": oids}}, {"volunteer_count": 1}):
+            live.publish_event(event_id, 'task.count', task_id=str(t["_id"]), volunteer_count=t.get("volunteer_count", 0))
     return {"ok": True, "task_id": payload.task_id, "event_id": event_id}
 
 # ------------- Notification APIs -------------
@@ -1143,11 +1292,11 @@ class ResetRequest(BaseModel):
 
 
 @app.post('/request-reset')
-def request_password_reset(payload: ResetRequest, request: Request):
+async def request_password_reset(payload: ResetRequest, request: Request):
     """Generate a one-time reset token and store its hash+expiry on the user doc."""
     db = request.app.db
     email = payload.email
-    user = db['users'].find_one({'email': email})
+    user = await db['users'].find_one({'email': email})
     if not user:
         raise HTTPException(status_code=404, detail='No account found with that email address. Please check your email or sign up for a new account.')
 
@@ -1158,10 +1307,12 @@ def request_password_reset(payload: ResetRequest, request: Request):
     token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
     expires = datetime.utcnow() + timedelta(hours=1)
 
-    db['users'].update_one({'email': email}, {'$set': {'reset_token_hash': token_hash, 'reset_token_expires': expires}})
+    await db['users'].update_one({'email': email}, {'$set': {'reset_token_hash': token_hash, 'reset_token_expires': expires}})
 
-    sent_ok, err = send_password_reset(email, token)
-    if sent_ok:
+    # Delivery happens in the outbox worker; the request only queues the message
+    err = email_config_error()
+    if err is None:
+        await enqueue_email(db, email, *password_reset_message(token), kind='password_reset')
         return {'ok': True}
     if settings.DEBUG_EMAIL_FALLBACK:
         return {'ok': True, 'token': token, 'email_error': err}
@@ -1176,13 +1327,13 @@ class ResetIn(BaseModel):
 
 
 @app.post('/reset')
-def reset_password(payload: ResetIn, request: Request):
+async def reset_password(payload: ResetIn, request: Request):
     db = request.app.db
     import hashlib
     from datetime import datetime
 
     token_hash = hashlib.sha256(payload.token.encode('utf-8')).hexdigest()
-    user = db['users'].find_one({'reset_token_hash': token_hash})
+    user = await db['users'].find_one({'reset_token_hash': token_hash})
     if not user:
         raise HTTPException(status_code=400, detail='Invalid or expired token')
     expires = user.get('reset_token_expires')
@@ -1191,44 +1342,41 @@ def reset_password(payload: ResetIn, request: Request):
 
     # Hash new password and update
     from app.users import get_password_hash
-    new_hashed = get_password_hash(payload.new_password)
-    db['users'].update_one({'_id': user['_id']}, {'$set': {'hashed_password': new_hashed}, '$unset': {'reset_token_hash': '', 'reset_token_expires': ''}})
+    new_hashed = await get_password_hash(payload.new_password)
+    # Bumping token_version revokes every access token issued before the reset
+    await db['users'].update_one(
+        {'_id': user['_id']},
+        {'$set': {'hashed_password': new_hashed}, '$unset': {'reset_token_hash': '', 'reset_token_expires': ''}, '$inc': {'token_version': 1}},
+    )
+    invalidate_token_state(user['email'])
     return {'ok': True}
 
 @app.get("/geocode")
-def geocode(address: str):
+async def geocode(address: str):
     """
     Proxy to Google Geocoding API so the mobile app never sees the real key.
+    Answers are cached per normalized address (see app/geocoding.py).
     """
     if not settings.GOOGLE_MAPS_API_KEY:
         raise HTTPException(status_code=500, detail="Geocoding not configured")
 
     try:
-        resp = requests.get(
-            "https://maps.googleapis.com/maps/api/geocode/json",
-            params={"address": address, "key": settings.GOOGLE_MAPS_API_KEY},
-            timeout=10,
-        )
-    except Exception:
+        result = await geocoder.lookup(app.db, address)
+    except GeocodingUnavailable:
         raise HTTPException(status_code=502, detail="Error contacting geocoding service")
-
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail="Bad response from geocoding service")
-
-    data = resp.json()
-    status_val = data.get("status")
-    results = data.get("results", [])
-
-    if status_val != "OK" or not results:
+    except GeocodingFailed:
+        raise HTTPException(status_code=400, detail="Geocoding failed")
+    if result is None:
         raise HTTPException(status_code=400, detail="Geocoding failed")
+    return result
 
-    first = results[0]
-    loc = first["geometry"]["location"]
-    return {
-        "formatted_address": first["formatted_address"],
-        "lat": loc["lat"],
-        "lng": loc["lng"],
-    }
+
+@app.get("/geocode/stats")
+async def geocode_stats(current_user=Depends(get_verified_user)):
+    """Cache hit/miss and upstream counters for this worker (admin only)."""
+    if not current_user.admin:
+        raise HTTPException(status_code=401, detail='User does not have admin privileges')
+    return geocoder.stats()
 
 
 #@app.post('/login')
@@ -1272,42 +1420,34 @@ class NotificationOut(BaseModel):
         is_private=doc.get('is_private', False)
     )'''
 
-def _create_notifications(db, event_doc: Dict, changed_fields: Dict):
+# Event fields whose changes are announced to participants, with their wording
+_NOTIFY_FIELDS = {
+    'name': 'name',
+    'start_date': 'start time',
+    'end_date': 'end time',
+    'location_name': 'location',
+    'description': 'description',
+}
+
+def _notification_value(value) -> str:
+    return value.strftime('%Y-%m-%d %H:%M') if isinstance(value, datetime) else str(value or '')
+
+async def _create_notifications(db, event_doc: Dict, changed_fields: Dict):
+    """Tell the event's volunteers and delegates what changed (see app/notifications.py)."""
     if not changed_fields:
         return
-    # recipients: only registered users (volunteers + attendees)
-    recipients = set(event_doc.get('volunteers', [])) | set(event_doc.get('attendees', []))
-    if not recipients:
-        return
-    human_map = {
-        'title': 'title',
-        'time': 'time',
-        'address': 'address',
-        'description': 'description',
-        'is_private': 'privacy setting'
-    }
+    title = event_doc.get('name', '')
     msgs = []
     for field, info in changed_fields.items():
-        old_val = info['old']
-        new_val = info['new']
-        if field == 'is_private':
-            text = f"Event '{event_doc.get('title','')}' privacy changed: now {'Private' if new_val else 'Public'}"
+        label = _NOTIFY_FIELDS.get(field, field)
+        if field == 'description':
+            msgs.append(f"Event '{title}' description was updated")
         else:
-            text = f"Event '{event_doc.get('title','')}' {human_map.get(field, field)} changed from '{old_val}' to '{new_val}'"
-        msgs.append(text)
-    now = datetime.utcnow()
-    bulk_docs = []
-    for user_email in recipients:
-        for message in msgs:
-            bulk_docs.append({
-                'user_email': user_email,
-                'event_id': event_doc['_id'],
-                'message': message,
-                'created_at': now,
-                'read': False
-            })
-    if bulk_docs:
-        db['notifications'].insert_many(bulk_docs)
+            msgs.append(
+                f"Event '{title}' {label} changed from "
+                f"'{_notification_value(info['old'])}' to '{_notification_value(info['new'])}'"
+            )
+    await notifications.notify_event(db, str(event_doc['_id']), msgs)
 
 # ---------------------- Event Endpoints ----------------------
 '''@app.get('/events/{event_id}', response_model=EventOut)
@@ -1354,64 +1494,182 @@ def update_event(event_id: str, payload: EventUpdate, request: Request, current_
     return _serialize_event(doc)'''
 
 # ---------------------- Notification Endpoints ----------------------
+NOTIFICATION_ORDER = [('created_at', -1), ('_id', -1)]
+
 @app.get('/notifications', response_model=List[NotificationOut])
-def list_notifications(request: Request, current_user=Depends(get_current_user)):
+async def list_notifications(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    current_user=Depends(get_current_user),
+):
     db = request.app.db
-    cursor = db['notifications'].find({'user_email': current_user.email}).sort('created_at', -1)
-    items = []
-    for n in cursor:
-        items.append(NotificationOut(
-            id=str(n['_id']),
-            event_id=str(n.get('event_id')) if n.get('event_id') else None,
-            message=n.get('message',''),
-            created_at=n.get('created_at'),
-            read=n.get('read', False)
-        ))
-    return items
+    query = await notifications.inbox_query(db, current_user.email)
+    docs, next_cursor = await find_page(db['notifications'], query, NOTIFICATION_ORDER, page)
+    set_next_cursor(response, next_cursor)
+    await notifications.apply_read_markers(db, current_user.email, docs)
+    etag = make_etag('notifications', current_user.email, page.limit, page.after, [(str(n['_id']), n.get('read', False)) for n in docs])
+    cached = conditional(request, response, etag)
+    if cached:
+        return cached
+    for n in docs:
+        n['id'] = str(n['_id'])
+        n['event_id'] = str(n['event_id']) if n.get('event_id') else None
+        n.setdefault('message', '')
+    return fast_list_response(trusted_rows(NotificationOut, docs), response)
+
+@app.get('/notifications/live')
+async def notifications_live(request: Request, current_user=Depends(get_current_user)):
+    """Server-Sent Events stream of the caller's new notifications."""
+    # Shared notifications are followed per event, as of when the stream opens
+    event_ids = await notifications.member_event_ids(request.app.db, current_user.email)
+    return _live_response([('user', current_user.email)] + [('audience', eid) for eid in event_ids])
+
+@app.get('/notifications/unread_count')
+async def notifications_unread_count(request: Request, current_user=Depends(get_current_user)):
+    """Badge count, from index-only counts rather than the notification list."""
+    return {'unread': await notifications.unread_count(request.app.db, current_user.email)}
+
+class MarkReadIn(BaseModel):
+    ids: Optional[List[str]] = None
+    before: Optional[datetime] = None  # everything created at or before this time
+
+@app.post('/notifications/read')
+async def mark_notifications_read(payload: MarkReadIn, request: Request, current_user=Depends(get_current_user)):
+    """Mark a set of notifications, or all of them up to `before`, as read."""
+    if (payload.ids is None) == (payload.before is None):
+        raise HTTPException(status_code=400, detail='Pass either ids or before')
+    ids = None
+    if payload.ids is not None:
+        try:
+            ids = [ObjectId(i) for i in payload.ids]
+        except Exception:
+            raise HTTPException(status_code=400, detail='Invalid notification id')
+    marked = await notifications.mark_read(request.app.db, current_user.email, ids=ids, before=payload.before)
+    return {'ok': True, 'marked': marked}
 
 @app.post('/notifications/{notification_id}/read')
-def mark_notification_read(notification_id: str, request: Request, current_user=Depends(get_current_user)):
+async def mark_notification_read(notification_id: str, request: Request, current_user=Depends(get_current_user)):
     db = request.app.db
     try:
         oid = ObjectId(notification_id)
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid notification id')
-    doc = db['notifications'].find_one({'_id': oid})
-    if not doc or doc.get('user_email') != current_user.email:
+    if not await notifications.mark_one_read(db, current_user.email, oid):
         raise HTTPException(status_code=404, detail='Notification not found')
-    db['notifications'].update_one({'_id': oid}, {'$set': {'read': True}})
     return {'ok': True}
 
 
+# ---------------------- Broadcast Endpoints ----------------------
+def _broadcast_out(doc: Dict) -> BroadcastOut:
+    return BroadcastOut.model_validate({**doc, 'id': str(doc['_id'])})
+
+@app.post('/events/{event_id}/broadcasts', response_model=BroadcastOut, status_code=202)
+async def create_broadcast(
+    event_id: str,
+    payload: BroadcastIn,
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_verified_user),
+):
+    """Email an event's participants. Returns at once; poll GET /broadcasts/{id} for progress.
+
+    The organizer (or an admin) can reach everyone, one role, or one task's
+    volunteers; a delegate can reach the volunteers of their own org.
+    """
+    db = app.db
+    email = getattr(current_user, "email", None)
+    try:
+        oid = ObjectId(event_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid event id")
+
+    event, delegate_doc = await asyncio.gather(
+        db["events"].find_one({"_id": oid}, {"created_by": 1}),
+        db["event_volunteers"].find_one({"event_id": event_id, "user_id": email, "role": "delegate"}, {"delegate_org_code": 1}),
+    )
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    delegate_org_code = None
+    if event.get("created_by") == email or getattr(current_user, "admin", False):
+        if payload.task_id:
+            try:
+                task_oid = ObjectId(payload.task_id)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid task id")
+            if not await db["event_tasks"].find_one({"_id": task_oid, "event_id": event_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Task not found")
+    elif delegate_doc and delegate_doc.get("delegate_org_code") and payload.audience == "volunteers" and not payload.task_id:
+        delegate_org_code = delegate_doc["delegate_org_code"]
+    else:
+        raise HTTPException(status_code=403, detail="Not allowed to email this audience")
+
+    err = email_config_error()
+    if err:
+        raise HTTPException(status_code=500, detail=err)
+
+    doc = await broadcasts.create_broadcast(
+        db, event_id, email, payload.subject, payload.body, payload.audience,
+        delegate_org_code=delegate_org_code, task_id=payload.task_id,
+    )
+    background_tasks.add_task(broadcasts.queue_broadcast, db, doc["_id"])
+    return _broadcast_out(doc)
+
+@app.get('/broadcasts/{broadcast_id}', response_model=BroadcastOut)
+async def get_broadcast(broadcast_id: str, current_user=Depends(get_verified_user)):
+    db = app.db
+    try:
+        oid = ObjectId(broadcast_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid broadcast id')
+    doc = await db['broadcasts'].find_one({'_id': oid}, {'body': 0})
+    if not doc or (doc.get('created_by') != current_user.email and not current_user.admin):
+        raise HTTPException(status_code=404, detail='Broadcast not found')
+    return _broadcast_out(doc)
+
+
 # === Dev test endpoint ===
 class DevTestEmailIn(BaseModel):
     to: EmailStr
 
 @app.post("/dev/test-email")
-def dev_test_email(payload: DevTestEmailIn):
-    ok, err = send_email(payload.to, "Test email", "This is a test from /dev/test-email")
-    return {"ok": ok, "error": err}
+async def dev_test_email(payload: DevTestEmailIn):
+    err = email_config_error()
+    if err:
+        return {"ok": False, "error": err}
+    outbox_id = await enqueue_email(app.db, payload.to, "Test email", "This is a test from /dev/test-email", kind='test')
+    return {"ok": True, "error": None, "outbox_id": str(outbox_id)}
+
+@app.post('/admin/notifications/archive')
+async def archive_notifications_now(
+    request: Request,
+    older_than_days: Optional[int] = Query(default=None, ge=0),
+    current_user=Depends(get_verified_user),
+):
+    """Run the notification retention pass now; reports collection and index sizes before and after."""
+    if not current_user.admin:
+        raise HTTPException(status_code=401, detail='User does not have admin privileges')
+    return await retention.run_retention(request.app.db, older_than_days)
 
 # Admin event endpoint: (Added by Ethan Krol)
 @app.get('/admin/events', response_model = List[EventOut])
-def get_admin_events(current_user = Depends(get_current_user)):
+async def get_admin_events(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    fields: Fieldset = Depends(fieldset(EventOut)),
+    current_user = Depends(get_verified_user),
+):
     """List all events for an admin viewer"""
     db = app.db
     email = getattr(current_user, 'email', None)
     if not email:
         raise HTTPException(status_code=500, detail='Missing user email')
-    # We don't need to check the role this time. This will only get called for admin users. But we should still check in db if they have privileges.
-    admin_user = db['users'].find_one({'email': email})
-    user_is_admin = admin_user.get('admin', False)
-    #print(user_is_admin)
-    if not user_is_admin:
+    # We don't need to check the role this time. This will only get called for admin users.
+    # get_verified_user re-reads the admin flag (through its TTL cache) so a stale token can't grant access.
+    if not current_user.admin:
         raise HTTPException(status_code=401, detail='User does not have admin privileges')
     
-    cursor = db['events'].find()
-    results = []
-    for doc in cursor:
-        if doc.get('_id'):
-            doc['_id'] = str(doc['_id'])
-        results.append(EventOut.model_validate(doc))
-    return results
+    docs, next_cursor = await find_page(db['events'], {}, ID_ASC, page, projection(fields, always=('_id',)))
+    set_next_cursor(response, next_cursor)
+    return _event_list_response(docs, fields, response)
 
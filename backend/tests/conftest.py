@@ -0,0 +1,48 @@
+import os
+
+# Settings are read at import time; give the required ones harmless values so
+# the suite runs without a .env (real ones, if present, take precedence)
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '30')
+
+import pytest
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An in-memory Motor-compatible database."""
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    import mongomock.collection
+
+    # pymongo passes `sort` to bulk updates; mongomock's builder predates it
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def _add_update(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, 'add_update', _add_update)
+    monkeypatch.setattr(mongomock.collection.Collection, 'aggregate', _aggregate)
+    return mongomock_motor.AsyncMongoMockClient()['GatorGather']
+
+
+def _aggregate(self, pipeline, session=None, **kwargs):
+    """mongomock's aggregate, plus the `$lookup` form with both localField/foreignField and a
+    `pipeline` (MongoDB 5.0+), which mongomock doesn't implement: each input document gets
+    the results of the sub-pipeline over the foreign rows equal on the join field."""
+    from mongomock import aggregate as mock_aggregate
+
+    docs = list(self.find())
+    stages = []
+    for stage in pipeline:
+        lookup = stage.get('$lookup', {})
+        if 'pipeline' not in lookup or 'localField' not in lookup:
+            stages.append(stage)
+            continue
+        docs = list(mock_aggregate.process_pipeline(docs, self.database, stages, session))
+        stages = []
+        foreign = self.database[lookup['from']]
+        for doc in docs:
+            join = {'$match': {lookup['foreignField']: doc.get(lookup['localField'])}}
+            doc[lookup['as']] = list(_aggregate(foreign, [join] + lookup['pipeline'], session))
+    return mock_aggregate.process_pipeline(docs, self.database, stages, session)
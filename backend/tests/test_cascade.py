@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app import cascade
+
+# Database round trips per flow. They must not grow with the number of
+# volunteers, events or tasks a flow touches.
+ROUND_TRIPS = {
+    'remove_delegate': 5,    # targets, membership delete, count, assignment delete, task bulk_write
+    'delegate_leave': 5,     # targets, detach update, count, assignment delete, task bulk_write
+    'volunteer_leave': 5,    # memberships $group, delete, count, assignment delete, task bulk_write
+    'leave_task': 5,         # task, count, membership delete, assignment delete, task bulk_write
+    'remove_volunteer': 5,   # targets, membership delete, count, assignment delete, task bulk_write
+}
+
+
+class _Counting:
+    """Wraps a database and records every collection method call, one round trip each."""
+
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getitem__(self, name):
+        return _CountingCollection(self, self._db[name], name)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class _CountingCollection:
+    def __init__(self, counter, collection, name):
+        self._counter = counter
+        self._collection = collection
+        self._name = name
+
+    def __getattr__(self, attr):
+        method = getattr(self._collection, attr)
+
+        def counted(*args, **kwargs):
+            self._counter.calls.append(f'{self._name}.{attr}')
+            return method(*args, **kwargs)
+        return counted
+
+
+async def _seed(db, volunteers: int, events: int = 1):
+    """An org ORG1 led by d@example.com with `volunteers` volunteers on each of `events`
+    events, every member assigned to two tasks per event."""
+    event_ids = [str(ObjectId()) for _ in range(events)]
+    members = ['d@example.com'] + [f'v{i}@example.com' for i in range(volunteers)]
+    tasks = []
+    for event_id in event_ids:
+        await db['event_volunteers'].insert_one(
+            {'event_id': event_id, 'user_id': 'd@example.com', 'role': 'delegate', 'delegate_org_code': 'ORG1'}
+        )
+        await db['event_volunteers'].insert_many([
+            {'event_id': event_id, 'user_id': u, 'role': 'volunteer', 'delegate_org_code': 'ORG1'} for u in members[1:]
+        ])
+        for _ in range(2):
+            task = {'_id': ObjectId(), 'event_id': event_id, 'volunteer_count': len(members), 'assigned_delegate': 'd@example.com'}
+            await db['event_tasks'].insert_one(task)
+            tasks.append(str(task['_id']))
+            await db['task_assignments'].insert_many([
+                {'event_id': event_id, 'activity_id': str(task['_id']), 'user_id': u} for u in members
+            ])
+    return event_ids, tasks
+
+
+async def _assert_counts_match_rows(db):
+    async for task in db['event_tasks'].find():
+        rows = await db['task_assignments'].count_documents({'activity_id': str(task['_id'])})
+        assert task['volunteer_count'] == rows
+
+
+def _run(db, flow):
+    counting = _Counting(db)
+
+    async def scenario():
+        result = await flow(counting)
+        await _assert_counts_match_rows(db)
+        return result
+
+    return asyncio.run(scenario()), counting.calls
+
+
+@pytest.fixture(params=[1, 6], ids=['1-volunteer', '6-volunteers'])
+def volunteers(request):
+    return request.param
+
+
+def test_remove_delegate(db, volunteers):
+    event_ids, _ = asyncio.run(_seed(db, volunteers))
+    result, calls = _run(db, lambda d: cascade.remove_delegate(d, event_ids[0], 'd@example.com'))
+
+    assert len(calls) == ROUND_TRIPS['remove_delegate'], calls
+    assert result == {'event_id': event_ids[0], 'removed_volunteers': volunteers}
+    assert asyncio.run(db['event_volunteers'].count_documents({})) == 0
+    assert asyncio.run(db['event_tasks'].count_documents({'assigned_delegate': {'$exists': True}})) == 0
+
+
+def test_delegate_leave(db, volunteers):
+    event_ids, _ = asyncio.run(_seed(db, volunteers))
+    result, calls = _run(db, lambda d: cascade.delegate_leave(d, 'd@example.com'))
+
+    assert len(calls) == ROUND_TRIPS['delegate_leave'], calls
+    assert result == {'event_id': event_ids[0], 'delegate_org_code': 'ORG1'}
+    assert asyncio.run(db['event_volunteers'].count_documents({'event_id': None})) == volunteers + 1
+    assert asyncio.run(db['task_assignments'].count_documents({})) == 0
+
+
+def test_volunteer_leave_across_events(db, volunteers):
+    event_ids, _ = asyncio.run(_seed(db, 1, events=volunteers))
+    result, calls = _run(db, lambda d: cascade.volunteer_leave(d, 'v0@example.com'))
+
+    assert len(calls) == ROUND_TRIPS['volunteer_leave'], calls
+    assert sorted(result['event_ids']) == sorted(event_ids)
+    assert asyncio.run(db['task_assignments'].count_documents({'user_id': 'v0@example.com'})) == 0
+
+
+def test_leave_task(db, volunteers):
+    event_ids, tasks = asyncio.run(_seed(db, volunteers))
+    result, calls = _run(db, lambda d: cascade.leave_task(d, 'v0@example.com', tasks[0]))
+
+    assert len(calls) == ROUND_TRIPS['leave_task'], calls
+    assert result['event_id'] == event_ids[0]
+    assert sorted(result['affected_tasks']) == sorted(tasks)
+    assert asyncio.run(db['event_volunteers'].count_documents({'user_id': 'v0@example.com'})) == 0
+
+
+def test_remove_volunteer(db, volunteers):
+    event_ids, _ = asyncio.run(_seed(db, volunteers))
+    result, calls = _run(db, lambda d: cascade.remove_volunteer(d, 'd@example.com', 'v0@example.com'))
+
+    assert len(calls) == ROUND_TRIPS['remove_volunteer'], calls
+    assert result == {'event_id': event_ids[0]}
+    assert asyncio.run(db['task_assignments'].count_documents({'user_id': 'v0@example.com'})) == 0
+
+
+@pytest.mark.parametrize('flow, status', [
+    (lambda d: cascade.remove_delegate(d, str(ObjectId()), 'd@example.com'), 404),
+    (lambda d: cascade.remove_volunteer(d, 'v0@example.com', 'v1@example.com'), 403),
+    (lambda d: cascade.remove_volunteer(d, 'd@example.com', 'nobody@example.com'), 404),
+    (lambda d: cascade.leave_task(d, 'nobody@example.com', str(ObjectId())), 404),
+])
+def test_rejected_flows_write_nothing(db, flow, status):
+    asyncio.run(_seed(db, 2))
+    with pytest.raises(cascade.Rejected) as rejected:
+        _run(db, flow)
+    assert rejected.value.status_code == status
+
+
+def test_codeless_delegate_is_not_joined_to_codeless_rows(db):
+    async def scenario():
+        await db['event_volunteers'].insert_many([
+            {'event_id': 'e1', 'user_id': 'd@example.com', 'role': 'delegate'},
+            {'event_id': 'e2', 'user_id': 'other@example.com', 'role': 'volunteer'},
+        ])
+        await cascade.delegate_leave(db, 'd@example.com')
+        return await db['event_volunteers'].find_one({'user_id': 'other@example.com'})
+
+    assert asyncio.run(scenario())['event_id'] == 'e2'
@@ -0,0 +1,35 @@
+import pytest
+
+from app import clusters
+
+
+def _ring(bbox, margin):
+    geometry = clusters._box_polygon(bbox, margin)['location']['$geoWithin']['$geometry']
+    return geometry['coordinates'][0]
+
+
+@pytest.mark.parametrize('bbox', [
+    (-82.5, 29.5, -82.0, 30.0),
+    (-180.0, -90.0, 0.0, 90.0),   # touches both poles
+    (0.0, 80.0, 180.0, 90.0),     # touches the antimeridian and the north pole
+    (-170.0, -60.0, 170.0, 60.0), # wider than a hemisphere
+])
+def test_box_polygon_is_a_simple_ring(bbox):
+    ring = _ring(bbox, margin=1.0)
+    assert ring[0] == ring[-1]
+    vertices = [tuple(p) for p in ring[:-1]]
+    assert len(vertices) == len(set(vertices))
+    assert all(abs(lat) < 90 for _, lat in vertices)
+    assert all(-180 <= lng <= 180 for lng, _ in vertices)
+    lngs = sorted({lng for lng, _ in vertices})
+    assert all(b - a <= clusters._EDGE_STEP + 1e-9 for a, b in zip(lngs, lngs[1:]))
+
+
+@pytest.mark.parametrize('bbox, margin', [
+    ((-180.0, -90.0, 180.0, 90.0), 45.0),  # the whole world at zoom 0
+    ((-179.5, 10.0, 179.5, 20.0), 1.0),    # padding reaches all the way round
+])
+def test_full_longitude_span_is_a_latitude_range(bbox, margin):
+    assert clusters._box_polygon(bbox, margin) == {
+        'location.coordinates.1': {'$gte': max(-90.0, bbox[1] - margin), '$lte': min(90.0, bbox[3] + margin)},
+    }
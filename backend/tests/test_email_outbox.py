@@ -0,0 +1,57 @@
+import asyncio
+
+from app import email_outbox
+from app.config import settings
+
+
+class _Transport:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, to, subject, body):
+        if self.fail:
+            raise ConnectionError('refused')
+        self.sent.append((to, subject, body))
+
+
+def test_sent_message_drops_its_body(db):
+    async def scenario():
+        msg_id = await email_outbox.enqueue_email(db, 'a@example.com', 'Reset', 'token=secret')
+        await email_outbox.drain_once(db, _Transport())
+        return await db['email_outbox'].find_one({'_id': msg_id})
+
+    doc = asyncio.run(scenario())
+    assert doc['status'] == email_outbox.SENT
+    assert doc['sent_at']
+    assert 'body' not in doc
+
+
+def test_failed_message_drops_its_body_and_can_expire(db, monkeypatch):
+    monkeypatch.setattr(settings, 'EMAIL_MAX_ATTEMPTS', 1)
+
+    async def scenario():
+        msg_id = await email_outbox.enqueue_email(db, 'a@example.com', 'Reset', 'token=secret')
+        await email_outbox.drain_once(db, _Transport(fail=True))
+        return await db['email_outbox'].find_one({'_id': msg_id})
+
+    doc = asyncio.run(scenario())
+    assert doc['status'] == email_outbox.FAILED
+    assert doc['failed_at']
+    assert 'body' not in doc
+
+
+def test_scrub_finished_cleans_older_rows(db):
+    async def scenario():
+        await db['email_outbox'].insert_many([
+            {**email_outbox.outbox_message('a@example.com', 's', 'b'), 'status': email_outbox.SENT},
+            {**email_outbox.outbox_message('b@example.com', 's', 'b'), 'status': email_outbox.FAILED},
+            email_outbox.outbox_message('c@example.com', 's', 'b'),
+        ])
+        await email_outbox.scrub_finished(db)
+        return {d['to']: d async for d in db['email_outbox'].find()}
+
+    docs = asyncio.run(scenario())
+    assert 'body' not in docs['a@example.com']
+    assert 'body' not in docs['b@example.com'] and docs['b@example.com']['failed_at']
+    assert docs['c@example.com']['body'] == 'b'
@@ -0,0 +1,103 @@
+import socketserver
+import threading
+
+import pytest
+
+from app.config import settings
+from app.email_service import SMTPTransport
+
+
+class _SMTPStub(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that accepts any mail. With `drop_after_message` it hangs up
+    right after acknowledging each message, without a QUIT from the client: 'close'
+    closes the connection silently, '421' first announces it the way servers timing out
+    an idle session do (the client reads that as the reply to its next command)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after_message=None):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.drop_after_message = drop_after_message
+        self.sessions = 0
+        self.messages = []
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.sessions += 1
+        self.reply('220 stub')
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip('\r\n')
+            if data is not None:
+                if line != '.':
+                    data.append(line)
+                    continue
+                self.server.messages.append('\n'.join(data))
+                data = None
+                self.reply('250 queued')
+                if self.server.drop_after_message == '421':
+                    self.reply('421 closing idle session')
+                if self.server.drop_after_message:
+                    return
+                continue
+            verb = line[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb == 'DATA':
+                data = []
+                self.reply('354 go ahead')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp_stub(monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = _SMTPStub(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(settings, 'SMTP_HOST', '127.0.0.1')
+        monkeypatch.setattr(settings, 'SMTP_PORT', server.server_address[1])
+        monkeypatch.setattr(settings, 'SMTP_TLS', False)
+        monkeypatch.setattr(settings, 'SMTP_USER', None)
+        monkeypatch.setattr(settings, 'SMTP_PASS', None)
+        monkeypatch.setattr(settings, 'SMTP_FROM', 'noreply@example.com')
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_session_is_reused_between_messages(smtp_stub):
+    server = smtp_stub()
+    transport = SMTPTransport()
+    transport.send('a@example.com', 'One', 'first')
+    transport.send('b@example.com', 'Two', 'second')
+    transport.close()
+    assert len(server.messages) == 2
+    assert server.sessions == 1
+
+
+@pytest.mark.parametrize('drop', ['close', '421'])
+def test_reconnects_once_after_server_disconnect(smtp_stub, drop):
+    server = smtp_stub(drop_after_message=drop)
+    transport = SMTPTransport()
+    transport.send('a@example.com', 'One', 'first')
+    # The server has hung up; the next send finds a dead socket and reconnects
+    transport.send('b@example.com', 'Two', 'second')
+    transport.close()
+    assert len(server.messages) == 2
+    assert 'Subject: Two' in server.messages[1]
+    assert server.sessions == 2
@@ -0,0 +1,54 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+
+import main
+from app.models import CurrentUser
+
+ADMIN = CurrentUser(email='admin@example.com', admin=True)
+
+
+def _event(**fields):
+    return main.EventUpsert.model_validate({
+        'name': 'Cleanup',
+        'location': {'type': 'Point', 'coordinates': [-82.3, 29.6]},
+        'start_date': '2026-05-01T14:00:00.000Z',
+        'end_date': '2026-05-01T18:00:00.000Z',
+        **fields,
+    })
+
+
+async def _save(event):
+    tasks = BackgroundTasks()
+    out = await main.upsert_event(event, tasks, current_user=ADMIN)
+    await tasks()
+    return out
+
+
+def test_resaving_unchanged_utc_dates_sends_no_notification(db, monkeypatch):
+    monkeypatch.setattr(main.app, 'db', db, raising=False)
+
+    async def scenario():
+        created = await _save(_event())
+        await db['event_volunteers'].insert_one({'user_id': 'v@example.com', 'event_id': created.id, 'role': 'volunteer'})
+        await _save(_event(_id=created.id))
+        stored = await db['events'].find_one({})
+        return stored, await db['notifications'].count_documents({})
+
+    stored, notified = asyncio.run(scenario())
+    assert stored['start_date'].tzinfo is None
+    assert notified == 0
+
+
+def test_changed_date_is_notified(db, monkeypatch):
+    monkeypatch.setattr(main.app, 'db', db, raising=False)
+
+    async def scenario():
+        created = await _save(_event())
+        await db['event_volunteers'].insert_one({'user_id': 'v@example.com', 'event_id': created.id, 'role': 'volunteer'})
+        await _save(_event(_id=created.id, start_date='2026-05-01T15:00:00.000Z'))
+        return await db['notifications'].find({}).to_list(None)
+
+    notes = asyncio.run(scenario())
+    assert len(notes) == 1
+    assert notes[0]['message'] == "Event 'Cleanup' start time changed from '2026-05-01 14:00' to '2026-05-01 15:00'"
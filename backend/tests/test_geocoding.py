@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.config import settings
+from app.geocoding import Geocoder
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    """Stand-in for the geocoding API: answers every address after a short delay."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled connections can be reused
+    calls: list = []
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)['address'][0]
+        self.calls.append((address, self.client_address[1]))
+        time.sleep(0.1)  # long enough for concurrent lookups to overlap
+        if 'nowhere' in address:
+            body = {'status': 'ZERO_RESULTS', 'results': []}
+        else:
+            body = {'status': 'OK', 'results': [
+                {'formatted_address': address.title(), 'geometry': {'location': {'lat': 29.6, 'lng': -82.3}}},
+            ]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    _Upstream.calls = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, 'GEOCODE_URL', f'http://127.0.0.1:{server.server_port}/geocode/json')
+    monkeypatch.setattr(settings, 'GEOCODE_PERSISTENT_CACHE', False)
+    yield _Upstream.calls
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def geocoder():
+    g = Geocoder()
+    yield g
+    g.close()
+
+
+def test_concurrent_identical_lookups_share_one_upstream_call(upstream, geocoder):
+    async def lookups():
+        return await asyncio.gather(*[
+            geocoder.lookup(None, address) for address in ['Reitz Union', ' reitz   UNION', 'reitz union'] * 4
+        ])
+
+    results = asyncio.run(lookups())
+
+    assert len(upstream) == 1
+    assert all(r == results[0] for r in results)
+    assert results[0]['lat'] == 29.6
+    assert geocoder.coalesced == 11
+
+
+def test_repeat_lookup_is_a_cache_hit(upstream, geocoder):
+    async def twice():
+        first = await geocoder.lookup(None, 'Library West')
+        second = await geocoder.lookup(None, 'library  west')
+        return first, second
+
+    first, second = asyncio.run(twice())
+
+    assert first == second
+    assert len(upstream) == 1
+    assert geocoder.upstream_calls == 1
+    assert geocoder.cache.stats()['hits'] >= 1
+
+
+def test_no_results_is_cached(upstream, geocoder):
+    async def twice():
+        return await geocoder.lookup(None, 'nowhere'), await geocoder.lookup(None, 'Nowhere')
+
+    assert asyncio.run(twice()) == (None, None)
+    assert len(upstream) == 1
+
+
+def test_sequential_misses_reuse_the_pooled_connection(upstream, geocoder):
+    async def distinct():
+        for address in ('one', 'two', 'three'):
+            await geocoder.lookup(None, address)
+
+    asyncio.run(distinct())
+
+    assert len(upstream) == 3
+    # one keep-alive connection means one client port on the upstream side
+    assert len({port for _, port in upstream}) == 1
@@ -0,0 +1,34 @@
+import asyncio
+
+from app import join_codes
+
+
+def test_allocation_skips_legacy_codes_before_backfill(db, monkeypatch):
+    monkeypatch.setattr(join_codes, '_ready', False)
+    codes = iter(['LEGACY', 'FRESH1'])
+    monkeypatch.setattr(join_codes, 'generate_join_code', lambda length=6: next(codes))
+
+    async def scenario():
+        await db['events'].insert_one({'name': 'old', 'delegate_join_code': 'LEGACY'})
+        return await join_codes.allocate_join_code(db, join_codes.EVENT, 'new-event')
+
+    assert asyncio.run(scenario()) == 'FRESH1'
+
+
+def test_startup_backfill_registers_legacy_codes_once(db, monkeypatch):
+    monkeypatch.setattr(join_codes, '_ready', False)
+
+    async def scenario():
+        event = await db['events'].insert_one({'name': 'old', 'delegate_join_code': 'LEGACY'})
+        await db['event_volunteers'].insert_one({'role': 'delegate', 'delegate_org_code': 'ORG123'})
+        await join_codes.run_join_code_backfill(db)
+        entry = await join_codes.resolve_join_code(db, 'legacy', join_codes.EVENT)
+        # Later startups see the migration record and skip the scan
+        await db['events'].insert_one({'name': 'unseen', 'delegate_join_code': 'LATER1'})
+        await join_codes.run_join_code_backfill(db)
+        return event.inserted_id, entry, await db['join_codes'].count_documents({})
+
+    event_id, entry, registered = asyncio.run(scenario())
+    assert entry['target_id'] == str(event_id)
+    assert registered == 2
+    assert join_codes._ready
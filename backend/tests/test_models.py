@@ -0,0 +1,19 @@
+import pytest
+from pydantic import ValidationError
+
+from app.models import Location
+
+
+def test_location_accepts_lng_lat():
+    assert Location(coordinates=[-82.3, 29.6]).coordinates == [-82.3, 29.6]
+
+
+@pytest.mark.parametrize('coordinates', [[1], [1, 2, 3], [200, 45], [-181, 0], [0, 95], [0, -90.5]])
+def test_location_rejects_points_the_geo_index_cannot_store(coordinates):
+    with pytest.raises(ValidationError):
+        Location(coordinates=coordinates)
+
+
+def test_location_type_is_point():
+    with pytest.raises(ValidationError):
+        Location(type='LineString', coordinates=[0, 0])
@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime
+
+from app import notifications
+
+
+def _shared(event_id):
+    return {'event_audience': event_id, 'message': 'm', 'created_at': datetime.utcnow()}
+
+
+def test_unread_count_ignores_markers_of_missing_notifications(db):
+    async def scenario():
+        await db['event_volunteers'].insert_one({'user_id': 'v@example.com', 'event_id': 'e1', 'role': 'volunteer'})
+        await db['notifications'].insert_one({'user_email': 'v@example.com', 'read': False, 'message': 'own'})
+        old = await db['notifications'].insert_one(_shared('e1'))
+        await notifications.mark_read(db, 'v@example.com', ids=[old.inserted_id])
+        # The read notification goes away (archived) but its marker is left behind
+        await db['notifications'].delete_one({'_id': old.inserted_id})
+        await db['notifications'].insert_many([_shared('e1'), _shared('e1')])
+        return await notifications.unread_count(db, 'v@example.com')
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_unread_count_subtracts_read_shared_notifications(db):
+    async def scenario():
+        await db['event_volunteers'].insert_one({'user_id': 'v@example.com', 'event_id': 'e1', 'role': 'volunteer'})
+        ids = (await db['notifications'].insert_many([_shared('e1'), _shared('e1')])).inserted_ids
+        await notifications.mark_read(db, 'v@example.com', ids=ids[:1])
+        return await notifications.unread_count(db, 'v@example.com')
+
+    assert asyncio.run(scenario()) == 1
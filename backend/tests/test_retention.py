@@ -0,0 +1,24 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app import notifications, retention
+
+
+def test_archiving_a_shared_notification_removes_its_read_markers(db):
+    old = datetime.utcnow() - timedelta(days=120)
+
+    async def scenario():
+        await db['event_volunteers'].insert_one({'user_id': 'v@example.com', 'event_id': 'e1', 'role': 'volunteer'})
+        archived, kept = (await db['notifications'].insert_many([
+            {'event_audience': 'e1', 'message': 'old', 'created_at': old},
+            {'event_audience': 'e1', 'message': 'new', 'created_at': datetime.utcnow()},
+        ])).inserted_ids
+        await notifications.mark_read(db, 'v@example.com', ids=[archived, kept])
+        moved = await retention.archive_notifications(db, older_than_days=90)
+        markers = [m['notification_id'] async for m in db['notification_reads'].find({}, {'notification_id': 1})]
+        return moved, markers, kept, await notifications.unread_count(db, 'v@example.com')
+
+    moved, markers, kept, unread = asyncio.run(scenario())
+    assert moved == 1
+    assert markers == [kept]
+    assert unread == 0
@@ -12,6 +12,10 @@ import { getCookie } from './cookie';
 
 const EVENT_URL = `${API_BASE_URL}/event`;
 
+// List endpoints return one page per request; the token for the next page
+// comes back in this header (absent on the last page) and is sent as `after`.
+const NEXT_CURSOR_HEADER = 'X-Next-Cursor';
+
 async function authHeaders(extra?: Record<string, string>) {
     const token = await getCookie('auth_token');
     const headers: Record<string, string> = { 'Content-Type': 'application/json', ...(extra ?? {}) };
@@ -19,6 +23,44 @@ async function authHeaders(extra?: Record<string, string>) {
     return headers;
 }
 
+function withAfter(url: string, after: string): string {
+    return `${url}${url.includes('?') ? '&' : '?'}after=${encodeURIComponent(after)}`;
+}
+
+// Follow the continuation tokens of a paginated list endpoint until the last page
+async function fetchAllPages<T>(url: string, headers: Record<string, string>, what: string): Promise<T[]> {
+    const items: T[] = [];
+    let after: string | null = null;
+    do {
+        const res: Response = await fetch(after ? withAfter(url, after) : url, { headers });
+        if (!res.ok) {
+            const text = await res.text();
+            throw new Error(`Failed to load ${what}: ${res.status} ${text}`);
+        }
+        items.push(...((await res.json()) as T[]));
+        after = res.headers.get(NEXT_CURSOR_HEADER);
+    } while (after);
+    return items;
+}
+
+// Event details embed the first page of each roster; load the rest from /events/{id}/roster
+async function fetchRosterRest(eventId: string, role: 'volunteer' | 'delegate', after: string, headers: Record<string, string>): Promise<any[]> {
+    const items: any[] = [];
+    let next: string | null = after;
+    while (next) {
+        const query = new URLSearchParams({ role, after: next });
+        const res = await fetch(`${API_BASE_URL}/events/${eventId}/roster?${query.toString()}`, { headers });
+        if (!res.ok) {
+            const text = await res.text();
+            throw new Error(`Failed to load ${role}s: ${res.status} ${text}`);
+        }
+        const page = await res.json();
+        items.push(...(page.items ?? []));
+        next = page.next_cursor ?? null;
+    }
+    return items;
+}
+
 export async function saveEvent(payload: EventUpsertPayload): Promise<EventResponse> {
     const headers = await authHeaders();
     const res = await fetch(EVENT_URL, {
@@ -35,24 +77,13 @@ export async function saveEvent(payload: EventUpsertPayload): Promise<EventRespo
 
 export async function fetchEvents(role: 'organizer' | 'delegate' | 'volunteer'): Promise<EventResponse[]> {
     const headers = await authHeaders();
-    const url = `${API_BASE_URL}/events?role=${role}`;
-    const res = await fetch(url, { headers });
-    if (!res.ok) {
-        const text = await res.text();
-        throw new Error(`Failed to load events: ${res.status} ${text}`);
-    }
-    return await res.json();
+    return fetchAllPages<EventResponse>(`${API_BASE_URL}/events?role=${role}`, headers, 'events');
 }
 
 // Admin: fetch all events if current user has admin privileges
 export async function fetchAdminEvents(): Promise<EventResponse[]> {
     const headers = await authHeaders();
-    const res = await fetch(`${API_BASE_URL}/admin/events`, { headers });
-    if (!res.ok) {
-        const text = await res.text();
-        throw new Error(`Failed to load admin events: ${res.status} ${text}`);
-    }
-    return await res.json();
+    return fetchAllPages<EventResponse>(`${API_BASE_URL}/admin/events`, headers, 'admin events');
 }
 
 export async function fetchEventDetails(eventId: string, role: 'organizer' | 'delegate' | 'volunteer', delegateOrgCode?: string): Promise<EventDetail> {
@@ -64,7 +95,14 @@ export async function fetchEventDetails(eventId: string, role: 'organizer' | 'de
         const text = await res.text();
         throw new Error(`Failed to load event details: ${res.status} ${text}`);
     }
-    return await res.json();
+    const detail = await res.json();
+    if (detail.volunteers_next_cursor) {
+        detail.volunteers = [...(detail.volunteers ?? []), ...await fetchRosterRest(eventId, 'volunteer', detail.volunteers_next_cursor, headers)];
+    }
+    if (detail.delegates_next_cursor) {
+        detail.delegates = [...(detail.delegates ?? []), ...await fetchRosterRest(eventId, 'delegate', detail.delegates_next_cursor, headers)];
+    }
+    return detail;
 }
 
 export async function joinEvent(delegateCode: string): Promise<EventResponse> {
@@ -125,12 +163,7 @@ export async function removeDelegateFromEvent(eventId: string, delegateEmail: st
 
 export async function fetchTasks(eventId: string): Promise<TaskResponse[]> {
     const headers = await authHeaders();
-    const res = await fetch(`${API_BASE_URL}/events/${eventId}/tasks`, { headers });
-    if (!res.ok) {
-        const text = await res.text();
-        throw new Error(`Failed to load tasks: ${res.status} ${text}`);
-    }
-    return await res.json();
+    return fetchAllPages<TaskResponse>(`${API_BASE_URL}/events/${eventId}/tasks`, headers, 'tasks');
 }
 
 export async function createTask(eventId: string, payload: TaskPayload): Promise<TaskResponse> {
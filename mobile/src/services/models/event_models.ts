@@ -39,6 +39,10 @@ export type OrganizerEventDetail = BaseEventDetail & {
     total_attendees?: number | null;
     volunteers?: any[] | null;
     delegates?: any[] | null; 
+    volunteers_total?: number;
+    volunteers_next_cursor?: string | null;
+    delegates_total?: number;
+    delegates_next_cursor?: string | null;
 };
 
 export type VolunteerEventDetail = BaseEventDetail & {
@@ -60,6 +64,7 @@ export type DelegateEventDetail = BaseEventDetail & {
     volunteer_join_code: string;
     total_attendees?: number | null;
     volunteers?: any[] | null;
+    volunteers_next_cursor?: string | null;
     organizer_contact_info: string;
     my_role: string;
     task_description: string;